@@ -0,0 +1,171 @@
+from array import array
+from sizing import FEE_DENOMINATOR, UINT256_MAX, fee_numerator
+
+UINT112_MAX = 2**112 - 1
+
+
+class PoolStates:
+    # Reserves of every registered pool in flat arrays indexed by pool id, with the fee as an
+    # integer numerator over FEE_DENOMINATOR. Reserves are uint112 on chain, too wide for NumPy
+    # integer dtypes, so they are kept as Python ints in plain lists. update() copies the lists
+    # before writing, so snapshots taken earlier keep the reserves of their block. Pools that are
+    # not constant-product (Curve, Balancer) keep their balances in the same lists and swap
+    # through their pricing engine (engines[pool_id]; None for constant-product pools).
+
+    def __init__(self, registry):
+        self.pairs = list(registry)
+        self.index = {pair.address: i for i, pair in enumerate(self.pairs)}
+        self.fee_numerators = array("H", (fee_numerator(pair.fee) for pair in self.pairs))
+        self.engines = [None if pair.engine.closed_form else pair.engine for pair in self.pairs]
+        self.reserve0 = [0] * len(self.pairs)
+        self.reserve1 = [0] * len(self.pairs)
+        self.block_number = None
+
+    def update(self, reserves, touched=None, block_number=None):
+        # Load {pair address: (reserve0, reserve1, ...)} for the touched pools (all when None)
+        addresses = reserves.keys() if touched is None else touched
+        reserve0, reserve1 = list(self.reserve0), list(self.reserve1)
+        for address in addresses:
+            pool_id = self.index.get(address)
+            pair_reserves = reserves.get(address)
+            if pool_id is None or pair_reserves is None:
+                continue
+            reserve0[pool_id] = int(pair_reserves[0])
+            reserve1[pool_id] = int(pair_reserves[1])
+        self.reserve0, self.reserve1 = reserve0, reserve1
+        if block_number is not None:
+            self.block_number = block_number
+
+    def snapshot(self):
+        return Snapshot(self.reserve0, self.reserve1, self.fee_numerators, self.block_number, engines=self.engines)
+
+
+class Snapshot:
+    # Copy-on-write view of PoolStates: reads fall through to the shared arrays, swaps are
+    # written to a small per-snapshot overlay. fork() is cheap, so every candidate route can be
+    # simulated on its own copy of the block state.
+
+    def __init__(self, reserve0, reserve1, fee_numerators, block_number=None, changes=None, engines=None):
+        self.reserve0 = reserve0
+        self.reserve1 = reserve1
+        self.fee_numerators = fee_numerators
+        self.block_number = block_number
+        self.changes = changes or {}  # pool id -> (reserve0, reserve1) after swaps
+        self.engines = engines  # pool id -> pricing engine of a non-constant-product pool (or None)
+
+    def reserves(self, pool_id):
+        changed = self.changes.get(pool_id)
+        if changed is not None:
+            return changed
+        return self.reserve0[pool_id], self.reserve1[pool_id]
+
+    def fork(self):
+        return Snapshot(self.reserve0, self.reserve1, self.fee_numerators, self.block_number, dict(self.changes), self.engines)
+
+    def swap(self, pool_id, zero_for_one, amount_in):
+        # UniswapV2Pair.swap through getAmountOut: returns the amount out and updates the reserves,
+        # or returns 0 and leaves them unchanged where the pair would revert
+        reserve0, reserve1 = self.reserves(pool_id)
+        engine = self.engines[pool_id] if self.engines else None
+        if engine is not None:
+            amount_out, reserves = engine.swap(amount_in, zero_for_one, (reserve0, reserve1))
+            if amount_out:
+                self.changes[pool_id] = reserves
+            return amount_out
+        reserve_in, reserve_out = (reserve0, reserve1) if zero_for_one else (reserve1, reserve0)
+        if amount_in <= 0 or reserve_in <= 0 or reserve_out <= 0:
+            return 0
+        amount_in_with_fee = amount_in * self.fee_numerators[pool_id]
+        numerator = amount_in_with_fee * reserve_out
+        denominator = reserve_in * FEE_DENOMINATOR + amount_in_with_fee
+        if numerator > UINT256_MAX or denominator > UINT256_MAX:
+            return 0
+        amount_out = numerator // denominator
+        reserve_in += amount_in
+        reserve_out -= amount_out
+        if amount_out == 0 or reserve_in > UINT112_MAX:
+            return 0
+        self.changes[pool_id] = (reserve_in, reserve_out) if zero_for_one else (reserve_out, reserve_in)
+        return amount_out
+
+
+class AmmSimulator:
+    # Evaluates candidate routes against the current block with exact Uniswap V2 integer math,
+    # so simulated outputs match an on-chain swap to the wei without an eth_call per candidate.
+    # Hops through other pool types go through their pricing engine (see pricing.py).
+    # Routes are anything with .hops of (pair, token_in, token_out), e.g. cycles.Cycle.
+
+    def __init__(self, registry):
+        self.states = PoolStates(registry)
+        self._compiled = {}  # route -> ((pool id, zero_for_one), ...)
+
+    def update(self, reserves, touched=None, block_number=None):
+        self.states.update(reserves, touched, block_number)
+
+    def snapshot(self):
+        return self.states.snapshot()
+
+    def compile(self, route):
+        compiled = self._compiled.get(route)
+        if compiled is None:
+            index = self.states.index
+            compiled = tuple((index[pair.address], token_in == pair.token0.address) for pair, token_in, _ in route.hops)
+            self._compiled[route] = compiled
+        return compiled
+
+    def simulate(self, route, amount_in, snapshot=None):
+        # Output of route for amount_in (0 if any hop reverts), on a fork of snapshot
+        return self.evaluate([route], [amount_in], snapshot)[0][1]
+
+    def evaluate(self, routes, amounts_in, snapshot=None):
+        # Exact (amount_in, amount_out, profit) for every route, each on its own fork of one
+        # snapshot of the block, so routes are independent and a pool reused within a route
+        # sees the reserves left by the earlier hop. Snapshot.swap is inlined here: this is the
+        # per-candidate hot loop.
+        snapshot = snapshot or self.snapshot()
+        base0, base1, fees, base_changes = snapshot.reserve0, snapshot.reserve1, snapshot.fee_numerators, snapshot.changes
+        engines = self.states.engines
+        results = []
+        for route, amount_in in zip(routes, amounts_in):
+            amount_in = amount = int(amount_in)
+            changes = {}
+            for pool_id, zero_for_one in self.compile(route):
+                changed = changes.get(pool_id) or base_changes.get(pool_id)
+                reserve0, reserve1 = changed if changed is not None else (base0[pool_id], base1[pool_id])
+                engine = engines[pool_id]
+                if engine is not None:
+                    amount, changes[pool_id] = engine.swap(amount, zero_for_one, (reserve0, reserve1))
+                    if amount == 0:
+                        break
+                    continue
+                reserve_in, reserve_out = (reserve0, reserve1) if zero_for_one else (reserve1, reserve0)
+                if amount <= 0 or reserve_in <= 0 or reserve_out <= 0:
+                    amount = 0
+                    break
+                amount_in_with_fee = amount * fees[pool_id]
+                numerator = amount_in_with_fee * reserve_out
+                denominator = reserve_in * FEE_DENOMINATOR + amount_in_with_fee
+                if numerator > UINT256_MAX or denominator > UINT256_MAX:
+                    amount = 0
+                    break
+                amount_out = numerator // denominator
+                reserve_in += amount
+                reserve_out -= amount_out
+                if amount_out == 0 or reserve_in > UINT112_MAX:
+                    amount = 0
+                    break
+                changes[pool_id] = (reserve_in, reserve_out) if zero_for_one else (reserve_out, reserve_in)
+                amount = amount_out
+            results.append((amount_in, amount, amount - amount_in))
+        return results
+
+    def apply(self, route, amount_in, snapshot):
+        # Execute route on snapshot itself (not a fork), e.g. to evaluate the next trade after it
+        amount = int(amount_in)
+        trial = snapshot.fork()
+        for pool_id, zero_for_one in self.compile(route):
+            amount = trial.swap(pool_id, zero_for_one, amount)
+            if amount == 0:
+                return 0
+        snapshot.changes = trial.changes
+        return amount
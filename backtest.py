@@ -0,0 +1,236 @@
+import argparse
+import json
+import multiprocessing
+import time
+import numpy as np
+from amm import AmmSimulator
+from cycles import CycleEngine
+from history import exact_reserves, load_history, load_pool_addresses
+from main import simulate_transaction
+from pair_registry import PairRegistry
+from reserve_cache import decode_sync_log
+from sizing import size_routes
+
+
+class BacktestResult:
+    def __init__(self):
+        self.snapshots = 0
+        self.opportunities = 0
+        self.trades = 0
+        self.unpriced = 0  # blocks whose best cycle starts in a token with no WETH pool to price gas
+        self.pnl = 0.0  # realized profit in WETH, after gas and flashloan fee
+        self.elapsed = 0.0
+        self.best = []  # (block_number, cycle description, net profit)
+
+    def merge(self, other):
+        self.snapshots += other.snapshots
+        self.opportunities += other.opportunities
+        self.trades += other.trades
+        self.unpriced += other.unpriced
+        self.pnl += other.pnl
+        self.best = sorted(self.best + other.best, key=lambda item: item[2], reverse=True)[:10]
+        return self
+
+    @property
+    def snapshots_per_second(self):
+        return self.snapshots / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        lines = [
+            f"Snapshots replayed: {self.snapshots}",
+            f"Opportunities: {self.opportunities}",
+            f"Trades taken: {self.trades}",
+            f"Skipped (no WETH price for the start token): {self.unpriced}",
+            f"Realized PnL: {self.pnl:.6f} WETH",
+            f"Throughput: {self.snapshots_per_second:,.0f} snapshots/s ({self.elapsed:.2f}s)",
+        ]
+        for block_number, cycle, profit in self.best:
+            lines.append(f"  block {block_number}: {cycle} net {profit:.6f} WETH")
+        return "\n".join(lines)
+
+
+class ReplayEngine:
+    # Replays per-block reserve and gas snapshots through the live detection path: incremental
+    # cycle search, vectorized sizing, exact AMM simulation of the sized routes, then
+    # simulate_transaction for gas and flashloan costs. At most one trade is taken per block,
+    # the most profitable one. Cycles are costed in their start token, with gas (paid in ETH)
+    # converted at the deepest WETH pool of that token; PnL is summed in WETH.
+
+    def __init__(self, registry, base_tokens=("WETH",), max_hops=3, gas_limit=210000, flashloan_fee_rate=0.0009):
+        self.registry = registry
+        self.cycle_engine = CycleEngine(registry, base_tokens=base_tokens, max_hops=max_hops)
+        self.amm = AmmSimulator(registry)
+        self.gas_limit = gas_limit
+        self.flashloan_fee_rate = flashloan_fee_rate
+
+    def replay(self, snapshots, reserves=None):
+        # snapshots yields (block_number, {pair address: (reserve0, reserve1)}, gas_price_gwei) with
+        # only the pools that changed in that block; reserves is the state before the first one.
+        # Edge weights and pool states are rebuilt from reserves, so nothing carries over from a
+        # previous replay (workers replay several chunks).
+        reserves = dict(reserves or {})
+        self.cycle_engine.update_weights(reserves)
+        self.amm = AmmSimulator(self.registry)
+        self.amm.update(reserves)
+        result = BacktestResult()
+        started = time.perf_counter()
+        for block_number, changes, gas_price_gwei in snapshots:
+            result.snapshots += 1
+            reserves.update(changes)
+            self.amm.update(changes, block_number=block_number)
+            opportunities = self.cycle_engine.update(reserves, changes.keys())
+            if not opportunities:
+                continue
+            sized = size_routes([cycle for cycle, _ in opportunities], reserves)
+            simulated = self.amm.evaluate([cycle for cycle, _, _ in sized], [amount_in for _, amount_in, _ in sized])
+            sized = [(cycle, amount_in, profit) for (cycle, _, _), (amount_in, _, profit) in zip(sized, simulated) if profit > 0]
+            result.opportunities += len(sized)
+            if not sized:
+                continue
+
+            # The best cycle by profit in WETH, whatever token it starts in
+            priced = []
+            for cycle, amount_in, profit in sized:
+                token = self.registry.token(cycle.start_token)
+                rate = self.weth_price(token, reserves)
+                priced.append((profit / 10**token.decimals / rate if rate else -1.0, cycle, amount_in, profit, token, rate))
+            _, cycle, amount_in, profit, token, rate = max(priced, key=lambda item: item[0])
+            if not rate:
+                result.unpriced += 1
+                continue
+            trade_amount = amount_in / 10**token.decimals
+            gas_cost = (gas_price_gwei or 0) * 1e-9 * self.gas_limit * rate  # ETH, in the start token
+            net_profit = simulate_transaction(
+                buy_price=1.0,
+                sell_price=(amount_in + profit) / amount_in,
+                trade_amount=trade_amount,
+                gas_cost=gas_cost,
+                flashloan_fee=trade_amount * self.flashloan_fee_rate
+            )
+            if net_profit is not None and net_profit > 0:
+                net_profit /= rate  # in WETH
+                result.trades += 1
+                result.pnl += net_profit
+                result.best = sorted(result.best + [(block_number, repr(cycle), net_profit)], key=lambda item: item[2], reverse=True)[:10]
+        result.elapsed = time.perf_counter() - started
+        return result
+
+    def weth_price(self, token, reserves):
+        # Whole units of token per WETH from the tracked WETH/token pool with the most WETH, or
+        # None when there is none (or it has no reserves)
+        weth = self.registry.token("WETH")
+        if token.address == weth.address:
+            return 1.0
+        best, depth = None, 0
+        for pair in self.registry.pairs_for_tokens(weth, token):
+            pair_reserves = reserves.get(pair.address)
+            if pair_reserves is None:
+                continue
+            weth_reserve = pair_reserves[0] if pair.token0.address == weth.address else pair_reserves[1]
+            price = pair.price(pair_reserves)  # token0 per token1
+            if weth_reserve > depth and price > 0:
+                best, depth = (price if pair.token1.address == weth.address else 1 / price), weth_reserve
+        return best
+
+
+def snapshots_from_history(path="historical_data.bin"):
+    # Group history records into per-block snapshots; the last record of a pool in a block wins
+    records = load_history(path)
+    addresses = load_pool_addresses(path)
+    records = records[np.argsort(records["block_number"], kind="stable")]
+    blocks = records["block_number"]
+    pool_ids = records["pool_id"]
+    reserve0, reserve1 = exact_reserves(records, 0), exact_reserves(records, 1)
+    gas = records["gas_price_gwei"]
+
+    snapshots = []
+    boundaries = np.flatnonzero(np.diff(blocks)) + 1
+    for start, end in zip(np.concatenate(([0], boundaries)), np.concatenate((boundaries, [len(blocks)]))):
+        if start == end:
+            continue
+        changes = {}
+        for i in range(start, end):
+            changes[addresses[pool_ids[i]]] = (reserve0[i], reserve1[i])
+        block_gas = gas[start:end]
+        block_gas = block_gas[~np.isnan(block_gas)]
+        snapshots.append((int(blocks[start]), changes, float(block_gas[-1]) if len(block_gas) else None))
+    return snapshots
+
+
+def snapshots_from_logs(path, registry, gas_price_gwei=None):
+    # Build snapshots from a JSON-lines dump of Sync logs (eth_getLogs results, one per line)
+    by_block = {}
+    with open(path) as file:
+        for line in file:
+            if not line.strip():
+                continue
+            log = json.loads(line)
+            pair = registry.get(log["address"])
+            if pair is None:
+                continue
+            block_number = int(log["blockNumber"], 16) if isinstance(log["blockNumber"], str) else log["blockNumber"]
+            _, reserve0, reserve1 = decode_sync_log(log)
+            by_block.setdefault(block_number, {})[pair.address] = (reserve0, reserve1)
+    return [(block_number, by_block[block_number], gas_price_gwei) for block_number in sorted(by_block)]
+
+
+_worker_engine = None
+
+
+def _init_worker(pairs_config, base_tokens, max_hops):
+    global _worker_engine
+    _worker_engine = ReplayEngine(PairRegistry.load(pairs_config), base_tokens=base_tokens, max_hops=max_hops)
+
+
+def _replay_chunk(args):
+    reserves, snapshots = args
+    return _worker_engine.replay(snapshots, reserves)
+
+
+def run_backtest(snapshots, pairs_config="pairs.json", processes=1, base_tokens=("WETH",), max_hops=3):
+    # Replay snapshots, split into contiguous block ranges across worker processes. Each chunk
+    # starts from the reserves as of its first block, so the split does not change the result.
+    started = time.perf_counter()
+    if processes <= 1 or len(snapshots) < processes * 2:
+        _init_worker(pairs_config, base_tokens, max_hops)
+        result = _worker_engine.replay(snapshots)
+        result.elapsed = time.perf_counter() - started
+        return result
+
+    chunk_size = -(-len(snapshots) // processes)
+    chunks = []
+    reserves = {}
+    for start in range(0, len(snapshots), chunk_size):
+        chunks.append((dict(reserves), snapshots[start:start + chunk_size]))
+        for _, changes, _ in snapshots[start:start + chunk_size]:
+            reserves.update(changes)
+
+    with multiprocessing.Pool(processes, initializer=_init_worker, initargs=(pairs_config, base_tokens, max_hops)) as pool:
+        results = pool.map(_replay_chunk, chunks)
+    result = BacktestResult()
+    for chunk_result in results:
+        result.merge(chunk_result)
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded reserves through the arbitrage detection path.")
+    parser.add_argument("source", help="history file (historical_data.bin) or JSON-lines Sync log dump")
+    parser.add_argument("--pairs", default="pairs.json", help="pair registry config")
+    parser.add_argument("--logs", action="store_true", help="source is a JSON-lines Sync log dump")
+    parser.add_argument("--gas-price", type=float, default=None, help="gas price in Gwei for log dumps")
+    parser.add_argument("--processes", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--max-hops", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.logs:
+        snapshots = snapshots_from_logs(args.source, PairRegistry.load(args.pairs), args.gas_price)
+    else:
+        snapshots = snapshots_from_history(args.source)
+    result = run_backtest(snapshots, args.pairs, processes=args.processes, max_hops=args.max_hops)
+    print(result.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from eth_abi import decode, encode
+
+GET_RESERVES = "0x0902f1ac"
+SWAP_EXACT_ETH_FOR_TOKENS = "0x7ff36ab5"
+UNISWAP_ROUTER = "0x7a250d5630b4cf539739df2c5dacb4c659f2488d"
+WETH = "0xc02aaa39b223fe8d0a0e5c4f27ead9083c756cc2"
+USDC = "0xa0b86991c6218b36c1d19d4a2e9eb0ce3606eb48"
+TRY_BLOCK_AND_AGGREGATE = "0x399542e9"
+SYNC_TOPIC = "0x1c411e9a96e071241c2f21f7726b17ae89e3cab4c78be50e062b03a9fffbbad1"
+
+
+def block_hash(number):
+    return "0x" + hashlib.sha256(str(number).encode()).hexdigest()
+
+
+class MockChain:
+    # Just enough chain state to serve the bot: Uniswap V2 style pools whose reserves drift a
+    # little every block, Sync logs for the pools that moved, fee history and a pending block in
+    # which every fifth transaction is a WETH -> USDC swap through the Uniswap router.
+
+    def __init__(self, pools, touch_fraction=0.05, pending_txs=50, seed=0):
+        self.random = random.Random(seed)
+        self.reserves = {address.lower(): list(reserves) for address, reserves in pools.items()}
+        self.addresses = list(self.reserves)
+        self.touch_fraction = touch_fraction
+        self.pending_txs = pending_txs
+        self.block_number = 1000
+        self.logs = {}  # block number -> [log]
+        self.lock = threading.Lock()
+
+    def advance(self):
+        # Mine a block: move the reserves of a random subset of pools and emit their Sync logs
+        with self.lock:
+            self.block_number += 1
+            count = max(1, int(len(self.addresses) * self.touch_fraction))
+            logs = []
+            for index, address in enumerate(self.random.sample(self.addresses, count)):
+                reserves = self.reserves[address]
+                drift = self.random.uniform(0.998, 1.002)
+                reserves[0] = int(reserves[0] * drift)
+                reserves[1] = int(reserves[1] / drift)
+                logs.append({
+                    "address": address,
+                    "blockNumber": hex(self.block_number),
+                    "blockHash": block_hash(self.block_number),
+                    "logIndex": hex(index),
+                    "topics": [SYNC_TOPIC],
+                    "data": "0x" + reserves[0].to_bytes(32, "big").hex() + reserves[1].to_bytes(32, "big").hex(),
+                    "removed": False
+                })
+            self.logs[self.block_number] = logs
+            self.logs.pop(self.block_number - 256, None)
+
+    def block(self, number, full=False):
+        transactions = []
+        if number == "pending":
+            for i in range(self.pending_txs):
+                tx_hash = "0x" + hashlib.sha256(f"{self.block_number}-{i}".encode()).hexdigest()
+                if full:
+                    transaction = {"hash": tx_hash, "from": "0x" + "11" * 20, "to": "0x" + "22" * 20,
+                                   "input": "0x", "value": "0x0", "gasPrice": hex(20 * 10**9),
+                                   "gas": hex(21000), "nonce": hex(i)}
+                    if i % 5 == 0:
+                        amount_in = 10**18 * (1 + i % 7)
+                        calldata = encode(["uint256", "address[]", "address", "uint256"], [0, [WETH, USDC], "0x" + "11" * 20, 2**32])
+                        transaction.update(to=UNISWAP_ROUTER, value=hex(amount_in), gas=hex(200000),
+                                           input=SWAP_EXACT_ETH_FOR_TOKENS + calldata.hex())
+                    transactions.append(transaction)
+                else:
+                    transactions.append(tx_hash)
+            number = self.block_number + 1
+        return {
+            "number": hex(number),
+            "hash": block_hash(number),
+            "parentHash": block_hash(number - 1),
+            "timestamp": hex(1700000000 + number * 12),
+            "baseFeePerGas": hex(20 * 10**9),
+            "gasLimit": hex(30000000),
+            "gasUsed": hex(15000000),
+            "miner": "0x" + "00" * 20,
+            "transactions": transactions
+        }
+
+    def reserves_return_data(self, address):
+        reserve0, reserve1 = self.reserves[address.lower()]
+        return encode(["uint112", "uint112", "uint32"], [reserve0, reserve1, 0])
+
+    def eth_call(self, call):
+        data = call["data"]
+        if data.startswith(TRY_BLOCK_AND_AGGREGATE):
+            _, calls = decode(["bool", "(address,bytes)[]"], bytes.fromhex(data[10:]))
+            results = []
+            for target, _ in calls:
+                if target.lower() in self.reserves:
+                    results.append((True, self.reserves_return_data(target)))
+                else:
+                    results.append((False, b""))
+            return "0x" + encode(["uint256", "bytes32", "(bool,bytes)[]"], [self.block_number, bytes(32), results]).hex()
+        if data.startswith(GET_RESERVES):
+            return "0x" + self.reserves_return_data(call["to"]).hex()
+        return "0x"
+
+    def get_logs(self, query):
+        start, end = int(query["fromBlock"], 16), int(query["toBlock"], 16)
+        addresses = query.get("address")
+        addresses = {a.lower() for a in addresses} if isinstance(addresses, list) else None
+        logs = []
+        for number in range(start, end + 1):
+            for log in self.logs.get(number, []):
+                if addresses is None or log["address"] in addresses:
+                    logs.append(log)
+        return logs
+
+    def fee_history(self, count, percentiles):
+        count = int(count, 16) if isinstance(count, str) else count
+        return {
+            "oldestBlock": hex(self.block_number - count + 1),
+            "baseFeePerGas": [hex(20 * 10**9)] * (count + 1),
+            "gasUsedRatio": [0.5] * count,
+            "reward": [[hex(10**9 * (i + 1)) for i, _ in enumerate(percentiles)]] * count
+        }
+
+
+class _Server(ThreadingHTTPServer):
+    # Concurrent bundle submissions open several connections at once; the default listen backlog
+    # of 5 drops some of them and the client stalls for a one-second SYN retry
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class MockNode:
+    # Local stand-in for an Ethereum JSON-RPC endpoint with configurable latency. Every HTTP
+    # request sleeps `latency` seconds (a batch pays it once). With auto_advance, each request
+    # for the latest block mines a new one, so every poll of the bot sees fresh Sync logs.
+    # Counters are exposed through the extra mock_stats / mock_resetStats methods. It doubles as
+    # a stand-in Flashbots relay: eth_sendBundle requests are kept in `bundles` with their
+    # X-Flashbots-Signature header.
+
+    def __init__(self, chain, latency=0.0, auto_advance=True, host="127.0.0.1", port=0):
+        self.chain = chain
+        self.latency = latency
+        self.auto_advance = auto_advance
+        self.stats = {"http_requests": 0, "rpc_calls": 0, "methods": {}}
+        self._stats_lock = threading.Lock()
+        self.bundles = []  # (X-Flashbots-Signature header, eth_sendBundle params)
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like a real provider
+            disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                if node.latency:
+                    time.sleep(node.latency)
+                if isinstance(body, list):
+                    node._count([request["method"] for request in body])
+                    response = [node.handle(request) for request in body]
+                else:
+                    node._count([body["method"]])
+                    if body["method"] == "eth_sendBundle":
+                        node.bundles.append((self.headers.get("X-Flashbots-Signature"), body["params"][0]))
+                    response = node.handle(body)
+                payload = json.dumps(response).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        self.server = _Server((host, port), Handler)
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _count(self, methods):
+        # The mock_* control methods are not counted
+        methods = [method for method in methods if not method.startswith("mock_")]
+        if not methods:
+            return
+        with self._stats_lock:
+            self.stats["http_requests"] += 1
+            self.stats["rpc_calls"] += len(methods)
+            for method in methods:
+                self.stats["methods"][method] = self.stats["methods"].get(method, 0) + 1
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self.stats = {"http_requests": 0, "rpc_calls": 0, "methods": {}}
+
+    def handle(self, request):
+        method, params = request["method"], request.get("params") or []
+        chain = self.chain
+        try:
+            if method == "mock_stats":
+                result = self.stats
+            elif method == "mock_resetStats":
+                self.reset_stats()
+                result = True
+            elif method == "eth_blockNumber":
+                result = hex(chain.block_number)
+            elif method == "eth_chainId":
+                result = "0x1"
+            elif method == "net_version":
+                result = "1"
+            elif method == "eth_gasPrice":
+                result = hex(21 * 10**9)
+            elif method == "eth_getTransactionCount":
+                result = "0x0"
+            elif method == "eth_getRawTransactionByHash":
+                result = "0x02" + params[0][2:]  # Opaque stand-in for the signed transaction
+            elif method == "eth_sendBundle":
+                result = {"bundleHash": block_hash(json.dumps(params, sort_keys=True))}
+            elif method == "eth_call":
+                result = chain.eth_call(params[0])
+            elif method == "eth_getLogs":
+                result = chain.get_logs(params[0])
+            elif method == "eth_feeHistory":
+                result = chain.fee_history(params[0], params[2] if len(params) > 2 else [])
+            elif method == "eth_getBlockByNumber":
+                tag = params[0]
+                if tag == "latest":
+                    if self.auto_advance:
+                        chain.advance()
+                    result = chain.block(chain.block_number)
+                elif tag == "pending":
+                    result = chain.block("pending", full=len(params) > 1 and params[1])
+                else:
+                    number = int(tag, 16)
+                    result = chain.block(number) if number <= chain.block_number else None
+            else:
+                return {"jsonrpc": "2.0", "id": request.get("id"), "error": {"code": -32601, "message": f"Method {method} not supported"}}
+        except Exception as e:
+            return {"jsonrpc": "2.0", "id": request.get("id"), "error": {"code": -32000, "message": str(e)}}
+        return {"jsonrpc": "2.0", "id": request.get("id"), "result": result}
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="mock-node", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,216 @@
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+BASELINE_PATH = os.path.join(BENCHMARK_DIR, "baseline.json")
+SCENARIOS = ("monitor", "find", "mempool", "submit")
+METRICS = ("p50_ms", "p99_ms", "rpc_calls_per_iteration", "round_trips_per_iteration", "cpu_us_per_pool")
+
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCHMARK_DIR)
+
+
+def synthetic_pools(count):
+    # The real WETH/USDC pools from pairs.json plus synthetic WETH/Tk (two DEXs) and Tk/Tk+1 pools,
+    # so there are 2- and 3-hop cycles at every size. Returns (pairs config, {address: reserves}).
+    with open(os.path.join(REPO_DIR, "pairs.json")) as file:
+        config = json.load(file)
+    reserves = {}
+    for pair in config["pairs"]:
+        reserves[pair["address"]] = (1_800_000 * 10**6 * 1000, 1000 * 10**18)
+
+    token = 0
+    while len(config["pairs"]) < count:
+        token += 1
+        symbol = f"T{token}"
+        config["tokens"][symbol] = {"address": "0x" + hashlib.sha256(symbol.encode()).hexdigest()[:40], "decimals": 18}
+        candidates = [("uniswap", "WETH"), ("sushiswap", "WETH")]
+        if token > 1:
+            candidates.append(("uniswap", f"T{token - 1}"))
+        for dex, other in candidates:
+            if len(config["pairs"]) >= count:
+                break
+            address = "0x" + hashlib.sha256(f"{dex}-{symbol}-{other}".encode()).hexdigest()[:40]
+            config["pairs"].append({"dex": dex, "address": address, "token0": other, "token1": symbol})
+            reserves[address] = (10**21 * (1 + token % 7), 10**21 * (1 + token % 5))
+    return config, reserves
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def summarize(latencies, cpu_times, stats, pools):
+    # stats are the mock node counters: rpc_calls counts every call inside a batch, http_requests
+    # counts round-trips
+    iterations = len(latencies)
+    return {
+        "iterations": iterations,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "rpc_calls_per_iteration": stats["rpc_calls"] / iterations if iterations else 0.0,
+        "round_trips_per_iteration": stats["http_requests"] / iterations if iterations else 0.0,
+        "cpu_us_per_pool": sum(cpu_times) / iterations / pools * 1e6 if iterations else 0.0,
+    }
+
+
+def run_worker(args):
+    # Runs inside a fresh interpreter pointed at the mock node (see run_pool_count), so each pool
+    # count gets its own module state. Bot output goes to /dev/null.
+    import main
+    from rpc import JsonRpcClient
+
+    node = JsonRpcClient(os.environ["RPC_URL"])
+    pools = len(main.runtime.registry)
+    results = {}
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        # monitor_arbitrage_opportunities: time every pass of the loop, after startup
+        latencies, cpu_times = [], []
+        iteration = main.monitor_iteration
+
+        def timed_iteration(touched):
+            if not timed_iteration.started:
+                node.call("mock_resetStats")
+                timed_iteration.started = True
+            wall, cpu = time.perf_counter(), time.process_time()
+            try:
+                return iteration(touched)
+            finally:
+                latencies.append(time.perf_counter() - wall)
+                cpu_times.append(time.process_time() - cpu)
+
+        timed_iteration.started = False
+        main.monitor_iteration = timed_iteration
+        main.monitor_arbitrage_opportunities(max_iterations=args.iterations, interval=0)
+        main.monitor_iteration = iteration
+        results["monitor"] = summarize(latencies, cpu_times, node.call("mock_stats"), pools)
+
+        for name, run in (("find", main.find_arbitrage_opportunities),
+                          ("mempool", lambda: main.monitor_mempool(max_iterations=1, interval=0))):
+            latencies, cpu_times = [], []
+            node.call("mock_resetStats")
+            for _ in range(args.iterations):
+                wall, cpu = time.perf_counter(), time.process_time()
+                run()
+                latencies.append(time.perf_counter() - wall)
+                cpu_times.append(time.process_time() - cpu)
+            results[name] = summarize(latencies, cpu_times, node.call("mock_stats"), pools)
+
+        # Detection to relay acknowledgement: sign a trade on the first cycle and wait for the
+        # mock relay to accept the bundle for every target block
+        route = main.runtime.cycle_engine.cycles[0]
+        main.runtime.submission.start()
+        latencies, cpu_times = [], []
+        node.call("mock_resetStats")
+        for _ in range(args.iterations):
+            wall, cpu = time.perf_counter(), time.process_time()
+            main.execute_transaction(route, 10**18).result()
+            latencies.append(time.perf_counter() - wall)
+            cpu_times.append(time.process_time() - cpu)
+        results["submit"] = summarize(latencies, cpu_times, node.call("mock_stats"), pools)
+        main.runtime.submission.stop()
+        main.runtime.gas_oracle.stop()
+
+    with open(args.output, "w") as file:
+        json.dump(results, file)
+
+
+def run_pool_count(pools, iterations, latency, touch_fraction, scan_processes=1):
+    from mock_node import MockChain, MockNode
+
+    config, reserves = synthetic_pools(pools)
+    with tempfile.TemporaryDirectory() as workdir:
+        pairs_path = os.path.join(workdir, "pairs.json")
+        with open(pairs_path, "w") as file:
+            json.dump(config, file)
+        node = MockNode(MockChain(reserves, touch_fraction=touch_fraction), latency=latency).start()
+        output = os.path.join(workdir, "result.json")
+        env = dict(os.environ, RPC_URL=node.url, PAIRS_CONFIG=pairs_path,
+                   HISTORY_PATH=os.path.join(workdir, "history.bin"), WARM_START_PATH="",
+                   LOG_LEVEL="WARNING", FLASHBOTS_RELAY_URL=node.url, SCAN_PROCESSES=str(scan_processes),
+                   PRIVATE_KEY="0x" + "11" * 32, EXECUTOR_ADDRESS="0x" + "22" * 20,
+                   PYTHONPATH=os.pathsep.join([REPO_DIR, os.environ.get("PYTHONPATH", "")]))
+        try:
+            subprocess.run([sys.executable, os.path.abspath(__file__), "--worker", "--iterations", str(iterations),
+                            "--output", output], cwd=workdir, env=env, check=True)
+        finally:
+            node.stop()
+        with open(output) as file:
+            return json.load(file)
+
+
+def compare(results, baseline, tolerance):
+    # Print every metric against the baseline; returns the regressions beyond tolerance
+    regressions = []
+    for pools, scenarios in results["pools"].items():
+        for scenario, metrics in scenarios.items():
+            base = baseline.get("pools", {}).get(pools, {}).get(scenario)
+            if base is None:
+                continue
+            for metric in METRICS:
+                old, new = base[metric], metrics[metric]
+                change = (new - old) / old if old else 0.0
+                flag = ""
+                if change > tolerance:
+                    flag = "  REGRESSION"
+                    regressions.append((pools, scenario, metric, old, new))
+                print(f"{pools:>6} {scenario:<8} {metric:<24} {old:>12.3f} -> {new:>12.3f} ({change:+.1%}){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the bot against a local mock JSON-RPC node.")
+    parser.add_argument("--pools", type=int, nargs="+", default=[2, 50, 500, 5000])
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="latency added to every HTTP request")
+    parser.add_argument("--touch-fraction", type=float, default=0.05, help="share of pools that move each block")
+    parser.add_argument("--scan-processes", type=int, default=1, help="scan cycles across this many worker processes")
+    parser.add_argument("--save-baseline", action="store_true", help=f"write the results to {BASELINE_PATH}")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before a metric counts as a regression")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    results = {
+        "config": {"iterations": args.iterations, "latency_ms": args.latency_ms, "touch_fraction": args.touch_fraction,
+                   "scan_processes": args.scan_processes},
+        "pools": {}
+    }
+    for pools in args.pools:
+        results["pools"][str(pools)] = run_pool_count(pools, args.iterations, args.latency_ms / 1000, args.touch_fraction, args.scan_processes)
+        for scenario in SCENARIOS:
+            metrics = results["pools"][str(pools)][scenario]
+            print(f"{pools:>6} pools {scenario:<8} p50 {metrics['p50_ms']:8.2f} ms  p99 {metrics['p99_ms']:8.2f} ms  "
+                  f"{metrics['rpc_calls_per_iteration']:6.2f} calls/iter  {metrics['round_trips_per_iteration']:6.2f} round-trips/iter  "
+                  f"{metrics['cpu_us_per_pool']:8.2f} us CPU/pool")
+
+    if args.save_baseline:
+        with open(BASELINE_PATH, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"Baseline written to {BASELINE_PATH}")
+    elif os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as file:
+            baseline = json.load(file)
+        print("\nAgainst baseline:")
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
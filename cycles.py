@@ -0,0 +1,184 @@
+import math
+from pricing import CONSTANT_PRODUCT
+
+INFINITY = float("inf")
+
+
+class Cycle:
+    # A closed route of swaps that starts and ends in the same token.
+    # Each hop is (pair, token_in, token_out) with token addresses.
+
+    def __init__(self, hops):
+        self.hops = tuple(hops)
+        self.start_token = hops[0][1]
+        self.pair_addresses = frozenset(pair.address for pair, _, _ in hops)
+        self.edges = tuple((pair.address, token_in == pair.token0.address) for pair, token_in, _ in hops)
+
+    @property
+    def key(self):
+        # Rotations of the same loop describe the same trade
+        edges = [(pair.address, token_in) for pair, token_in, _ in self.hops]
+        return min(tuple(edges[i:] + edges[:i]) for i in range(len(edges)))
+
+    def __len__(self):
+        return len(self.hops)
+
+    def __repr__(self):
+        symbols = []
+        for pair, token_in, _ in self.hops:
+            token = pair.token0 if token_in == pair.token0.address else pair.token1
+            symbols.append(f"{token.symbol} -[{pair.dex}]->")
+        last = self.hops[-1][0]
+        end = last.token0 if self.hops[-1][2] == last.token0.address else last.token1
+        return "Cycle(" + " ".join(symbols) + f" {end.symbol})"
+
+
+def edge_weight(reserves, zero_for_one, fee):
+    # -log of the marginal exchange rate after fee, in raw token units
+    if reserves is None:
+        return INFINITY
+    reserve_in, reserve_out = (reserves[0], reserves[1]) if zero_for_one else (reserves[1], reserves[0])
+    if reserve_in <= 0 or reserve_out <= 0:
+        return INFINITY
+    return -math.log(reserve_out * (1 - fee) / reserve_in)
+
+
+def engine_edge_weight(engine, reserves, zero_for_one):
+    # edge_weight for any pool type, from its pricing engine's marginal rate
+    if reserves is None:
+        return INFINITY
+    rate = engine.marginal_rate(reserves, zero_for_one)
+    return -math.log(rate) if rate > 0 else INFINITY
+
+
+class CycleEngine:
+    # Finds profitable swap cycles across every registered pool.
+    # Edges carry -log(rate after fee), so a cycle is profitable when its weights sum below zero.
+    # Candidate cycles of up to max_hops through the base tokens are enumerated once and indexed
+    # by pair, so a block that touches a handful of pools re-checks only the cycles through them.
+    # find_negative_cycles runs a full Bellman-Ford sweep for loops of any length.
+
+    def __init__(self, registry, base_tokens=("WETH",), max_hops=3):
+        self.registry = registry
+        self.max_hops = max_hops
+        self.base_tokens = [registry.token(token).address for token in base_tokens]
+        self.weights = {}  # (pair address, zero_for_one) -> weight
+        self.cycles = []
+        self.cycles_by_pair = {}  # pair address -> [cycle index]
+        self._enumerate_cycles()
+
+    def _enumerate_cycles(self):
+        seen = set()
+
+        def extend(start, token, hops, used_pairs, used_tokens):
+            for pair in self.registry.pairs_for_token(token):
+                if pair.address in used_pairs:
+                    continue
+                token_out = pair.other(self.registry.tokens_by_address[token]).address
+                hop = (pair, token, token_out)
+                if token_out == start and len(hops) >= 1:
+                    cycle = Cycle(hops + [hop])
+                    if cycle.key not in seen:
+                        seen.add(cycle.key)
+                        self._add_cycle(cycle)
+                elif token_out not in used_tokens and len(hops) + 1 < self.max_hops:
+                    extend(start, token_out, hops + [hop], used_pairs | {pair.address}, used_tokens | {token_out})
+
+        for start in self.base_tokens:
+            extend(start, start, [], frozenset(), frozenset([start]))
+
+    def _add_cycle(self, cycle):
+        index = len(self.cycles)
+        self.cycles.append(cycle)
+        for address in cycle.pair_addresses:
+            self.cycles_by_pair.setdefault(address, []).append(index)
+
+    def cycles_through(self, pair_addresses):
+        # Every candidate cycle that trades through at least one of the given pairs
+        indexes = set()
+        for address in pair_addresses:
+            indexes.update(self.cycles_by_pair.get(address, ()))
+        return [self.cycles[index] for index in indexes]
+
+    def update_weights(self, reserves, pair_addresses=None):
+        # Refresh edge weights for the given pairs (all pairs when None)
+        pairs = self.registry.pairs if pair_addresses is None else [self.registry.get(a) for a in pair_addresses]
+        for pair in pairs:
+            if pair is None:
+                continue
+            pair_reserves = reserves.get(pair.address)
+            if pair.kind != CONSTANT_PRODUCT:
+                self.weights[(pair.address, True)] = engine_edge_weight(pair.engine, pair_reserves, True)
+                self.weights[(pair.address, False)] = engine_edge_weight(pair.engine, pair_reserves, False)
+                continue
+            self.weights[(pair.address, True)] = edge_weight(pair_reserves, True, pair.fee)
+            self.weights[(pair.address, False)] = edge_weight(pair_reserves, False, pair.fee)
+
+    def cycle_weight(self, cycle):
+        return sum(self.weights.get(edge, INFINITY) for edge in cycle.edges)
+
+    def update(self, reserves, touched=None):
+        # Re-evaluate the cycles through the touched pairs (all cycles when None) and return the
+        # profitable ones as (cycle, rate) sorted best first; rate is the output/input multiple
+        # at the margin, before gas
+        self.update_weights(reserves, touched)
+        cycles = self.cycles if touched is None else self.cycles_through(touched)
+
+        opportunities = []
+        for cycle in cycles:
+            weight = self.cycle_weight(cycle)
+            if weight < 0:
+                opportunities.append((cycle, math.exp(-weight)))
+        opportunities.sort(key=lambda item: item[1], reverse=True)
+        return opportunities
+
+    def find_negative_cycles(self, reserves):
+        # Bellman-Ford from a virtual source connected to every token. Any edge that can still be
+        # relaxed after |V| - 1 rounds lies on or leads to a negative (profitable) cycle.
+        self.update_weights(reserves)
+        tokens = list(self.registry.tokens_by_address)
+        edges = []
+        for pair in self.registry.pairs:
+            edges.append((pair.token0.address, pair.token1.address, pair, True))
+            edges.append((pair.token1.address, pair.token0.address, pair, False))
+
+        distance = {token: 0.0 for token in tokens}
+        predecessor = {}
+        for _ in range(len(tokens) - 1):
+            changed = False
+            for token_in, token_out, pair, zero_for_one in edges:
+                weight = self.weights[(pair.address, zero_for_one)]
+                if distance[token_in] + weight < distance[token_out] - 1e-12:
+                    distance[token_out] = distance[token_in] + weight
+                    predecessor[token_out] = (pair, token_in)
+                    changed = True
+            if not changed:
+                return []
+
+        cycles = []
+        seen = set()
+        for token_in, token_out, pair, zero_for_one in edges:
+            weight = self.weights[(pair.address, zero_for_one)]
+            if distance[token_in] + weight >= distance[token_out] - 1e-12:
+                continue
+            # Walk back |V| steps to be sure we are inside the cycle, then collect it
+            token = token_out
+            for _ in range(len(tokens)):
+                if token not in predecessor:
+                    break
+                token = predecessor[token][1]
+            hops = []
+            current = token
+            while current in predecessor and len(hops) <= len(tokens):
+                pred_pair, pred_token = predecessor[current]
+                hops.append((pred_pair, pred_token, current))
+                current = pred_token
+                if current == token:
+                    break
+            if current != token or not hops:
+                continue
+            cycle = Cycle(list(reversed(hops)))
+            if cycle.key not in seen and self.cycle_weight(cycle) < 0:
+                seen.add(cycle.key)
+                cycles.append(cycle)
+        return cycles
@@ -0,0 +1,228 @@
+import asyncio
+import concurrent.futures
+import json
+import logging
+import threading
+import aiohttp
+import rlp
+from eth_abi import encode
+from eth_account import Account
+from eth_account.messages import encode_defunct
+from eth_keys import keys
+from eth_utils import keccak
+
+# Executor contract entry point the templates call: executeArbitrage(amountIn, minAmountOut,
+# pools, zeroForOne) swaps amountIn of the first pool's input token through every pool in order
+# and reverts unless at least minAmountOut comes back
+EXECUTE_SIGNATURE = "executeArbitrage(uint256,uint256,address[],bool[])"
+EXECUTE_SELECTOR = keccak(text=EXECUTE_SIGNATURE)[:4]
+DEFAULT_RELAY_URL = "https://relay.flashbots.net"
+
+
+class HeadTracker:
+    # Latest block number, fed by new-block notifications (reserve cache polls, gas oracle), so
+    # submissions pick their target blocks without an eth_blockNumber round-trip
+
+    def __init__(self):
+        self.block_number = None
+        self.listeners = []  # called with the block number of every new head
+
+    def on_block(self, block_number):
+        if self.block_number is not None and block_number <= self.block_number:
+            return
+        self.block_number = block_number
+        for listener in self.listeners:
+            listener(block_number)
+
+    def target_blocks(self, count):
+        if self.block_number is None:
+            return []
+        return [self.block_number + offset for offset in range(1, count + 1)]
+
+
+class NonceManager:
+    # The account's next nonce, held locally. Bundles for the same block compete, so they all
+    # reuse it; it is re-read from the node on new blocks (off the submission path) to pick up
+    # landed transactions.
+
+    def __init__(self, rpc, address):
+        self.rpc = rpc
+        self.address = address
+        self.nonce = None
+        self._lock = threading.Lock()
+
+    def sync(self):
+        nonce = int(self.rpc.call("eth_getTransactionCount", [self.address, "latest"]), 16)
+        with self._lock:
+            self.nonce = nonce
+        return nonce
+
+    def current(self):
+        if self.nonce is None:
+            return self.sync()
+        return self.nonce
+
+
+class TransactionTemplate:
+    # Pre-built EIP-1559 call to the executor contract. Everything but the nonce, fees, amounts
+    # and route is fixed up front; a route's calldata is ABI-encoded once and only the two amount
+    # words are patched per trade. Signing is a direct RLP + keccak + secp256k1 signature, which
+    # is byte-for-byte what eth_account produces without its per-call validation.
+
+    def __init__(self, private_key, executor_address, chain_id=1, gas_limit=400000):
+        self.key = keys.PrivateKey(bytes.fromhex(private_key[2:] if private_key.startswith("0x") else private_key))
+        self.address = self.key.public_key.to_checksum_address()
+        self.to = bytes.fromhex(executor_address[2:])
+        self.chain_id = chain_id
+        self.gas_limit = gas_limit
+        self._calldata = {}  # route -> calldata with zeroed amounts
+
+    def calldata(self, route, amount_in, min_amount_out):
+        template = self._calldata.get(route)
+        if template is None:
+            pools = [pair.address for pair, _, _ in route.hops]
+            directions = [token_in == pair.token0.address for pair, token_in, _ in route.hops]
+            template = self._calldata[route] = EXECUTE_SELECTOR + encode(["uint256", "uint256", "address[]", "bool[]"], [0, 0, pools, directions])
+        return template[:4] + int(amount_in).to_bytes(32, "big") + int(min_amount_out).to_bytes(32, "big") + template[68:]
+
+    def sign(self, nonce, max_priority_fee_wei, max_fee_wei, data):
+        # Raw signed type-2 transaction bytes
+        fields = [self.chain_id, nonce, max_priority_fee_wei, max_fee_wei, self.gas_limit, self.to, 0, data, []]
+        signature = self.key.sign_msg_hash(keccak(b"\x02" + rlp.encode(fields)))
+        return b"\x02" + rlp.encode(fields + [signature.v, signature.r, signature.s])
+
+
+class BundleSubmitter:
+    # Sends bundles to a Flashbots-compatible relay (eth_sendBundle), one request per target
+    # block, all in flight at once. Requests are signed with the X-Flashbots-Signature header.
+
+    def __init__(self, relay_url=DEFAULT_RELAY_URL, signer_key=None, timeout=2):
+        self.relay_url = relay_url
+        self.signer = Account.from_key(signer_key) if signer_key else Account.create()  # reputation key only
+        self.timeout = timeout
+        self.session = None
+
+    def _session(self):
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self.session
+
+    async def send_bundle(self, raw_transactions, block_number):
+        body = json.dumps({"jsonrpc": "2.0", "id": block_number, "method": "eth_sendBundle", "params": [{
+            "txs": ["0x" + raw.hex() if isinstance(raw, bytes) else raw for raw in raw_transactions],
+            "blockNumber": hex(block_number)
+        }]})
+        signature = self.signer.sign_message(encode_defunct(text="0x" + keccak(text=body).hex())).signature.hex()
+        headers = {"Content-Type": "application/json", "X-Flashbots-Signature": f"{self.signer.address}:{signature}"}
+        async with self._session().post(self.relay_url, data=body, headers=headers) as response:
+            response.raise_for_status()
+            data = await response.json(content_type=None)
+        if "error" in data:
+            raise RuntimeError(f"eth_sendBundle for block {block_number} failed: {data['error']}")
+        return data["result"]
+
+    async def submit(self, raw_transactions, target_blocks):
+        # Results (or exceptions) per target block, in order
+        return await asyncio.gather(*(self.send_bundle(raw_transactions, block) for block in target_blocks), return_exceptions=True)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+
+class SubmissionPipeline:
+    # Detection-to-relay path. execute() patches the route's template, signs it and hands the
+    # bundle to an event loop on a background thread, so the caller only pays for the signature.
+    # Target blocks come from the head tracker, fees from the gas oracle's cache and the nonce
+    # from the nonce manager: no RPC round-trip before the bundle is sent.
+
+    def __init__(self, template, submitter, head, gas_oracle, nonces, rpc=None, target_block_count=3, priority_percentile=90):
+        self.template = template
+        self.submitter = submitter
+        self.head = head
+        self.gas_oracle = gas_oracle
+        self.nonces = nonces
+        self.rpc = rpc  # async client, to fetch the raw transactions we backrun
+        self.target_block_count = target_block_count
+        self.priority_percentile = priority_percentile
+        self.loop = None
+        self._thread = None
+        self._pending = set()  # submissions still in flight
+        self._resync_until = None  # last block one of our bundles targets
+        head.listeners.append(self._on_block)
+
+    def start(self):
+        if self._thread is None:
+            self.loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self.loop.run_forever, name="submission", daemon=True)
+            self._thread.start()
+            self.nonces.sync()
+        return self
+
+    def stop(self, timeout=5):
+        # Let bundles already handed over reach the relay, then close the sessions
+        if self._thread is not None:
+            concurrent.futures.wait(list(self._pending), timeout=timeout)
+            asyncio.run_coroutine_threadsafe(self.submitter.close(), self.loop).result(timeout=5)
+            if self.rpc is not None:
+                asyncio.run_coroutine_threadsafe(self.rpc.close(), self.loop).result(timeout=5)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _on_block(self, block_number):
+        # The nonce only moves when one of our bundles lands, so it is re-read only while blocks
+        # we targeted are being mined
+        if self.loop is None or self._resync_until is None:
+            return
+        if block_number > self._resync_until:
+            self._resync_until = None
+        self.loop.call_soon_threadsafe(self.loop.run_in_executor, None, self._sync_nonce)
+
+    def _sync_nonce(self):
+        try:
+            self.nonces.sync()
+        except Exception as e:
+            logging.warning(f"Nonce sync failed: {e}")
+
+    def fees(self):
+        # (max priority fee, max fee) in wei from the gas oracle cache; None when it is stale
+        if not self.gas_oracle.is_fresh:
+            return None
+        priority = self.gas_oracle.priority_fees_wei.get(self.priority_percentile, 0)
+        return priority, 2 * self.gas_oracle.base_fee_wei + priority
+
+    def build(self, route, amount_in, min_amount_out):
+        fees = self.fees()
+        if fees is None:
+            raise RuntimeError("no fresh gas price to sign with")
+        data = self.template.calldata(route, amount_in, min_amount_out)
+        return self.template.sign(self.nonces.current(), fees[0], fees[1], data)
+
+    def execute(self, route, amount_in, min_amount_out, after=None):
+        # Sign the trade and submit it for the next target blocks, behind the pending
+        # transaction hash `after` when backrunning. Returns a concurrent.futures.Future.
+        raw = self.build(route, amount_in, min_amount_out)
+        return self.submit_bundle([raw], after=after)
+
+    def submit_bundle(self, raw_transactions, after=None):
+        target_blocks = self.head.target_blocks(self.target_block_count)
+        if not target_blocks:
+            raise RuntimeError("no head block seen yet")
+        self._resync_until = max(self._resync_until or 0, target_blocks[-1])
+        future = asyncio.run_coroutine_threadsafe(self._submit(list(raw_transactions), target_blocks, after), self.loop)
+        self._pending.add(future)
+        future.add_done_callback(self._pending.discard)
+        return future
+
+    async def _submit(self, raw_transactions, target_blocks, after):
+        if after is not None:
+            victim = await self.rpc.call("eth_getRawTransactionByHash", [after])
+            if victim is None:
+                raise RuntimeError(f"pending transaction {after} is gone")
+            raw_transactions = [victim] + raw_transactions
+        results = await self.submitter.submit(raw_transactions, target_blocks)
+        for block, result in zip(target_blocks, results):
+            if isinstance(result, Exception):
+                logging.warning(f"Bundle for block {block} was not accepted: {result}")
+        return results
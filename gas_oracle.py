@@ -0,0 +1,131 @@
+import logging
+import threading
+import time
+
+
+class GasOracle:
+    # EIP-1559 gas prices served from memory. A background thread polls for new blocks over the
+    # client's keep-alive session and refreshes eth_feeHistory once per block, so reads in the
+    # monitoring loop never wait on the network. Values older than ttl seconds are refreshed
+    # inline on read as a fallback.
+
+    def __init__(self, rpc, reserve_cache=None, eth_pair=None, ttl=24, poll_interval=1, block_count=5, percentiles=(10, 50, 90)):
+        self.rpc = rpc
+        self.reserve_cache = reserve_cache
+        self.eth_pair = eth_pair  # WETH/stablecoin pair used to price gas, read from the reserve cache
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self.block_count = block_count
+        self.percentiles = list(percentiles)
+        self.block_number = None
+        self.base_fee_wei = None  # base fee of the next block
+        self.priority_fees_wei = {}  # percentile -> average priority fee over the sampled blocks
+        self.updated_at = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.block_listeners = []  # called with every block number the background thread sees
+
+    def refresh(self, block_tag="latest"):
+        history = self.rpc.call("eth_feeHistory", [hex(self.block_count), block_tag, self.percentiles])
+        # baseFeePerGas has one more entry than the sampled blocks: the base fee of the next block
+        base_fee_wei = int(history["baseFeePerGas"][-1], 16)
+        rewards = history.get("reward") or []
+        priority_fees_wei = {}
+        for index, percentile in enumerate(self.percentiles):
+            samples = [int(block[index], 16) for block in rewards if len(block) > index]
+            priority_fees_wei[percentile] = sum(samples) // len(samples) if samples else 0
+        block_number = int(history["oldestBlock"], 16) + max(len(history["baseFeePerGas"]) - 2, 0)
+
+        with self._lock:
+            self.base_fee_wei = base_fee_wei
+            self.priority_fees_wei = priority_fees_wei
+            self.block_number = block_number
+            self.updated_at = time.monotonic()
+
+    def state(self):
+        # Last fee sample with its wall-clock time, for a warm-start snapshot
+        with self._lock:
+            return {
+                "block_number": self.block_number,
+                "base_fee_wei": self.base_fee_wei,
+                "priority_fees_wei": {str(percentile): fee for percentile, fee in self.priority_fees_wei.items()},
+                "sampled_at": time.time() - (time.monotonic() - self.updated_at)
+            }
+
+    def restore(self, state):
+        # Reload a saved state(); it counts as fresh only for what is left of its ttl
+        with self._lock:
+            self.block_number = state["block_number"]
+            self.base_fee_wei = state["base_fee_wei"]
+            self.priority_fees_wei = {int(percentile): fee for percentile, fee in state["priority_fees_wei"].items()}
+            self.updated_at = time.monotonic() - max(time.time() - state["sampled_at"], 0)
+
+    def on_new_block(self, block_number):
+        # Refresh when a block newer than the last sample is seen
+        if self.block_number is None or block_number > self.block_number:
+            self.refresh()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                block_number = int(self.rpc.call("eth_blockNumber"), 16)
+                for listener in self.block_listeners:
+                    listener(block_number)
+                self.on_new_block(block_number)
+            except Exception as e:
+                logging.warning(f"Gas oracle refresh failed: {e}")
+            self._stop.wait(self.poll_interval)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="gas-oracle", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_interval + 1)
+
+    @property
+    def is_fresh(self):
+        return self.base_fee_wei is not None and time.monotonic() - self.updated_at <= self.ttl
+
+    def cached_gas_price_gwei(self, percentile=50):
+        # Base fee plus priority fee in Gwei from memory only; None when missing or stale
+        with self._lock:
+            if not self.is_fresh:
+                return None
+            return (self.base_fee_wei + self.priority_fees_wei.get(percentile, 0)) / 1e9
+
+    def gas_price_gwei(self, percentile=50):
+        gas_price_gwei = self.cached_gas_price_gwei(percentile)
+        if gas_price_gwei is None:
+            self.refresh()
+            gas_price_gwei = self.cached_gas_price_gwei(percentile)
+        return gas_price_gwei
+
+    def eth_price_usdc(self, reserves=None):
+        # ETH priced in the stablecoin side of eth_pair, from reserves ({pair address: reserves},
+        # e.g. a snapshot the caller already fetched) or else the cached reserves
+        if self.eth_pair is None:
+            return None
+        if reserves is not None and reserves.get(self.eth_pair.address) is not None:
+            reserves = reserves[self.eth_pair.address]
+        elif self.reserve_cache is not None:
+            reserves = self.reserve_cache.get(self.eth_pair.address)
+        else:
+            reserves = None
+        if reserves is None:
+            return None
+        price = self.eth_pair.price(reserves)  # token1 in token0
+        return price if self.eth_pair.token1.symbol == "WETH" else 1 / price
+
+    def gas_cost_usdc(self, gas_limit, percentile=50):
+        gas_price_gwei = self.gas_price_gwei(percentile)
+        eth_price = self.eth_price_usdc()
+        if gas_price_gwei is None or eth_price is None:
+            return None
+        return gas_price_gwei * 1e-9 * gas_limit * eth_price
@@ -0,0 +1,171 @@
+import json
+import logging
+import os
+import threading
+import time
+import numpy as np
+
+# Fixed-width little-endian records. Reserves are uint112 on chain, wider than any NumPy integer,
+# so each side is stored exactly as two uint64 words (low, high), as in scanner.SharedReserves;
+# exact_reserves() and float_reserves() put them back together.
+RECORD_DTYPE = np.dtype([
+    ("timestamp", "<f8"),
+    ("block_number", "<u8"),
+    ("pool_id", "<u4"),
+    ("reserve0_low", "<u8"),
+    ("reserve0_high", "<u8"),
+    ("reserve1_low", "<u8"),
+    ("reserve1_high", "<u8"),
+    ("gas_price_gwei", "<f8"),
+    ("profit", "<f8"),
+])
+
+WORD_MASK = 2**64 - 1
+
+MAGIC = b"ARBHIST2"  # Bump the version whenever RECORD_DTYPE changes
+HEADER_SIZE = 64  # Magic, zero padded so the records stay aligned
+
+
+def pools_path(path):
+    # Pool ids map to pair addresses through a JSON sidecar next to the data file
+    return path + ".pools.json"
+
+
+class HistoryRecorder:
+    # Buffers records in memory and appends them to a binary file from a background writer
+    # thread, so the monitoring loop never waits on disk I/O. Files are append-only: a crash
+    # loses at most the unflushed buffer, and a torn final record is ignored by load_history.
+
+    def __init__(self, path="historical_data.bin", flush_interval=1.0, batch_size=4096):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pool_ids = {}
+        self._pool_addresses = []
+        self._check_header()
+        self._truncate_torn_tail()
+        if os.path.exists(pools_path(path)):
+            with open(pools_path(path)) as file:
+                for address in json.load(file):
+                    self._pool_ids[address] = len(self._pool_addresses)
+                    self._pool_addresses.append(address)
+
+    def _check_header(self):
+        # Refuse to append to a file of another format or version, whose records would not line
+        # up with ours. A header cut short by a crash is dropped and written again.
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return
+        with open(self.path, "rb") as file:
+            header = file.read(HEADER_SIZE)
+        if len(header) < HEADER_SIZE and MAGIC.ljust(HEADER_SIZE, b"\0").startswith(header):
+            os.truncate(self.path, 0)
+        elif not header.startswith(MAGIC):
+            raise ValueError(f"{self.path} is not a history file in the {MAGIC.decode()} format; move it aside or set HISTORY_PATH")
+
+    def _truncate_torn_tail(self):
+        # Drop a partial record left by a crash mid-write so new records stay aligned
+        if not os.path.exists(self.path):
+            return
+        size = os.path.getsize(self.path)
+        if size <= HEADER_SIZE:
+            return
+        whole = HEADER_SIZE + (size - HEADER_SIZE) // RECORD_DTYPE.itemsize * RECORD_DTYPE.itemsize
+        if whole != size:
+            os.truncate(self.path, whole)
+
+    def pool_id(self, address):
+        # Stable id for a pool address; new pools are appended to the sidecar
+        pool_id = self._pool_ids.get(address)
+        if pool_id is None:
+            with self._lock:
+                pool_id = self._pool_ids.get(address)
+                if pool_id is None:
+                    pool_id = len(self._pool_addresses)
+                    self._pool_ids[address] = pool_id
+                    self._pool_addresses.append(address)
+                    with open(pools_path(self.path), "w") as file:
+                        json.dump(self._pool_addresses, file)
+        return pool_id
+
+    def record(self, block_number, pool_address, reserve0, reserve1, gas_price_gwei, profit):
+        reserve0, reserve1 = int(reserve0), int(reserve1)
+        row = (time.time(), block_number or 0, self.pool_id(pool_address),
+               reserve0 & WORD_MASK, reserve0 >> 64, reserve1 & WORD_MASK, reserve1 >> 64,
+               gas_price_gwei if gas_price_gwei is not None else np.nan,
+               profit if profit is not None else np.nan)
+        with self._lock:
+            self._buffer.append(row)
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+        if not rows:
+            return 0
+        records = np.array(rows, dtype=RECORD_DTYPE)
+        new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        with open(self.path, "ab") as file:
+            if new_file:
+                file.write(MAGIC.ljust(HEADER_SIZE, b"\0"))
+            records.tofile(file)
+        return len(records)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logging.error(f"Error storing historical data: {e}")
+        self.flush()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self):
+        # Stop the writer and flush whatever is still buffered
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+
+def load_history(path="historical_data.bin"):
+    # Memory-map a history file as a structured NumPy array (no parsing, no copy)
+    with open(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a history file")
+    count = (os.path.getsize(path) - HEADER_SIZE) // RECORD_DTYPE.itemsize
+    if count <= 0:
+        return np.zeros(0, dtype=RECORD_DTYPE)
+    return np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=HEADER_SIZE, shape=(count,))
+
+
+def load_pool_addresses(path="historical_data.bin"):
+    # Pair addresses indexed by pool_id
+    with open(pools_path(path)) as file:
+        return json.load(file)
+
+
+def exact_reserves(records, side):
+    # Reserves of one side (0 or 1) as exact Python ints, one per record
+    low, high = records[f"reserve{side}_low"].tolist(), records[f"reserve{side}_high"].tolist()
+    return [low_word | high_word << 64 for low_word, high_word in zip(low, high)]
+
+
+def float_reserves(records, side):
+    # Reserves of one side (0 or 1) as a float64 array, for analysis
+    return records[f"reserve{side}_low"].astype(np.float64) + records[f"reserve{side}_high"].astype(np.float64) * 2.0**64
@@ -1,76 +1,63 @@
-import requests
-import json
+import asyncio
+import cProfile
+import functools
+from collections import ChainMap
 import os
+import signal
 import time
 import threading
 import logging
-from datetime import datetime
 from dotenv import load_dotenv
-from web3 import Web3
-from flashbots import Flashbots
-
-# Load environment variables from a .env file
-load_dotenv()
-
-# Initialize Web3 with Infura
-infura_url = f"https://mainnet.infura.io/v3/{os.getenv('INFURA_PROJECT_ID')}"
-web3 = Web3(Web3.HTTPProvider(infura_url))
-
-# Initialize Flashbots
-flashbots = Flashbots(web3)
-
-# Configure logging
-logging.basicConfig(
-    filename="arbitrage_bot.log",
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s"
-)
+from mempool import decode_swap
+from pricing import register_engine
+from metrics import ITERATION_SECONDS, OPPORTUNITIES, STAGE_SECONDS, MetricsServer, registry as metrics_registry
+from reserves import BatchReserveReader
+from runtime import Runtime
+from sizing import is_closed_form, size_routes
+from rpc import AsyncRpcPool
+from work_queue import opportunity_key
+
+# Connections, pools and caches are created on first use, so importing this module has no side
+# effects (see runtime.py)
+runtime = Runtime()
+
+def configure_logging():
+    # Per-iteration detail (reserves, prices, gas, fees) is logged at DEBUG, so the loop only pays
+    # for console and file I/O when LOG_LEVEL=DEBUG
+    logging.basicConfig(
+        level=os.getenv("LOG_LEVEL", "INFO").upper(),
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        handlers=[logging.FileHandler("arbitrage_bot.log"), logging.StreamHandler()]
+    )
 
 def fetch_live_prices():
-    # Addresses for Uniswap and SushiSwap example pairs (e.g., WETH/USDC)
-    uniswap_pair_address = Web3.to_checksum_address("0xB4e16d0168e52d35CaCD2c6185b44281Ec28C9Dc")  # Uniswap WETH/USDC
-    sushiswap_pair_address = Web3.to_checksum_address("0x397FF1542f962076d0BFE58eA045FfA2d347ACa0")  # SushiSwap WETH/USDC
-
-    # ABI for Uniswap/SushiSwap pair contract (simplified for getReserves)
-    pair_abi = [
-        {
-            "constant": True,
-            "inputs": [],
-            "name": "getReserves",
-            "outputs": [
-                {"internalType": "uint112", "name": "_reserve0", "type": "uint112"},
-                {"internalType": "uint112", "name": "_reserve1", "type": "uint112"},
-                {"internalType": "uint32", "name": "_blockTimestampLast", "type": "uint32"}
-            ],
-            "payable": False,
-            "stateMutability": "view",
-            "type": "function"
-        }
-    ]
-
     try:
-        # Fetch reserves from Uniswap
-        uniswap_pair = web3.eth.contract(address=uniswap_pair_address, abi=pair_abi)
-        uniswap_reserves = uniswap_pair.functions.getReserves().call()
-        uniswap_price = (uniswap_reserves[0] / 10**6) / (uniswap_reserves[1] / 10**18)  # USDC/WETH
+        # Fetch reserves from Uniswap and SushiSwap in one request, pinned to the same block
+        snapshot = runtime.reserve_reader.fetch([runtime.uniswap_pair.address, runtime.sushiswap_pair.address])
+        uniswap_reserves = snapshot[runtime.uniswap_pair.address]
+        uniswap_price = runtime.uniswap_pair.price(uniswap_reserves)  # USDC/WETH
 
-        # Fetch reserves from SushiSwap
-        sushiswap_pair = web3.eth.contract(address=sushiswap_pair_address, abi=pair_abi)
-        sushiswap_reserves = sushiswap_pair.functions.getReserves().call()
-        sushiswap_price = (sushiswap_reserves[0] / 10**6) / (sushiswap_reserves[1] / 10**18)  # USDC/WETH
+        sushiswap_reserves = snapshot[runtime.sushiswap_pair.address]
+        sushiswap_price = runtime.sushiswap_pair.price(sushiswap_reserves)  # USDC/WETH
 
-        # Debugging: Print raw reserve values
-        print("Uniswap Reserves:", uniswap_reserves)
-        print("SushiSwap Reserves:", sushiswap_reserves)
+        # Debugging: Log raw reserve values
+        logging.debug("Uniswap Reserves: %s", uniswap_reserves)
+        logging.debug("SushiSwap Reserves: %s", sushiswap_reserves)
 
-        print("Live Prices:")
-        print(f"Uniswap WETH/USDC: {uniswap_price:.6f} USDC per WETH")
-        print(f"SushiSwap WETH/USDC: {sushiswap_price:.6f} USDC per WETH")
+        logging.debug("Live Prices: Uniswap WETH/USDC %.6f, SushiSwap WETH/USDC %.6f USDC per WETH", uniswap_price, sushiswap_price)
 
         return uniswap_price, sushiswap_price
     except Exception as e:
-        print(f"An error occurred while fetching prices: {e}")
+        logging.error(f"An error occurred while fetching prices: {e}")
+        return None, None
+
+def fetch_cached_prices():
+    # Prices from the Sync-fed reserve cache; returns None, None until both pools are loaded
+    uniswap_reserves = runtime.reserve_cache.get(runtime.uniswap_pair.address)
+    sushiswap_reserves = runtime.reserve_cache.get(runtime.sushiswap_pair.address)
+    if uniswap_reserves is None or sushiswap_reserves is None:
         return None, None
+    return runtime.uniswap_pair.price(uniswap_reserves), runtime.sushiswap_pair.price(sushiswap_reserves)
 
 def fetch_live_prices_with_timeout():
     try:
@@ -85,149 +72,130 @@ def fetch_live_prices_with_timeout():
         thread.join(timeout=5)  # Timeout after 5 seconds
 
         if thread.is_alive():
-            print("Fetching live prices timed out.")
+            logging.warning("Fetching live prices timed out.")
             return None, None
 
         return result[0]
     except Exception as e:
-        print(f"An error occurred while fetching live prices: {e}")
+        logging.error(f"An error occurred while fetching live prices: {e}")
         return None, None
 
 def fetch_buy_and_sell_prices():
     # Fetch both buying and selling prices from Uniswap and SushiSwap
     try:
-        uniswap_pair_address = Web3.to_checksum_address("0xB4e16d0168e52d35CaCD2c6185b44281Ec28C9Dc")  # Uniswap WETH/USDC
-        sushiswap_pair_address = Web3.to_checksum_address("0x397FF1542f962076d0BFE58eA045FfA2d347ACa0")  # SushiSwap WETH/USDC
-
-        pair_abi = [
-            {
-                "constant": True,
-                "inputs": [],
-                "name": "getReserves",
-                "outputs": [
-                    {"internalType": "uint112", "name": "_reserve0", "type": "uint112"},
-                    {"internalType": "uint112", "name": "_reserve1", "type": "uint112"},
-                    {"internalType": "uint32", "name": "_blockTimestampLast", "type": "uint32"}
-                ],
-                "payable": False,
-                "stateMutability": "view",
-                "type": "function"
-            }
-        ]
-
-        # Fetch reserves from Uniswap
-        uniswap_pair = web3.eth.contract(address=uniswap_pair_address, abi=pair_abi)
-        uniswap_reserves = uniswap_pair.functions.getReserves().call()
+        # Fetch reserves from Uniswap and SushiSwap in one request, pinned to the same block
+        snapshot = runtime.reserve_reader.fetch([runtime.uniswap_pair.address, runtime.sushiswap_pair.address])
+        uniswap_reserves = snapshot[runtime.uniswap_pair.address]
         uniswap_buy_price = (uniswap_reserves[1] / 10**6) / (uniswap_reserves[0] / 10**18)  # USDC/WETH
         uniswap_sell_price = (uniswap_reserves[0] / 10**6) / (uniswap_reserves[1] / 10**18)  # WETH/USDC
 
-        # Fetch reserves from SushiSwap
-        sushiswap_pair = web3.eth.contract(address=sushiswap_pair_address, abi=pair_abi)
-        sushiswap_reserves = sushiswap_pair.functions.getReserves().call()
+        sushiswap_reserves = snapshot[runtime.sushiswap_pair.address]
         sushiswap_buy_price = (sushiswap_reserves[1] / 10**6) / (sushiswap_reserves[0] / 10**18)  # USDC/WETH
         sushiswap_sell_price = (sushiswap_reserves[0] / 10**6) / (sushiswap_reserves[1] / 10**18)  # WETH/USDC
 
-        # Temporary console logs for debugging
-        print("Uniswap Reserves:", uniswap_reserves)
-        print("Uniswap Buy Price:", uniswap_buy_price)
-        print("Uniswap Sell Price:", uniswap_sell_price)
-        print("SushiSwap Reserves:", sushiswap_reserves)
-        print("SushiSwap Buy Price:", sushiswap_buy_price)
-        print("SushiSwap Sell Price:", sushiswap_sell_price)
+        # Debug logs
+        logging.debug("Uniswap Reserves: %s, Buy Price: %s, Sell Price: %s", uniswap_reserves, uniswap_buy_price, uniswap_sell_price)
+        logging.debug("SushiSwap Reserves: %s, Buy Price: %s, Sell Price: %s", sushiswap_reserves, sushiswap_buy_price, sushiswap_sell_price)
 
         return {
             "uniswap": {"buy": uniswap_buy_price, "sell": uniswap_sell_price},
             "sushiswap": {"buy": sushiswap_buy_price, "sell": sushiswap_sell_price}
         }
     except Exception as e:
-        print(f"An error occurred while fetching buy and sell prices: {e}")
+        logging.error(f"An error occurred while fetching buy and sell prices: {e}")
         return None
 
 def calculate_gas_price():
-    # Updated to use Infura API for gas prices
-    infura_url = f"https://mainnet.infura.io/v3/{os.getenv('INFURA_PROJECT_ID')}"
-    payload = {
-        "jsonrpc": "2.0",
-        "method": "eth_gasPrice",
-        "params": [],
-        "id": 1
-    }
-
+    # Updated to use Infura API for gas prices, over the pooled RPC session
     try:
-        response = requests.post(infura_url, json=payload, auth=(os.getenv('INFURA_PROJECT_ID'), os.getenv('INFURA_SECRET_KEY')))
-        if response.status_code == 200:
-            data = response.json()
-            gas_price_wei = int(data["result"], 16)  # Convert hex to integer
-            gas_price_gwei = gas_price_wei / 1e9  # Convert Wei to Gwei
-            print(f"Current Gas Price: {gas_price_gwei:.2f} Gwei")
-        else:
-            print(f"Error fetching gas prices: {response.status_code}")
+        gas_price_wei = int(runtime.rpc.call("eth_gasPrice"), 16)  # Convert hex to integer
+        gas_price_gwei = gas_price_wei / 1e9  # Convert Wei to Gwei
+        logging.info(f"Current Gas Price: {gas_price_gwei:.2f} Gwei")
     except Exception as e:
-        print(f"An error occurred: {e}")
+        logging.error(f"An error occurred: {e}")
 
 def fetch_dynamic_gas_price():
-    # Fetch real-time gas price from Infura
+    # Base fee plus median priority fee from the gas oracle, served from memory
     try:
-        payload = {
-            "jsonrpc": "2.0",
-            "method": "eth_gasPrice",
-            "params": [],
-            "id": 1
-        }
-        response = requests.post(infura_url, json=payload)
-        if response.status_code == 200:
-            data = response.json()
-            gas_price_wei = int(data["result"], 16)  # Convert hex to integer
-            gas_price_gwei = gas_price_wei / 1e9  # Convert Wei to Gwei
-            print(f"Dynamic Gas Price: {gas_price_gwei:.2f} Gwei")
-            return gas_price_gwei
-        else:
-            print(f"Error fetching gas price: {response.status_code}")
+        gas_price_gwei = runtime.gas_oracle.gas_price_gwei()
+        if gas_price_gwei is None:
+            logging.error("Error fetching gas price: no fee history available")
             return None
+        logging.debug("Dynamic Gas Price: %.2f Gwei", gas_price_gwei)
+        return gas_price_gwei
     except Exception as e:
-        print(f"An error occurred while fetching gas price: {e}")
+        logging.error(f"An error occurred while fetching gas price: {e}")
         return None
 
-def calculate_gas_cost(gas_price_gwei, gas_limit=21000):
-    # Calculate gas cost in USDC
-    eth_to_usdc_rate = 1800  # Example ETH to USDC conversion rate
+def calculate_gas_cost(gas_price_gwei, gas_limit=21000, reserves=None):
+    # Calculate gas cost in USDC, pricing ETH from the WETH/USDC reserves in reserves (the
+    # caller's snapshot) or else the reserve cache. None when neither has them.
+    eth_to_usdc_rate = runtime.gas_oracle.eth_price_usdc(reserves)
+    if eth_to_usdc_rate is None:
+        return None
     gas_cost_eth = (gas_price_gwei * 1e-9) * gas_limit
     gas_cost_usdc = gas_cost_eth * eth_to_usdc_rate
-    print(f"Gas Cost: {gas_cost_usdc:.2f} USDC")
+    logging.debug("Gas Cost: %.2f USDC", gas_cost_usdc)
     return gas_cost_usdc
 
-def calculate_slippage_impact(reserves, trade_amount, is_buy):
-    # Simulate the trade to calculate slippage impact
+def calculate_slippage_impact(reserves, trade_amount, is_buy, fee=0.003):
+    # Simulate the trade to calculate slippage impact, including the pool's swap fee
     try:
         reserve_in, reserve_out = reserves
         if is_buy:
             # Buying: Calculate the amount of output tokens received for the input amount
-            new_reserve_in = reserve_in + trade_amount
+            new_reserve_in = reserve_in + trade_amount * (1 - fee)
             new_reserve_out = reserve_out * reserve_in / new_reserve_in
             slippage_impact = reserve_out - new_reserve_out
         else:
             # Selling: Calculate the amount of input tokens required for the output amount
             new_reserve_out = reserve_out - trade_amount
             new_reserve_in = reserve_in * reserve_out / new_reserve_out
-            slippage_impact = new_reserve_in - reserve_in
+            slippage_impact = (new_reserve_in - reserve_in) / (1 - fee)
 
         return slippage_impact
     except Exception as e:
-        print(f"An error occurred while calculating slippage impact: {e}")
+        logging.error(f"An error occurred while calculating slippage impact: {e}")
         return None
 
+def best_weth_usdc_trade(reserves):
+    # (cycle, amount in wei) for the profit-maximizing WETH trade across the Uniswap/SushiSwap
+    # WETH/USDC pools, or (None, 0) when neither direction pays after fees, confirmed with exact
+    # integer swap math
+    sized = size_routes(runtime.weth_usdc_routes, reserves, exact=True)
+    if not sized:
+        return None, 0
+    return sized[0][0], sized[0][1]
+
+def size_weth_usdc_trade(reserves):
+    # Profit-maximizing WETH input in WETH (0 when no direction pays)
+    _, amount_in = best_weth_usdc_trade(reserves)
+    weth = runtime.registry.token("WETH")
+    return amount_in / 10**weth.decimals
+
 def find_arbitrage_opportunities():
-    uniswap_price, sushiswap_price = fetch_live_prices()
-    if uniswap_price is None or sushiswap_price is None:
-        print("Unable to fetch prices. Skipping arbitrage calculation.")
+    try:
+        with STAGE_SECONDS.time("reserves"):
+            snapshot = runtime.reserve_reader.fetch([runtime.uniswap_pair.address, runtime.sushiswap_pair.address])
+        uniswap_reserves = snapshot[runtime.uniswap_pair.address]
+        sushiswap_reserves = snapshot[runtime.sushiswap_pair.address]
+    except Exception as e:
+        logging.error(f"An error occurred while fetching prices: {e}")
+        logging.warning("Unable to fetch prices. Skipping arbitrage calculation.")
         return
+    uniswap_price = runtime.uniswap_pair.price(uniswap_reserves)
+    sushiswap_price = runtime.sushiswap_pair.price(sushiswap_reserves)
 
-    gas_price_gwei = fetch_dynamic_gas_price()
+    with STAGE_SECONDS.time("gas"):
+        gas_price_gwei = fetch_dynamic_gas_price()
     if gas_price_gwei is None:
-        print("Skipping iteration due to gas price fetch failure.")
+        logging.warning("Skipping iteration due to gas price fetch failure.")
         return
 
-    gas_cost_usdc = calculate_gas_cost(gas_price_gwei, gas_limit=210000)  # Example gas limit for a trade
+    gas_cost_usdc = calculate_gas_cost(gas_price_gwei, gas_limit=210000, reserves=snapshot.reserves)  # Example gas limit for a trade
+    if gas_cost_usdc is None:
+        logging.warning("Skipping iteration: no WETH/USDC reserves to price gas in USDC.")
+        return
 
     # Slippage tolerance (e.g., 0.5% = 0.005)
     slippage_tolerance = 0.005
@@ -236,15 +204,19 @@ def find_arbitrage_opportunities():
     uniswap_price_with_slippage = uniswap_price * (1 + slippage_tolerance)
     sushiswap_price_with_slippage = sushiswap_price * (1 - slippage_tolerance)
 
-    # Example trade amount in WETH (adjust as needed)
-    trade_amount = 1  # 1 WETH
+    # Profit-maximizing trade amount in WETH, falling back to 1 WETH to report slippage
+    with STAGE_SECONDS.time("sizing"):
+        trade_amount = size_weth_usdc_trade(snapshot.reserves) or 1
+    logging.debug("Optimal Trade Amount: %.6f WETH", trade_amount)
 
-    # Calculate slippage impact for Uniswap and SushiSwap
-    uniswap_slippage = calculate_slippage_impact((uniswap_reserves[0], uniswap_reserves[1]), trade_amount, is_buy=True)
-    sushiswap_slippage = calculate_slippage_impact((sushiswap_reserves[0], sushiswap_reserves[1]), trade_amount, is_buy=True)
+    # Calculate slippage impact (USDC per WETH lost to fee and price impact) for Uniswap and SushiSwap
+    weth = runtime.registry.token("WETH")
+    uniswap_received = calculate_slippage_impact(runtime.uniswap_pair.token_reserves(uniswap_reserves, weth), trade_amount, is_buy=True, fee=runtime.uniswap_pair.fee)
+    sushiswap_received = calculate_slippage_impact(runtime.sushiswap_pair.token_reserves(sushiswap_reserves, weth), trade_amount, is_buy=True, fee=runtime.sushiswap_pair.fee)
+    uniswap_slippage = uniswap_price - uniswap_received / trade_amount
+    sushiswap_slippage = sushiswap_price - sushiswap_received / trade_amount
 
-    print(f"Uniswap Slippage Impact: {uniswap_slippage:.6f}")
-    print(f"SushiSwap Slippage Impact: {sushiswap_slippage:.6f}")
+    logging.debug("Slippage Impact: Uniswap %.6f, SushiSwap %.6f", uniswap_slippage, sushiswap_slippage)
 
     # Adjust prices for slippage
     uniswap_price_with_slippage -= uniswap_slippage
@@ -253,22 +225,22 @@ def find_arbitrage_opportunities():
     if uniswap_price_with_slippage < sushiswap_price_with_slippage:
         profit = sushiswap_price_with_slippage - uniswap_price_with_slippage - gas_cost_usdc
         if profit > 0:
-            print(f"Arbitrage Opportunity: Buy on Uniswap at {uniswap_price:.6f} and sell on SushiSwap at {sushiswap_price:.6f}. Profit: {profit:.6f} USDC")
+            logging.info(f"Arbitrage Opportunity: Buy on Uniswap at {uniswap_price:.6f} and sell on SushiSwap at {sushiswap_price:.6f}. Profit: {profit:.6f} USDC")
         else:
-            print("No profitable arbitrage opportunity after accounting for gas and slippage.")
+            logging.debug("No profitable arbitrage opportunity after accounting for gas and slippage.")
     elif sushiswap_price_with_slippage < uniswap_price_with_slippage:
         profit = uniswap_price_with_slippage - sushiswap_price_with_slippage - gas_cost_usdc
         if profit > 0:
-            print(f"Arbitrage Opportunity: Buy on SushiSwap at {sushiswap_price:.6f} and sell on Uniswap at {uniswap_price:.6f}. Profit: {profit:.6f} USDC")
+            logging.info(f"Arbitrage Opportunity: Buy on SushiSwap at {sushiswap_price:.6f} and sell on Uniswap at {uniswap_price:.6f}. Profit: {profit:.6f} USDC")
         else:
-            print("No profitable arbitrage opportunity after accounting for gas and slippage.")
+            logging.debug("No profitable arbitrage opportunity after accounting for gas and slippage.")
     else:
-        print("No arbitrage opportunities found.")
+        logging.debug("No arbitrage opportunities found.")
 
 def find_arbitrage_opportunities_with_depth():
     prices = fetch_buy_and_sell_prices()
     if not prices:
-        print("Unable to fetch prices. Skipping arbitrage calculation.")
+        logging.warning("Unable to fetch prices. Skipping arbitrage calculation.")
         return
 
     uniswap_buy = prices["uniswap"]["buy"]
@@ -276,19 +248,17 @@ def find_arbitrage_opportunities_with_depth():
     sushiswap_buy = prices["sushiswap"]["buy"]
     sushiswap_sell = prices["sushiswap"]["sell"]
 
-    print("Prices:")
-    print(f"Uniswap - Buy: {uniswap_buy:.6f}, Sell: {uniswap_sell:.6f}")
-    print(f"SushiSwap - Buy: {sushiswap_buy:.6f}, Sell: {sushiswap_sell:.6f}")
+    logging.debug("Prices: Uniswap - Buy: %.6f, Sell: %.6f; SushiSwap - Buy: %.6f, Sell: %.6f", uniswap_buy, uniswap_sell, sushiswap_buy, sushiswap_sell)
 
     # Calculate arbitrage opportunities
     if uniswap_buy < sushiswap_sell:
         profit = sushiswap_sell - uniswap_buy
-        print(f"Arbitrage Opportunity: Buy on Uniswap at {uniswap_buy:.6f} and sell on SushiSwap at {sushiswap_sell:.6f}. Profit: {profit:.6f} USDC")
+        logging.info(f"Arbitrage Opportunity: Buy on Uniswap at {uniswap_buy:.6f} and sell on SushiSwap at {sushiswap_sell:.6f}. Profit: {profit:.6f} USDC")
     elif sushiswap_buy < uniswap_sell:
         profit = uniswap_sell - sushiswap_buy
-        print(f"Arbitrage Opportunity: Buy on SushiSwap at {sushiswap_buy:.6f} and sell on Uniswap at {uniswap_sell:.6f}. Profit: {profit:.6f} USDC")
+        logging.info(f"Arbitrage Opportunity: Buy on SushiSwap at {sushiswap_buy:.6f} and sell on Uniswap at {uniswap_sell:.6f}. Profit: {profit:.6f} USDC")
     else:
-        print("No arbitrage opportunities found.")
+        logging.debug("No arbitrage opportunities found.")
 
 def is_transaction_worth(profit, flashloan_amount):
     # Aave flashloan interest rate (0.09%)
@@ -303,139 +273,352 @@ def fetch_flashloan_fee():
     try:
         # Placeholder: Replace with actual API or contract call to fetch flashloan fee
         flashloan_fee_rate = 0.0009  # Aave's default flashloan fee rate (0.09%)
-        print(f"Flashloan Fee Rate: {flashloan_fee_rate * 100:.2f}%")
+        logging.debug("Flashloan Fee Rate: %.2f%%", flashloan_fee_rate * 100)
         return flashloan_fee_rate
     except Exception as e:
-        print(f"An error occurred while fetching flashloan fee: {e}")
+        logging.error(f"An error occurred while fetching flashloan fee: {e}")
         return None
 
-def monitor_arbitrage_opportunities():
-    print("Starting arbitrage monitoring...")
+def evaluate_opportunity(uniswap_price, sushiswap_price, gas_price_gwei, flashloan_fee_rate, trade_amount=1, reserves=None, block_number=None):
+    # Price in gas, slippage and flashloan fees for one set of prices, then queue the
+    # notification, trade and history record (each skipped when the same route, block and
+    # reserves were already queued)
+    gas_cost_usdc = calculate_gas_cost(gas_price_gwei, gas_limit=210000, reserves=reserves)  # Example gas limit for a trade
+    if gas_cost_usdc is None:
+        logging.warning(f"Skipping block {block_number}: no WETH/USDC reserves to price gas in USDC.")
+        return None
+
+    # Slippage tolerance (e.g., 0.5% = 0.005)
+    slippage_tolerance = 0.005
+
+    # Adjust prices for slippage
+    uniswap_price_with_slippage = uniswap_price * (1 + slippage_tolerance)
+    sushiswap_price_with_slippage = sushiswap_price * (1 - slippage_tolerance)
+
+    flashloan_amount = 1000  # Example flashloan amount in USDC
+
+    flashloan_fee = flashloan_amount * flashloan_fee_rate
+    logging.debug("Flashloan Fee: %.2f USDC", flashloan_fee)
+
+    profit_threshold = 10  # Minimum profit threshold in USDC
+
+    with STAGE_SECONDS.time("simulation"):
+        net_profit = simulate_transaction(
+            buy_price=uniswap_price_with_slippage,
+            sell_price=sushiswap_price_with_slippage,
+            trade_amount=trade_amount,  # Trade amount in WETH
+            gas_cost=gas_cost_usdc,
+            flashloan_fee=flashloan_fee
+        )
+
+    # The two WETH/USDC pools, which every route this checks goes through
+    pool_reserves = {address: (reserves or {}).get(address) for address in (runtime.uniswap_pair.address, runtime.sushiswap_pair.address)}
+    if net_profit and net_profit > profit_threshold:
+        OPPORTUNITIES.inc("weth_usdc")
+        logging.info(f"Profitable opportunity detected: {net_profit:.2f} USDC")
+        route, amount_in = best_weth_usdc_trade(reserves) if reserves else (None, 0)
+        key = opportunity_key(route, block_number, pool_reserves, kind="weth_usdc")
+        runtime.notification_queue.submit(send_notification, f"Profitable opportunity: {net_profit:.2f} USDC", key=key)
+        runtime.execution_queue.submit(execute_transaction, route, amount_in, key=key)
+    else:
+        logging.debug("No profitable opportunities above the threshold.")
+
+    # Store historical data (once per block and reserves)
+    runtime.storage_queue.submit(store_historical_data, {
+        "block_number": block_number,
+        "reserves": pool_reserves,
+        "gas_price_gwei": gas_price_gwei,
+        "net_profit": net_profit
+    }, key=(block_number, tuple(tuple(value[:2]) if value else None for value in pool_reserves.values())))
+
+    if uniswap_price_with_slippage < sushiswap_price_with_slippage:
+        profit = sushiswap_price_with_slippage - uniswap_price_with_slippage - gas_cost_usdc - flashloan_fee
+        if is_transaction_worth(profit, flashloan_amount):
+            logging.info(f"Arbitrage Opportunity: Buy on Uniswap at {uniswap_price:.6f} and sell on SushiSwap at {sushiswap_price:.6f}. Profit: {profit:.6f} USDC")
+        else:
+            logging.debug("Opportunity not worth executing after accounting for flashloan interest.")
+    elif sushiswap_price_with_slippage < uniswap_price_with_slippage:
+        profit = uniswap_price_with_slippage - sushiswap_price_with_slippage - gas_cost_usdc - flashloan_fee
+        if is_transaction_worth(profit, flashloan_amount):
+            logging.info(f"Arbitrage Opportunity: Buy on SushiSwap at {sushiswap_price:.6f} and sell on Uniswap at {uniswap_price:.6f}. Profit: {profit:.6f} USDC")
+        else:
+            logging.debug("Opportunity not worth executing after accounting for flashloan interest.")
+    else:
+        logging.debug("No arbitrage opportunities found.")
+    return net_profit
+
+def find_cycle_opportunities(touched=None):
+    # Re-check only the cycles through pools that changed (all cycles when touched is None),
+    # size every profitable one in a single vectorized pass, then confirm the profit in wei
+    # with the AMM simulator
+    if runtime.scanner is not None:
+        # Same search, sizing and simulation, split across the scan workers
+        with STAGE_SECONDS.time("cycle_search"):
+            runtime.scanner.publish(runtime.reserve_cache.reserves, touched, runtime.reserve_cache.block_number)
+            sized = runtime.scanner.scan(touched)
+    else:
+        with STAGE_SECONDS.time("cycle_search"):
+            opportunities = runtime.cycle_engine.update(runtime.reserve_cache.reserves, touched)
+        with STAGE_SECONDS.time("sizing"):
+            sized = size_routes([cycle for cycle, _ in opportunities], runtime.reserve_cache.reserves)
+        with STAGE_SECONDS.time("simulation"):
+            runtime.amm.update(runtime.reserve_cache.reserves, touched, runtime.reserve_cache.block_number)
+            simulated = runtime.amm.evaluate([cycle for cycle, _, _ in sized], [amount_in for _, amount_in, _ in sized])
+        sized = [(cycle, amount_in, profit) for (cycle, _, _), (amount_in, _, profit) in zip(sized, simulated) if profit > 0]
+        sized.sort(key=lambda item: item[2], reverse=True)
+    if sized:
+        OPPORTUNITIES.inc("cycle", amount=len(sized))
+    for cycle, amount_in, profit in sized:
+        token = runtime.registry.token(cycle.start_token)
+        logging.info(f"Cycle Opportunity: {cycle} trade {amount_in / 10**token.decimals:.6f} {token.symbol} for {profit / 10**token.decimals:.6f} {token.symbol} profit before gas")
+    return sized
+
+def monitor_iteration(touched):
+    # One pass of the monitoring loop over the pools touched since the last pass.
+    # Returns False when monitoring should stop.
     try:
-        while True:
-            uniswap_price, sushiswap_price = fetch_live_prices_with_timeout()
-            if uniswap_price is None or sushiswap_price is None:
-                print("Unable to fetch prices. Skipping this iteration.")
-                time.sleep(2)  # Reduced wait time before retrying
-                continue
+        with STAGE_SECONDS.time("reserves"):
+            touched |= runtime.reserve_cache.poll()
+    except Exception as e:
+        logging.error(f"An error occurred while updating reserves: {e}")
+        return True
 
-            gas_price_gwei = fetch_dynamic_gas_price()
-            if gas_price_gwei is None:
-                print("Skipping iteration due to gas price fetch failure.")
-                return
+    # Nothing to re-evaluate until one of our pools changes
+    if not touched:
+        return True
 
-            gas_cost_usdc = calculate_gas_cost(gas_price_gwei, gas_limit=210000)  # Example gas limit for a trade
+    find_cycle_opportunities(touched)
+    if runtime.uniswap_pair.address not in touched and runtime.sushiswap_pair.address not in touched:
+        touched.clear()
+        return True
+    touched.clear()
 
-            # Slippage tolerance (e.g., 0.5% = 0.005)
-            slippage_tolerance = 0.005
+    uniswap_price, sushiswap_price = fetch_cached_prices()
+    if uniswap_price is None or sushiswap_price is None:
+        logging.warning("Unable to fetch prices. Skipping this iteration.")
+        return True
+
+    with STAGE_SECONDS.time("gas"):
+        gas_price_gwei = fetch_dynamic_gas_price()
+    if gas_price_gwei is None:
+        logging.warning("Skipping iteration due to gas price fetch failure.")
+        return False
 
-            # Adjust prices for slippage
-            uniswap_price_with_slippage = uniswap_price * (1 + slippage_tolerance)
-            sushiswap_price_with_slippage = sushiswap_price * (1 - slippage_tolerance)
+    with STAGE_SECONDS.time("fee"):
+        flashloan_fee_rate = fetch_flashloan_fee()
+    if flashloan_fee_rate is None:
+        logging.warning("Skipping iteration due to flashloan fee fetch failure.")
+        return False
 
-            flashloan_amount = 1000  # Example flashloan amount in USDC
+    with STAGE_SECONDS.time("sizing"):
+        trade_amount = size_weth_usdc_trade(runtime.reserve_cache.reserves)
+    evaluate_opportunity(uniswap_price, sushiswap_price, gas_price_gwei, flashloan_fee_rate, trade_amount,
+                         reserves=runtime.reserve_cache.reserves, block_number=runtime.reserve_cache.block_number)
+    return True
 
-            flashloan_fee_rate = fetch_flashloan_fee()
-            if flashloan_fee_rate is None:
-                print("Skipping iteration due to flashloan fee fetch failure.")
+def monitor_arbitrage_opportunities(max_iterations=None, interval=2):
+    print("Starting arbitrage monitoring...")
+    try:
+        runtime.start_scanner()
+        # Load reserves once (from the warm-start snapshot, or optionally from an older block),
+        # then follow Sync logs
+        backfill_from = os.getenv("BACKFILL_FROM_BLOCK")
+        runtime.start_reserves(from_block=int(backfill_from) if backfill_from else None)
+        runtime.gas_oracle.start()
+        runtime.history.start()
+        if runtime.submission is not None:
+            runtime.submission.start()
+        runtime.start_work_queues()
+        touched = set(runtime.registry.addresses)  # Evaluate every pool once on startup
+
+        iterations = 0
+        while max_iterations is None or iterations < max_iterations:
+            iterations += 1
+            with ITERATION_SECONDS.time():
+                keep_going = monitor_iteration(touched)
+            if not keep_going:
                 return
-
-            flashloan_fee = flashloan_amount * flashloan_fee_rate
-            print(f"Flashloan Fee: {flashloan_fee:.2f} USDC")
-
-            profit_threshold = 10  # Minimum profit threshold in USDC
-
-            net_profit = simulate_transaction(
-                buy_price=uniswap_price_with_slippage,
-                sell_price=sushiswap_price_with_slippage,
-                trade_amount=1,  # Example trade amount in WETH
-                gas_cost=gas_cost_usdc,
-                flashloan_fee=flashloan_fee
-            )
-
-            if net_profit and net_profit > profit_threshold:
-                logging.info(f"Profitable opportunity detected: {net_profit:.2f} USDC")
-                send_notification(f"Profitable opportunity: {net_profit:.2f} USDC")
-                execute_transaction()
-            else:
-                logging.info("No profitable opportunities above the threshold.")
-
-            # Store historical data
-            store_historical_data({
-                "uniswap_price": uniswap_price,
-                "sushiswap_price": sushiswap_price,
-                "net_profit": net_profit
-            })
-
-            if uniswap_price_with_slippage < sushiswap_price_with_slippage:
-                profit = sushiswap_price_with_slippage - uniswap_price_with_slippage - gas_cost_usdc - flashloan_fee
-                if is_transaction_worth(profit, flashloan_amount):
-                    print(f"Arbitrage Opportunity: Buy on Uniswap at {uniswap_price:.6f} and sell on SushiSwap at {sushiswap_price:.6f}. Profit: {profit:.6f} USDC")
-                else:
-                    print("Opportunity not worth executing after accounting for flashloan interest.")
-            elif sushiswap_price_with_slippage < uniswap_price_with_slippage:
-                profit = uniswap_price_with_slippage - sushiswap_price_with_slippage - gas_cost_usdc - flashloan_fee
-                if is_transaction_worth(profit, flashloan_amount):
-                    print(f"Arbitrage Opportunity: Buy on SushiSwap at {sushiswap_price:.6f} and sell on Uniswap at {uniswap_price:.6f}. Profit: {profit:.6f} USDC")
-                else:
-                    print("Opportunity not worth executing after accounting for flashloan interest.")
-            else:
-                print("No arbitrage opportunities found.")
-
-            time.sleep(2)  # Reduced wait time between iterations
+            time.sleep(interval)  # Reduced wait time between iterations
     except KeyboardInterrupt:
         print("Arbitrage monitoring stopped.")
+    finally:
+        runtime.close_work_queues()
+        runtime.history.close()
+        if runtime.submission is not None:
+            runtime.submission.stop()
+        runtime.stop_scanner()
+
+class AsyncArbitrageMonitor:
+    # asyncio version of monitor_arbitrage_opportunities. Reserves, gas price and flashloan fee
+    # are fetched concurrently over async keep-alive sessions, so an iteration takes as long as the
+    # slowest fetch rather than the sum of all of them, and no thread is started per call.
+
+    def __init__(self, rpc_url=None, interval=2, timeout=5):
+        self.rpc = AsyncRpcPool.from_urls([rpc_url], timeout=timeout) if rpc_url else runtime.async_rpc_pool(timeout)
+        self.reader = BatchReserveReader(self.rpc, registry=runtime.registry)
+        self.interval = interval
+        self.timeout = timeout
+
+    async def fetch_prices(self):
+        # Both pools in one request, pinned to the same block
+        snapshot = await self.reader.fetch_async([runtime.uniswap_pair.address, runtime.sushiswap_pair.address])
+        uniswap_price = runtime.uniswap_pair.price(snapshot[runtime.uniswap_pair.address])
+        sushiswap_price = runtime.sushiswap_pair.price(snapshot[runtime.sushiswap_pair.address])
+        return uniswap_price, sushiswap_price, snapshot
+
+    async def fetch_gas_price(self):
+        # The gas oracle answers from memory while it is fresh
+        cached = runtime.gas_oracle.cached_gas_price_gwei()
+        if cached is not None:
+            return cached
+        gas_price_wei = int(await self.rpc.call("eth_gasPrice"), 16)
+        gas_price_gwei = gas_price_wei / 1e9  # Convert Wei to Gwei
+        logging.debug("Dynamic Gas Price: %.2f Gwei", gas_price_gwei)
+        return gas_price_gwei
+
+    async def fetch_flashloan_fee(self):
+        # No I/O yet; this is where an on-chain fee lookup would be awaited
+        return fetch_flashloan_fee()
+
+    async def _fetch(self, name, stage, coro):
+        # Run one fetch with its own timeout, timed as stage; failures come back as None
+        try:
+            with STAGE_SECONDS.time(stage):
+                return await asyncio.wait_for(coro, timeout=self.timeout)
+        except asyncio.TimeoutError:
+            logging.warning(f"Fetching {name} timed out.")
+        except Exception as e:
+            logging.error(f"An error occurred while fetching {name}: {e}")
+        return None
+
+    async def run_iteration(self):
+        prices = asyncio.ensure_future(self._fetch("live prices", "reserves", self.fetch_prices()))
+        gas = asyncio.ensure_future(self._fetch("gas price", "gas", self.fetch_gas_price()))
+        fee = asyncio.ensure_future(self._fetch("flashloan fee", "fee", self.fetch_flashloan_fee()))
+
+        # Without prices there is nothing to evaluate, so the other fetches are cancelled
+        price_result = await prices
+        if price_result is None:
+            gas.cancel()
+            fee.cancel()
+            await asyncio.gather(gas, fee, return_exceptions=True)
+            logging.warning("Unable to fetch prices. Skipping this iteration.")
+            return None
+
+        gas_price_gwei, flashloan_fee_rate = await asyncio.gather(gas, fee)
+        if gas_price_gwei is None:
+            logging.warning("Skipping iteration due to gas price fetch failure.")
+            return None
+        if flashloan_fee_rate is None:
+            logging.warning("Skipping iteration due to flashloan fee fetch failure.")
+            return None
+
+        uniswap_price, sushiswap_price, snapshot = price_result
+        with STAGE_SECONDS.time("sizing"):
+            trade_amount = size_weth_usdc_trade(snapshot.reserves)
+        # Evaluated on a worker thread: queueing the history record may wait for room (the storage
+        # queue blocks for up to 10ms), which must not hold up the event loop
+        evaluate = functools.partial(evaluate_opportunity, uniswap_price, sushiswap_price, gas_price_gwei, flashloan_fee_rate,
+                                     trade_amount, reserves=snapshot.reserves, block_number=snapshot.block_number)
+        return await asyncio.get_running_loop().run_in_executor(None, evaluate)
+
+    async def run(self):
+        print("Starting async arbitrage monitoring...")
+        runtime.gas_oracle.start()
+        runtime.history.start()
+        if runtime.submission is not None:
+            runtime.submission.start()
+        runtime.start_work_queues()
+        try:
+            while True:
+                with ITERATION_SECONDS.time():
+                    await self.run_iteration()
+                await asyncio.sleep(self.interval)
+        finally:
+            await self.rpc.close()
+            runtime.close_work_queues()
+            runtime.history.close()
+            if runtime.submission is not None:
+                runtime.submission.stop()
 
 def submit_transaction_via_flashbots(transaction):
+    # Submit raw signed transactions (hex or bytes) as a bundle for the next target blocks.
+    # Returns a future with the relay's answer per block, or None when submission is disabled.
+    if runtime.submission is None:
+        logging.warning("Flashbots submission is disabled (set PRIVATE_KEY and EXECUTOR_ADDRESS).")
+        return None
     try:
-        # Submit the transaction bundle via Flashbots
-        bundle = [{"signed_transaction": transaction}]
-        response = flashbots.send_bundle(bundle, target_block_number=web3.eth.block_number + 1)
-        if response["success"]:
-            print("Transaction successfully submitted via Flashbots.")
-        else:
-            print("Flashbots submission failed.")
+        raw_transactions = transaction if isinstance(transaction, (list, tuple)) else [transaction]
+        return runtime.submission.submit_bundle(raw_transactions)
     except Exception as e:
-        print(f"An error occurred while submitting via Flashbots: {e}")
+        logging.error(f"An error occurred while submitting via Flashbots: {e}")
+        return None
 
-def monitor_mempool():
+def monitor_mempool(max_iterations=None, interval=1):
     print("Monitoring mempool for profitable transactions...")
     try:
-        while True:
-            # Example logic to monitor mempool (simplified)
-            pending_transactions = web3.eth.get_block("pending")["transactions"]
+        if runtime.reserve_cache.block_number is None:
+            runtime.start_reserves()
+        if runtime.submission is not None:
+            # Bundles are signed with the oracle's cached fees
+            runtime.gas_oracle.start()
+            runtime.submission.start()
+        runtime.execution_queue.start()
+        iterations = 0
+        while max_iterations is None or iterations < max_iterations:
+            iterations += 1
+            try:
+                # Keep the reserves current, then look only at transactions not seen before
+                runtime.reserve_cache.poll()
+                with STAGE_SECONDS.time("mempool"):
+                    pending_transactions = runtime.pending_stream.poll(runtime.reserve_cache.block_number)
+            except Exception as e:
+                logging.error(f"An error occurred while polling the mempool: {e}")
+                pending_transactions = []
             for tx in pending_transactions:
-                # Analyze transaction for profitability (placeholder logic)
-                if is_profitable_transaction(tx):
-                    print(f"Profitable transaction detected: {tx}")
-                    # Submit a frontrunning transaction via Flashbots
-                    submit_transaction_via_flashbots(tx)
-            time.sleep(1)  # Poll the mempool every second
+                # Price the pools as they will be after this swap lands
+                try:
+                    opportunities = find_backrun_opportunities(tx)
+                except Exception as e:
+                    logging.error(f"An error occurred while analyzing the transaction: {e}")
+                    continue
+                if opportunities:
+                    cycle, amount_in, profit = opportunities[0]
+                    token = runtime.registry.token(cycle.start_token)
+                    logging.info(f"Profitable transaction detected: {tx['hash']} backrun {cycle} trade {amount_in / 10**token.decimals:.6f} {token.symbol} for {profit / 10**token.decimals:.6f} {token.symbol} profit before gas")
+                    # Bundle the pending swap with our trade right behind it. The executor only swaps
+                    # through constant-product pools, so routes through Curve or Balancer are not sent.
+                    executable = [item for item in opportunities if is_closed_form(item[0])]
+                    if executable:
+                        cycle, amount_in, _ = executable[0]
+                        runtime.execution_queue.submit(execute_transaction, cycle, amount_in, after=tx["hash"],
+                                                       key=(cycle, runtime.reserve_cache.block_number, tx["hash"]))
+            time.sleep(interval)  # Poll the mempool every second
     except KeyboardInterrupt:
         print("Mempool monitoring stopped.")
+    finally:
+        runtime.execution_queue.close()
+        if runtime.submission is not None:
+            runtime.submission.stop()
+
+def find_backrun_opportunities(transaction):
+    # Decode a pending router swap, project it onto the cached reserves and size the cycles
+    # through the pools it moves, exactly, as (cycle, amount_in, profit) best first
+    swap = decode_swap(transaction)
+    if swap is None:
+        return []
+    projected = runtime.swap_projector.project(swap, runtime.reserve_cache.reserves)
+    if not projected:
+        return []
+    reserves = ChainMap(projected, runtime.reserve_cache.reserves)
+    return size_routes(runtime.cycle_engine.cycles_through(projected), reserves, exact=True)
 
 def is_profitable_transaction(transaction):
-    # Analyze the transaction to determine if it is profitable
+    # Analyze the transaction to determine if it is profitable to trade behind it
     try:
-        # Extract relevant details from the transaction
-        gas_price = transaction.get('gasPrice', 0)
-        value = transaction.get('value', 0)
-        input_data = transaction.get('input', '')
-
-        # Placeholder: Check if the transaction involves a known DEX pair (e.g., WETH/USDC)
-        if "WETH" in input_data and "USDC" in input_data:
-            # Estimate the cost of the transaction in USDC
-            gas_cost_usdc = (gas_price / 1e9) * 0.0001  # Example conversion rate
-
-            # Placeholder: Simulate the transaction to estimate profit
-            estimated_profit = value - gas_cost_usdc
-
-            # Return True if the profit is positive
-            return estimated_profit > 0
-
-        return False
+        return bool(find_backrun_opportunities(transaction))
     except Exception as e:
-        print(f"An error occurred while analyzing the transaction: {e}")
+        logging.error(f"An error occurred while analyzing the transaction: {e}")
         return False
 
 def simulate_transaction(buy_price, sell_price, trade_amount, gas_cost, flashloan_fee):
@@ -449,15 +632,21 @@ def simulate_transaction(buy_price, sell_price, trade_amount, gas_cost, flashloa
         logging.error(f"Error in transaction simulation: {e}")
         return None
 
-def add_dex_support():
-    # Placeholder for adding support for additional DEXs like PancakeSwap or Curve
-    logging.info("Adding support for additional DEXs is a future enhancement.")
+def add_dex_support(kind, engine_class):
+    # Register a pricing engine (a pricing.PricingEngine subclass) for pools of type kind, so
+    # pairs with that "type" in the pair config are priced, read and simulated through it.
+    # Call it before the pair registry is loaded. Constant-product, Curve StableSwap and
+    # Balancer weighted pools are built in.
+    register_engine(kind, engine_class)
+    logging.info(f"Pricing engine for {kind} pools: {engine_class.__name__}")
 
 def store_historical_data(data):
-    # Store historical price and transaction data for analysis
+    # Store historical reserves, gas and profit for analysis (one record per pool, buffered)
     try:
-        with open("historical_data.csv", "a") as file:
-            file.write(f"{datetime.now()},{data}\n")
+        for address, reserves in data["reserves"].items():
+            if reserves is None:
+                continue
+            runtime.history.record(data["block_number"], address, reserves[0], reserves[1], data["gas_price_gwei"], data["net_profit"])
     except Exception as e:
         logging.error(f"Error storing historical data: {e}")
 
@@ -465,13 +654,65 @@ def send_notification(message):
     # Placeholder for sending real-time notifications (e.g., via email or Telegram)
     logging.info(f"Notification sent: {message}")
 
-def execute_transaction():
-    # Placeholder for automating transaction execution
-    logging.info("Transaction execution is a future enhancement.")
+def execute_transaction(route=None, amount_in=0, min_profit=1, after=None):
+    # Sign a call to the executor contract for route and send it to the relay, reverting on
+    # chain unless it returns at least amount_in + min_profit. Returns the submission future
+    # (relay answers per target block), or None when execution is disabled or fails.
+    if runtime.submission is None or route is None or amount_in <= 0:
+        logging.info("Transaction execution is disabled (set PRIVATE_KEY and EXECUTOR_ADDRESS).")
+        return None
+    try:
+        with STAGE_SECONDS.time("submission"):
+            return runtime.submission.execute(route, amount_in, amount_in + min_profit, after=after)
+    except Exception as e:
+        logging.error(f"An error occurred while executing the transaction: {e}")
+        return None
+
+def run_monitor():
+    if os.getenv("ASYNC_MONITOR"):
+        try:
+            asyncio.run(AsyncArbitrageMonitor().run())
+        except KeyboardInterrupt:
+            print("Arbitrage monitoring stopped.")
+    else:
+        monitor_arbitrage_opportunities()
+
+def exit_on_sigterm(signum, frame):
+    raise SystemExit(0)
+
+def run():
+    # PROFILE=<path> runs the bot under cProfile and writes the stats there on exit
+    profile_path = os.getenv("PROFILE")
+    if not profile_path:
+        run_monitor()
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        run_monitor()
+    finally:
+        profiler.disable()
+        profiler.dump_stats(profile_path)
+        print(f"Profile written to {profile_path} (view with: python -m pstats {profile_path})")
 
 def main():
+    # Load environment variables from a .env file
+    load_dotenv()
+    configure_logging()
     print("Welcome to the Arbitrage Bot!")
-    monitor_arbitrage_opportunities()
+    # Stage timings and RPC counters for Prometheus at http://127.0.0.1:<METRICS_PORT>/metrics
+    if os.getenv("METRICS_PORT"):
+        MetricsServer(metrics_registry, port=int(os.getenv("METRICS_PORT"))).start()
+
+    # A deploy's SIGTERM unwinds like Ctrl-C, so the warm-start snapshot still gets written
+    signal.signal(signal.SIGTERM, exit_on_sigterm)
+    try:
+        run()
+    finally:
+        try:
+            runtime.save_snapshot()
+        except Exception as e:
+            logging.error(f"An error occurred while saving the warm-start snapshot: {e}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,228 @@
+from collections import OrderedDict
+from eth_abi import decode
+from rpc import RpcError
+from sizing import fee_numerator, get_amount_in, get_amount_out
+
+# Uniswap V2 style routers whose swaps can be projected onto tracked pools (router -> DEX name
+# used in the pair config)
+DEFAULT_ROUTERS = {
+    "0x7a250d5630b4cf539739df2c5dacb4c659f2488d": "uniswap",  # UniswapV2Router02
+    "0xd9e1ce17f2641f24ae83637ab66a2cca9c378b9f": "sushiswap",  # SushiSwap router
+}
+
+# 4-byte selector -> (function name, argument types, input is exact, amount fields).
+# Amount fields name the positions of the fixed amount and of the limit on the other side;
+# None means the value sent with the transaction (ETH swaps).
+SWAP_SELECTORS = {
+    "0x38ed1739": ("swapExactTokensForTokens", ["uint256", "uint256", "address[]", "address", "uint256"], True, (0, 1)),
+    "0x8803dbee": ("swapTokensForExactTokens", ["uint256", "uint256", "address[]", "address", "uint256"], False, (0, 1)),
+    "0x7ff36ab5": ("swapExactETHForTokens", ["uint256", "address[]", "address", "uint256"], True, (None, 0)),
+    "0x18cbafe5": ("swapExactTokensForETH", ["uint256", "uint256", "address[]", "address", "uint256"], True, (0, 1)),
+    "0xfb3bdb41": ("swapETHForExactTokens", ["uint256", "address[]", "address", "uint256"], False, (0, None)),
+    "0x4a25d94a": ("swapTokensForExactETH", ["uint256", "uint256", "address[]", "address", "uint256"], False, (0, 1)),
+}
+
+
+def _to_int(value):
+    return int(value, 16) if isinstance(value, str) else int(value or 0)
+
+
+def _calldata(transaction):
+    data = transaction.get("input") or transaction.get("data") or "0x"
+    return data if isinstance(data, str) else "0x" + bytes(data).hex()
+
+
+class SeenHashes:
+    # Transaction hashes seen in the last max_age blocks, so each pending transaction is processed
+    # once while it stays pending. A hash is forgotten max_age blocks after it was last seen (a
+    # transaction still pending by then comes back once more); maxsize caps memory in between.
+
+    def __init__(self, max_age=25, maxsize=50000):
+        self.max_age = max_age
+        self.maxsize = maxsize
+        self._hashes = OrderedDict()  # hash -> block it was last seen in, oldest first
+
+    def add(self, tx_hash, block_number=None):
+        # True when the hash had not been seen before
+        new = tx_hash not in self._hashes
+        self._hashes[tx_hash] = block_number
+        self._hashes.move_to_end(tx_hash)
+        if len(self._hashes) > self.maxsize:
+            self._hashes.popitem(last=False)
+        return new
+
+    def expire(self, block_number):
+        # Forget the hashes last seen more than max_age blocks before block_number (and those
+        # added without a block number)
+        while self._hashes:
+            tx_hash, seen_in = next(iter(self._hashes.items()))
+            if seen_in is not None and seen_in >= block_number - self.max_age:
+                break
+            del self._hashes[tx_hash]
+
+    def __contains__(self, tx_hash):
+        return tx_hash in self._hashes
+
+    def __len__(self):
+        return len(self._hashes)
+
+
+class PendingSwap:
+    # A decoded router swap. For exact-input swaps amount is the input and limit the minimum
+    # output; for exact-output swaps amount is the output and limit the maximum input.
+
+    def __init__(self, tx_hash, dex, function, path, exact_input, amount, limit):
+        self.tx_hash = tx_hash
+        self.dex = dex
+        self.function = function
+        self.path = path  # lowercase token addresses
+        self.exact_input = exact_input
+        self.amount = amount
+        self.limit = limit
+
+    def __repr__(self):
+        return f"PendingSwap({self.function} on {self.dex}, {len(self.path) - 1} hops, {self.tx_hash})"
+
+
+def decode_swap(transaction, routers=DEFAULT_ROUTERS):
+    # Decode a router swap call, or None for anything else. Transactions to other contracts are
+    # rejected on the `to` address and the selector before any ABI decoding.
+    to = transaction.get("to")
+    dex = routers.get(to.lower()) if to else None
+    if dex is None:
+        return None
+    data = _calldata(transaction)
+    entry = SWAP_SELECTORS.get(data[:10])
+    if entry is None:
+        return None
+    function, types, exact_input, (amount_index, limit_index) = entry
+    try:
+        args = decode(types, bytes.fromhex(data[10:]))
+    except Exception:
+        return None
+    value = _to_int(transaction.get("value"))
+    path = args[types.index("address[]")]
+    amount = value if amount_index is None else args[amount_index]
+    limit = value if limit_index is None else args[limit_index]
+    return PendingSwap(transaction.get("hash"), dex, function, [address.lower() for address in path], exact_input, amount, limit)
+
+
+class SwapProjector:
+    # Projects decoded swaps onto current reserves: returns the reserves of the tracked pools the
+    # swap passes through as they will be once it executes, with exact Uniswap V2 integer math.
+
+    def __init__(self, registry):
+        self.pools = {}  # (dex, token in, token out) with lowercase addresses -> pair
+        for pair in registry:
+            if not pair.engine.closed_form:
+                continue  # router swaps only go through constant-product pairs
+            token0, token1 = pair.token0.address.lower(), pair.token1.address.lower()
+            self.pools[(pair.dex, token0, token1)] = pair
+            self.pools[(pair.dex, token1, token0)] = pair
+
+    def hops(self, swap):
+        # (pair or None, zero_for_one) for every hop of the path
+        hops = []
+        for token_in, token_out in zip(swap.path, swap.path[1:]):
+            pair = self.pools.get((swap.dex, token_in, token_out))
+            hops.append((pair, pair is not None and token_in == pair.token0.address.lower()))
+        return hops
+
+    def project(self, swap, reserves):
+        # {pair address: (reserve0, reserve1)} after the swap; empty when it touches no tracked
+        # pool or would revert. Exact-input swaps are projected up to the first untracked hop;
+        # exact-output swaps need every hop tracked to work back from the output.
+        hops = self.hops(swap)
+        if not any(pair is not None for pair, _ in hops):
+            return {}
+        states = []
+        for pair, zero_for_one in hops:
+            if pair is None or reserves.get(pair.address) is None:
+                states.append(None)
+                continue
+            reserve0, reserve1 = (int(value) for value in reserves[pair.address][:2])
+            states.append((reserve0, reserve1) if zero_for_one else (reserve1, reserve0))
+
+        if swap.exact_input:
+            amounts = [swap.amount]
+            for (pair, _), state in zip(hops, states):
+                if state is None:
+                    break
+                amounts.append(get_amount_out(amounts[-1], state[0], state[1], fee_numerator(pair.fee)))
+                if amounts[-1] == 0:
+                    return {}
+            if len(amounts) == len(hops) + 1 and amounts[-1] < swap.limit:
+                return {}  # INSUFFICIENT_OUTPUT_AMOUNT
+        else:
+            if any(state is None for state in states):
+                return {}
+            amounts = [swap.amount]
+            for (pair, _), state in zip(reversed(hops), reversed(states)):
+                amount_in = get_amount_in(amounts[0], state[0], state[1], fee_numerator(pair.fee))
+                if amount_in is None:
+                    return {}
+                amounts.insert(0, amount_in)
+            if amounts[0] > swap.limit:
+                return {}  # EXCESSIVE_INPUT_AMOUNT
+
+        projected = {}
+        for (pair, zero_for_one), state, amount_in, amount_out in zip(hops, states, amounts, amounts[1:]):
+            reserve_in, reserve_out = state[0] + amount_in, state[1] - amount_out
+            projected[pair.address] = (reserve_in, reserve_out) if zero_for_one else (reserve_out, reserve_in)
+        return projected
+
+
+class PendingTransactionStream:
+    # New pending transactions since the last poll. Uses a pending-transaction filter where the
+    # node supports one (hashes only, bodies fetched in one batch); otherwise falls back to the
+    # full pending block. Either way only hashes not seen before are returned. A hash counts as
+    # seen once its body has been fetched: hashes the node announced but returned no body for
+    # are asked for again on later polls, until they are max_age blocks old.
+
+    def __init__(self, rpc, max_age=25, seen_size=50000):
+        self.rpc = rpc
+        self.max_age = max_age
+        self.seen = SeenHashes(max_age, seen_size)
+        self.unfetched = {}  # hash -> block it was announced in, body not fetched yet
+        self.filter_id = None
+        self.use_filter = True
+
+    def _new_filter(self):
+        try:
+            self.filter_id = self.rpc.call("eth_newPendingTransactionFilter")
+        except RpcError:
+            self.use_filter = False
+
+    def poll(self, block_number=None):
+        # block_number is the current head, which ages out old hashes (the pending block's own
+        # number is used when there is no filter)
+        if self.use_filter and self.filter_id is None:
+            self._new_filter()
+        if self.use_filter:
+            try:
+                hashes = self.rpc.call("eth_getFilterChanges", [self.filter_id])
+            except RpcError:
+                self.filter_id = None  # Expired or dropped by the node; recreated next poll
+                return []
+            if block_number is not None:
+                self.seen.expire(block_number)
+                self.unfetched = {tx_hash: announced for tx_hash, announced in self.unfetched.items()
+                                  if announced is None or announced >= block_number - self.max_age}
+            for tx_hash in hashes:
+                if tx_hash not in self.seen:
+                    self.unfetched.setdefault(tx_hash, block_number)
+            hashes = list(self.unfetched)
+            transactions = self.rpc.batch([("eth_getTransactionByHash", [tx_hash]) for tx_hash in hashes])
+            fetched = []
+            for tx_hash, transaction in zip(hashes, transactions):
+                if transaction:
+                    del self.unfetched[tx_hash]
+                    self.seen.add(tx_hash, block_number)
+                    fetched.append(transaction)
+            return fetched
+
+        block = self.rpc.call("eth_getBlockByNumber", ["pending", True]) or {}
+        block_number = _to_int(block.get("number")) or block_number
+        if block_number is not None:
+            self.seen.expire(block_number)
+        return [transaction for transaction in block.get("transactions", []) if self.seen.add(transaction["hash"], block_number)]
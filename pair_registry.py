@@ -0,0 +1,185 @@
+import json
+import os
+from eth_utils import to_checksum_address
+from pricing import CONSTANT_PRODUCT, engine_for
+
+DEFAULT_FEE = 0.003  # Uniswap V2 style 0.3% swap fee
+PAIR_CONFIG_KEYS = ("dex", "address", "token0", "token1", "fee", "type")  # the rest are engine parameters
+
+
+class Token:
+    def __init__(self, symbol, address, decimals):
+        self.symbol = symbol
+        self.address = to_checksum_address(address)
+        self.decimals = decimals
+
+    def __repr__(self):
+        return f"Token({self.symbol}, {self.address})"
+
+
+class Pair:
+    # A two-token pool. kind selects its pricing engine (see pricing.py); params holds what the
+    # engine needs beyond the fee, e.g. a StableSwap pool's amp or a weighted pool's weights.
+
+    def __init__(self, dex, address, token0, token1, fee=DEFAULT_FEE, kind=CONSTANT_PRODUCT, params=None):
+        self.dex = dex
+        self.address = to_checksum_address(address)
+        self.token0 = token0
+        self.token1 = token1
+        self.fee = fee
+        self.kind = kind
+        self.params = params or {}
+        self.engine = engine_for(self)
+
+    @property
+    def name(self):
+        return f"{self.dex}:{self.token0.symbol}/{self.token1.symbol}"
+
+    def price(self, reserves):
+        # Spot price of token1 expressed in token0 (e.g. USDC per WETH), adjusted for decimals
+        if self.kind != CONSTANT_PRODUCT:
+            rate = self.engine.marginal_rate(reserves, zero_for_one=False, with_fee=False)
+            return rate * 10**self.token1.decimals / 10**self.token0.decimals
+        reserve0 = reserves[0] / 10**self.token0.decimals
+        reserve1 = reserves[1] / 10**self.token1.decimals
+        return reserve0 / reserve1
+
+    def token_reserves(self, reserves, token_in):
+        # (reserve_in, reserve_out) in whole-token units for a swap that sells token_in
+        reserve0 = reserves[0] / 10**self.token0.decimals
+        reserve1 = reserves[1] / 10**self.token1.decimals
+        if token_in.address == self.token0.address:
+            return reserve0, reserve1
+        return reserve1, reserve0
+
+    def other(self, token):
+        # Given one side of the pair, return the other token
+        return self.token1 if token.address == self.token0.address else self.token0
+
+    def __repr__(self):
+        return f"Pair({self.name}, {self.address})"
+
+
+def _pair_key(a, b):
+    # Token pairs are indexed independent of order (checksummed addresses)
+    return (a, b) if a < b else (b, a)
+
+
+class PairRegistry:
+    # All tracked pools, loaded once at startup. Addresses are checksummed and the lookups built
+    # up front so nothing in the monitoring loop has to rebuild them.
+
+    def __init__(self):
+        self.tokens = {}  # symbol -> Token
+        self.tokens_by_address = {}  # checksum address -> Token
+        self.pairs = []
+        self.pairs_by_address = {}  # checksum address -> Pair
+        self._by_token = {}  # checksum address -> [Pair]
+        self._by_token_pair = {}  # (address, address) -> [Pair]
+        self._by_dex_pair = {}  # (dex, (address, address)) -> Pair
+
+    @classmethod
+    def load(cls, path):
+        # Load tokens and pairs from a JSON or TOML config file
+        if os.path.splitext(path)[1] == ".toml":
+            import tomllib  # Python 3.11+
+
+            with open(path, "rb") as file:
+                config = tomllib.load(file)
+        else:
+            with open(path) as file:
+                config = json.load(file)
+        return cls.from_config(config)
+
+    @classmethod
+    def from_config(cls, config):
+        # Build from a {"tokens": ..., "pairs": ...} mapping in the config file layout. A pair's
+        # optional "type" selects its pool type (constant_product by default); any other keys
+        # are passed to its pricing engine.
+        registry = cls()
+        for symbol, token in config.get("tokens", {}).items():
+            registry.add_token(Token(symbol, token["address"], token["decimals"]))
+        for pair in config.get("pairs", []):
+            registry.add_pair(
+                dex=pair["dex"],
+                address=pair["address"],
+                token0=pair["token0"],
+                token1=pair["token1"],
+                fee=pair.get("fee", DEFAULT_FEE),
+                kind=pair.get("type", CONSTANT_PRODUCT),
+                params={key: value for key, value in pair.items() if key not in PAIR_CONFIG_KEYS}
+            )
+        return registry
+
+    def to_config(self):
+        # The registry in the config file layout (see from_config)
+        pairs = []
+        for pair in self.pairs:
+            entry = {"dex": pair.dex, "address": pair.address, "token0": pair.token0.symbol, "token1": pair.token1.symbol, "fee": pair.fee}
+            if pair.kind != CONSTANT_PRODUCT:
+                entry.update(pair.params, type=pair.kind)
+            pairs.append(entry)
+        return {
+            "tokens": {token.symbol: {"address": token.address, "decimals": token.decimals} for token in self.tokens.values()},
+            "pairs": pairs
+        }
+
+    def add_token(self, token):
+        self.tokens[token.symbol] = token
+        self.tokens_by_address[token.address] = token
+        return token
+
+    def token(self, symbol_or_address):
+        # Look up a token by symbol or by address
+        token = self.tokens.get(symbol_or_address) or self.tokens_by_address.get(symbol_or_address)
+        if token is not None:
+            return token
+        try:
+            return self.tokens_by_address[to_checksum_address(symbol_or_address)]
+        except (ValueError, KeyError):
+            raise KeyError(f"Unknown token: {symbol_or_address}")
+
+    def add_pair(self, dex, address, token0, token1, fee=DEFAULT_FEE, kind=CONSTANT_PRODUCT, params=None):
+        token0 = token0 if isinstance(token0, Token) else self.token(token0)
+        token1 = token1 if isinstance(token1, Token) else self.token(token1)
+        pair = Pair(dex, address, token0, token1, fee=fee, kind=kind, params=params)
+        self.pairs.append(pair)
+        self.pairs_by_address[pair.address] = pair
+        self._by_token.setdefault(token0.address, []).append(pair)
+        self._by_token.setdefault(token1.address, []).append(pair)
+        key = _pair_key(token0.address, token1.address)
+        self._by_token_pair.setdefault(key, []).append(pair)
+        self._by_dex_pair[(dex, key)] = pair
+        return pair
+
+    def get(self, address):
+        # Checksummed addresses (what the rest of the bot passes around) skip re-checksumming
+        pair = self.pairs_by_address.get(address)
+        if pair is None:
+            pair = self.pairs_by_address.get(to_checksum_address(address))
+        return pair
+
+    def pairs_for_token(self, token):
+        token = token if isinstance(token, Token) else self.token(token)
+        return self._by_token.get(token.address, [])
+
+    def pairs_for_tokens(self, token_a, token_b):
+        token_a = token_a if isinstance(token_a, Token) else self.token(token_a)
+        token_b = token_b if isinstance(token_b, Token) else self.token(token_b)
+        return self._by_token_pair.get(_pair_key(token_a.address, token_b.address), [])
+
+    def find(self, dex, token_a, token_b):
+        # The pool for a token pair on a given DEX, or None
+        token_a = token_a if isinstance(token_a, Token) else self.token(token_a)
+        token_b = token_b if isinstance(token_b, Token) else self.token(token_b)
+        return self._by_dex_pair.get((dex, _pair_key(token_a.address, token_b.address)))
+
+    @property
+    def addresses(self):
+        return [pair.address for pair in self.pairs]
+
+    def __len__(self):
+        return len(self.pairs)
+
+    def __iter__(self):
+        return iter(self.pairs)
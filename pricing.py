@@ -0,0 +1,399 @@
+from collections import OrderedDict
+import numpy as np
+from eth_abi import decode, encode
+from sizing import FEE_DENOMINATOR, UINT256_MAX, fee_numerator
+
+# Pool types, as given by "type" in the pair config
+CONSTANT_PRODUCT = "constant_product"  # Uniswap V2 and forks (x * y = k)
+STABLESWAP = "stableswap"  # Curve StableSwap
+WEIGHTED = "weighted"  # Balancer weighted pools
+
+UINT112_MAX = 2**112 - 1
+STATE_CACHE_SIZE = 8  # per pool: the block's state plus a few post-swap states of a route
+
+GET_RESERVES_SELECTOR = bytes.fromhex("0902f1ac")  # getReserves()
+CURVE_BALANCES_SELECTOR = bytes.fromhex("4903b0d1")  # balances(uint256)
+CURVE_FEE_DENOMINATOR = 10**10
+CURVE_A_PRECISION = 100
+
+BALANCER_VAULT = "0xBA12222222228d8Ba445958a75a0704d566BF2C8"
+BALANCER_GET_POOL_TOKENS_SELECTOR = bytes.fromhex("f94d4668")  # getPoolTokens(bytes32)
+# Vault events that move a pool's balances, indexed by pool id: Swap, PoolBalanceChanged, PoolBalanceManaged
+BALANCER_BALANCE_TOPICS = (
+    "0x2170c741c41531aec20e7c107c24eecfdd15e69c9bb0a8dd37b1840b9e0b207b",
+    "0xe5ce249087ce04f05a957192435400fd97868dba0e6a4b4c049abf8af80dae78",
+    "0x6edcaf6241105b4c94c2efdbf3a6b12458eb3d07be3a0e81d24b13c44045fe7a",
+)
+BALANCER_POW_RELATIVE_ERROR = 1e-14  # LogExpMath's bound, which the pools round against
+# WeightedMath's swap limits: at most 30% of the input balance in (after the fee) and 30% of
+# the output balance out
+BALANCER_MAX_IN_RATIO = 0.3
+BALANCER_MAX_OUT_RATIO = 0.3
+
+
+class PricingEngine:
+    # Swap math for one two-token pool, quoted from its balances (reserve0, reserve1) in raw
+    # token units, so every pool type fits the reserve cache, snapshots and routes unchanged.
+    # Whatever a pool derives from its balances alone (its invariant) is computed once per state
+    # by prepare() and cached, keyed by the balances, so quotes against the same block never
+    # repeat it. Pools without Sync logs also say how to read their balances (reserve_calls) and
+    # which logs mean they changed (watch).
+
+    kind = None
+    closed_form = False  # routes through only closed-form pools are sized analytically (sizing.optimal_inputs)
+    watch_topics = None  # topic0 values of the logs that change the pool's balances (None: any log)
+    required_params = ()  # pair config keys the engine cannot be built without
+
+    def __init__(self, pair):
+        self.pair = pair
+        self.fee = pair.fee
+        self._states = OrderedDict()  # (reserve0, reserve1) -> prepare() result
+
+    def state(self, reserves):
+        key = (int(reserves[0]), int(reserves[1]))
+        state = self._states.get(key)
+        if state is None and key not in self._states:
+            state = self._states[key] = self.prepare(*key)
+            if len(self._states) > STATE_CACHE_SIZE:
+                self._states.popitem(last=False)
+        return state
+
+    def prepare(self, reserve0, reserve1):
+        # Per-state values every quote needs; None when the pool cannot trade
+        return (reserve0, reserve1) if reserve0 > 0 and reserve1 > 0 else None
+
+    def get_amounts_out(self, amounts_in, zero_for_one, reserves):
+        # Exact output for every input (0 where the pool would revert), against one state
+        raise NotImplementedError
+
+    def get_amount_out(self, amount_in, zero_for_one, reserves):
+        return self.get_amounts_out([amount_in], zero_for_one, reserves)[0]
+
+    def swap(self, amount_in, zero_for_one, reserves):
+        # (amount out, reserves after the swap), or (0, None) where the pool would revert
+        raise NotImplementedError
+
+    def quote(self, amounts_in, zero_for_one, reserves):
+        # Float output for a NumPy array of inputs, vectorized, for sizing
+        raise NotImplementedError
+
+    def marginal_rate(self, reserves, zero_for_one, with_fee=True):
+        # Output per unit of input at the margin, in raw units (0 when the pool cannot trade)
+        raise NotImplementedError
+
+    def reserve_calls(self):
+        # [(contract, calldata)] whose return data decode_reserves() turns into the balances
+        return [(self.pair.address, GET_RESERVES_SELECTOR)]
+
+    def decode_reserves(self, return_data):
+        raw = return_data[0]
+        if raw is None or len(raw) < 96:
+            return None
+        return decode(["uint112", "uint112", "uint32"], raw[:96])
+
+    def watch(self):
+        # (address, topic1): a log from address (with topics[1] == topic1 unless None) changes
+        # the pool's balances
+        return self.pair.address, None
+
+
+class ConstantProductEngine(PricingEngine):
+    # Uniswap V2 getAmountOut with uint256 semantics. Reserves arrive in Sync logs, so the
+    # reserve cache keeps these pools current without reading them.
+
+    kind = CONSTANT_PRODUCT
+    closed_form = True
+
+    def __init__(self, pair):
+        super().__init__(pair)
+        self.fee_numerator = fee_numerator(pair.fee)
+
+    def get_amounts_out(self, amounts_in, zero_for_one, reserves):
+        reserve_in, reserve_out = (int(reserves[0]), int(reserves[1])) if zero_for_one else (int(reserves[1]), int(reserves[0]))
+        if reserve_in <= 0 or reserve_out <= 0:
+            return [0] * len(amounts_in)
+        scaled_reserve_in = reserve_in * FEE_DENOMINATOR
+        amounts_out = []
+        for amount_in in amounts_in:
+            amount_in = int(amount_in)
+            if amount_in <= 0:
+                amounts_out.append(0)
+                continue
+            amount_in_with_fee = amount_in * self.fee_numerator
+            numerator = amount_in_with_fee * reserve_out
+            denominator = scaled_reserve_in + amount_in_with_fee
+            amounts_out.append(numerator // denominator if numerator <= UINT256_MAX and denominator <= UINT256_MAX else 0)
+        return amounts_out
+
+    def swap(self, amount_in, zero_for_one, reserves):
+        reserve_in, reserve_out = (int(reserves[0]), int(reserves[1])) if zero_for_one else (int(reserves[1]), int(reserves[0]))
+        amount_out = self.get_amounts_out([amount_in], True, (reserve_in, reserve_out))[0]
+        reserve_in += int(amount_in)
+        reserve_out -= amount_out
+        if amount_out == 0 or reserve_in > UINT112_MAX:
+            return 0, None
+        return amount_out, ((reserve_in, reserve_out) if zero_for_one else (reserve_out, reserve_in))
+
+    def quote(self, amounts_in, zero_for_one, reserves):
+        reserve_in, reserve_out = (float(reserves[0]), float(reserves[1])) if zero_for_one else (float(reserves[1]), float(reserves[0]))
+        amounts_in = np.asarray(amounts_in, dtype=np.float64) * (1 - self.fee)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            amounts_out = reserve_out * amounts_in / (reserve_in + amounts_in)
+        return np.where(amounts_in > 0, amounts_out, 0.0)
+
+    def marginal_rate(self, reserves, zero_for_one, with_fee=True):
+        reserve_in, reserve_out = (reserves[0], reserves[1]) if zero_for_one else (reserves[1], reserves[0])
+        if reserve_in <= 0 or reserve_out <= 0:
+            return 0.0
+        return reserve_out / reserve_in * ((1 - self.fee) if with_fee else 1)
+
+
+def stableswap_invariant(xp, amp):
+    # Curve get_D for two coins: Newton iterations on the StableSwap invariant in integers.
+    # xp are balances scaled to 18 decimals, amp is A * CURVE_A_PRECISION. None if it diverges.
+    total = xp[0] + xp[1]
+    if total == 0:
+        return 0
+    ann = amp * 2
+    invariant = total
+    for _ in range(255):
+        d_p = invariant * invariant // (xp[0] * 2) * invariant // (xp[1] * 2)
+        previous = invariant
+        invariant = ((ann * total // CURVE_A_PRECISION + d_p * 2) * invariant
+                     // ((ann - CURVE_A_PRECISION) * invariant // CURVE_A_PRECISION + 3 * d_p))
+        if abs(invariant - previous) <= 1:
+            return invariant
+    return None
+
+
+class StableSwapEngine(PricingEngine):
+    # Curve StableSwap get_dy in integers (A_PRECISION = 100 pools), for two coins. The
+    # invariant D takes a Newton solve over the balances; it is solved once per state and only
+    # get_y's short iteration runs per quote. Config: "amp" (the pool's A()), "fee" as a
+    # fraction (0.0004 for 4 bps) and optionally "admin_fee" (share of the fee taken out of the
+    # pool, default 0.5). The balances are read with balances(i); any log the pool emits
+    # (TokenExchange, AddLiquidity, ...) means they changed.
+
+    kind = STABLESWAP
+    required_params = ("amp",)
+
+    def __init__(self, pair):
+        super().__init__(pair)
+        self.amp = int(pair.params["amp"]) * CURVE_A_PRECISION
+        self.rates = (10**(18 - pair.token0.decimals), 10**(18 - pair.token1.decimals))
+        self.fee_numerator = int(round(pair.fee * CURVE_FEE_DENOMINATOR))
+        self.admin_fee_numerator = int(round(pair.params.get("admin_fee", 0.5) * CURVE_FEE_DENOMINATOR))
+
+    def prepare(self, reserve0, reserve1):
+        # (scaled balances, invariant D)
+        if reserve0 <= 0 or reserve1 <= 0:
+            return None
+        xp = (reserve0 * self.rates[0], reserve1 * self.rates[1])
+        invariant = stableswap_invariant(xp, self.amp)
+        return None if not invariant else (xp, invariant)
+
+    def _get_y(self, x, invariant):
+        # New balance of the output coin once the input coin's (scaled) balance is x
+        ann = self.amp * 2
+        c = invariant * invariant // (x * 2) * invariant * CURVE_A_PRECISION // (ann * 2)
+        b = x + invariant * CURVE_A_PRECISION // ann
+        y = invariant
+        for _ in range(255):
+            previous = y
+            y = (y * y + c) // (2 * y + b - invariant)
+            if abs(y - previous) <= 1:
+                return y
+        return None
+
+    def _exchange(self, amount_in, zero_for_one, state):
+        # (amount out, fee share taken out of the pool), both in raw output units, rounded as
+        # exchange() rounds them
+        (xp0, xp1), invariant = state
+        i, j = (0, 1) if zero_for_one else (1, 0)
+        xp_in, xp_out = (xp0, xp1) if zero_for_one else (xp1, xp0)
+        if amount_in <= 0:
+            return 0, 0
+        y = self._get_y(xp_in + amount_in * self.rates[i], invariant)
+        if y is None or y >= xp_out:
+            return 0, 0
+        dy = xp_out - y - 1
+        dy_fee = dy * self.fee_numerator // CURVE_FEE_DENOMINATOR
+        admin_fee = dy_fee * self.admin_fee_numerator // CURVE_FEE_DENOMINATOR
+        return (dy - dy_fee) // self.rates[j], admin_fee // self.rates[j]
+
+    def get_amounts_out(self, amounts_in, zero_for_one, reserves):
+        state = self.state(reserves)
+        if state is None:
+            return [0] * len(amounts_in)
+        return [max(self._exchange(int(amount_in), zero_for_one, state)[0], 0) for amount_in in amounts_in]
+
+    def swap(self, amount_in, zero_for_one, reserves):
+        state = self.state(reserves)
+        if state is None:
+            return 0, None
+        amount_in = int(amount_in)
+        amount_out, admin_fee = self._exchange(amount_in, zero_for_one, state)
+        if amount_out <= 0:
+            return 0, None
+        reserve_in, reserve_out = (int(reserves[0]), int(reserves[1])) if zero_for_one else (int(reserves[1]), int(reserves[0]))
+        reserve_in, reserve_out = reserve_in + amount_in, reserve_out - amount_out - admin_fee
+        return amount_out, ((reserve_in, reserve_out) if zero_for_one else (reserve_out, reserve_in))
+
+    def quote(self, amounts_in, zero_for_one, reserves):
+        # get_y's Newton iteration run on the whole array at once in floats, from the cached D
+        amounts_in = np.asarray(amounts_in, dtype=np.float64)
+        state = self.state(reserves)
+        if state is None:
+            return np.zeros_like(amounts_in)
+        (xp0, xp1), invariant = state
+        i, j = (0, 1) if zero_for_one else (1, 0)
+        xp_in, xp_out = (float(xp0), float(xp1)) if zero_for_one else (float(xp1), float(xp0))
+        invariant, ann = float(invariant), self.amp * 2 / CURVE_A_PRECISION
+        x = xp_in + np.maximum(amounts_in, 0.0) * self.rates[i]
+        c = invariant**3 / (4 * x * ann)
+        b = x + invariant / ann
+        y = np.full_like(x, xp_out)  # above the root, so Newton descends to it monotonically
+        for _ in range(64):
+            previous = y
+            y = (y * y + c) / (2 * y + b - invariant)
+            if np.all(previous - y <= 4e-16 * y):
+                break
+        amounts_out = (xp_out - y) / self.rates[j] * (1 - self.fee)
+        return np.where((amounts_in > 0) & (amounts_out > 0), amounts_out, 0.0)
+
+    def marginal_rate(self, reserves, zero_for_one, with_fee=True):
+        # -dy/dx of the invariant at the current balances: (Ann + D^3/(4x^2y)) / (Ann + D^3/(4xy^2))
+        state = self.state(reserves)
+        if state is None:
+            return 0.0
+        (xp0, xp1), invariant = state
+        i, j = (0, 1) if zero_for_one else (1, 0)
+        x, y = (float(xp0), float(xp1)) if zero_for_one else (float(xp1), float(xp0))
+        ann, d3 = self.amp * 2 / CURVE_A_PRECISION, float(invariant)**3 / 4
+        rate = (ann + d3 / (x * x * y)) / (ann + d3 / (x * y * y)) * self.rates[i] / self.rates[j]
+        return rate * ((1 - self.fee) if with_fee else 1)
+
+    def reserve_calls(self):
+        return [(self.pair.address, CURVE_BALANCES_SELECTOR + encode(["uint256"], [index])) for index in (0, 1)]
+
+    def decode_reserves(self, return_data):
+        if any(raw is None or len(raw) < 32 for raw in return_data):
+            return None
+        return tuple(int.from_bytes(raw[:32], "big") for raw in return_data)
+
+
+class WeightedEngine(PricingEngine):
+    # Balancer weighted pool out-given-in: out = Bo * (1 - (Bi / (Bi + Ai * (1 - fee)))^(wi / wo)).
+    # The power is evaluated as expm1/log1p in floats, vectorized over the inputs, and rounded
+    # down by the 1e-14 relative margin Balancer's fixed-point pow rounds up by (pools whose
+    # weight ratio is 1, 2 or 4 take its exact path instead), so integer quotes match the pool
+    # to float precision and err low. Trades past the pool's MAX_IN_RATIO (input after the fee)
+    # or MAX_OUT_RATIO of a balance are quoted as 0, as reverts. Each state caches the weighted-product invariant and the
+    # balances as floats. Config: "weights" ([w0, w1], normalized), "pool_id" (the Vault pool
+    # id) and "fee". Balances are read from the Vault with getPoolTokens(pool_id), and the
+    # Vault's Swap and PoolBalanceChanged/Managed logs for the pool id mean they changed.
+
+    kind = WEIGHTED
+    watch_topics = BALANCER_BALANCE_TOPICS
+    required_params = ("weights", "pool_id")
+
+    def __init__(self, pair):
+        super().__init__(pair)
+        weight0, weight1 = (float(weight) for weight in pair.params["weights"])
+        self.weights = (weight0 / (weight0 + weight1), weight1 / (weight0 + weight1))
+        # powUp's error margin, for zero_for_one False and True
+        self.pow_errors = tuple(0.0 if exponent in (1.0, 2.0, 4.0) else BALANCER_POW_RELATIVE_ERROR
+                                for exponent in (weight1 / weight0, weight0 / weight1))
+        self.pool_id = pair.params["pool_id"]
+        self.vault = pair.params.get("vault", BALANCER_VAULT)
+
+    def prepare(self, reserve0, reserve1):
+        # (balances as floats, invariant B0^w0 * B1^w1)
+        if reserve0 <= 0 or reserve1 <= 0:
+            return None
+        balances = (float(reserve0), float(reserve1))
+        return balances, balances[0]**self.weights[0] * balances[1]**self.weights[1]
+
+    def invariant(self, reserves):
+        state = self.state(reserves)
+        return 0.0 if state is None else state[1]
+
+    def _quote(self, amounts_in, zero_for_one, state):
+        (balance0, balance1), _ = state
+        balance_in, balance_out = (balance0, balance1) if zero_for_one else (balance1, balance0)
+        weight_in, weight_out = self.weights if zero_for_one else self.weights[::-1]
+        amounts_in = np.maximum(np.asarray(amounts_in, dtype=np.float64), 0.0) * (1 - self.fee)
+        exponent = weight_in / weight_out * np.log1p(amounts_in / balance_in)
+        power = np.exp(-exponent)
+        amounts_out = balance_out * (-np.expm1(-exponent) - power * self.pow_errors[zero_for_one])
+        within = (amounts_in <= balance_in * BALANCER_MAX_IN_RATIO) & (amounts_out <= balance_out * BALANCER_MAX_OUT_RATIO)
+        return np.where(within, amounts_out, 0.0)
+
+    def get_amounts_out(self, amounts_in, zero_for_one, reserves):
+        state = self.state(reserves)
+        if state is None:
+            return [0] * len(amounts_in)
+        amounts_out = self._quote([float(amount_in) for amount_in in amounts_in], zero_for_one, state)
+        return [int(amount_out) if amount_out > 0 else 0 for amount_out in amounts_out.tolist()]
+
+    def swap(self, amount_in, zero_for_one, reserves):
+        amount_out = self.get_amount_out(amount_in, zero_for_one, reserves)
+        if amount_out <= 0:
+            return 0, None
+        reserve_in, reserve_out = (int(reserves[0]), int(reserves[1])) if zero_for_one else (int(reserves[1]), int(reserves[0]))
+        reserve_in, reserve_out = reserve_in + int(amount_in), reserve_out - amount_out
+        return amount_out, ((reserve_in, reserve_out) if zero_for_one else (reserve_out, reserve_in))
+
+    def quote(self, amounts_in, zero_for_one, reserves):
+        state = self.state(reserves)
+        if state is None:
+            return np.zeros(np.shape(amounts_in))
+        return np.maximum(self._quote(amounts_in, zero_for_one, state), 0.0)
+
+    def marginal_rate(self, reserves, zero_for_one, with_fee=True):
+        # (Bo / wo) / (Bi / wi)
+        state = self.state(reserves)
+        if state is None:
+            return 0.0
+        (balance0, balance1), _ = state
+        weight0, weight1 = self.weights
+        rate = (balance1 / weight1) / (balance0 / weight0) if zero_for_one else (balance0 / weight0) / (balance1 / weight1)
+        return rate * ((1 - self.fee) if with_fee else 1)
+
+    def reserve_calls(self):
+        return [(self.vault, BALANCER_GET_POOL_TOKENS_SELECTOR + bytes.fromhex(self.pool_id[2:]))]
+
+    def decode_reserves(self, return_data):
+        raw = return_data[0]
+        if raw is None or len(raw) < 96:
+            return None
+        tokens, balances, _ = decode(["address[]", "uint256[]", "uint256"], raw)
+        by_token = {token.lower(): balance for token, balance in zip(tokens, balances)}
+        reserve0 = by_token.get(self.pair.token0.address.lower())
+        reserve1 = by_token.get(self.pair.token1.address.lower())
+        return None if reserve0 is None or reserve1 is None else (reserve0, reserve1)
+
+    def watch(self):
+        return self.vault, self.pool_id.lower()
+
+
+# Pool type -> engine class; add_dex_support() registers more
+ENGINES = {
+    CONSTANT_PRODUCT: ConstantProductEngine,
+    STABLESWAP: StableSwapEngine,
+    WEIGHTED: WeightedEngine,
+}
+
+
+def register_engine(kind, engine_class):
+    ENGINES[kind] = engine_class
+
+
+def engine_for(pair):
+    if pair.kind not in ENGINES:
+        raise ValueError(f"Unknown pool type {pair.kind!r} for {pair.address}")
+    engine_class = ENGINES[pair.kind]
+    missing = [name for name in engine_class.required_params if name not in pair.params]
+    if missing:
+        raise ValueError(f"{pair.kind} pool {pair.address} is missing {', '.join(missing)} in the pair config")
+    return engine_class(pair)
@@ -0,0 +1,242 @@
+import logging
+from pricing import CONSTANT_PRODUCT
+
+# keccak256("Sync(uint112,uint112)"), emitted by Uniswap V2 style pairs after every reserve change
+SYNC_TOPIC = "0x1c411e9a96e071241c2f21f7726b17ae89e3cab4c78be50e062b03a9fffbbad1"
+
+
+def decode_sync_log(log):
+    # Return (pair address, reserve0, reserve1) for a raw Sync log
+    data = log["data"]
+    if isinstance(data, str):
+        data = bytes.fromhex(data[2:] if data.startswith("0x") else data)
+    return log["address"], int.from_bytes(data[:32], "big"), int.from_bytes(data[32:64], "big")
+
+
+def _to_int(value):
+    return int(value, 16) if isinstance(value, str) else value
+
+
+class ReserveCache:
+    # In-memory reserves for every registered pair, kept current from Sync logs instead of
+    # polling getReserves(). Each processed block keeps an undo journal so a reorg can be
+    # rolled back to the last block that is still canonical.
+    # Pools of other types (Curve, Balancer) emit no Sync: their logs (as named by their pricing
+    # engine's watch()) are fetched in the same batch, and the pools they touch are re-read with
+    # one multicall at the end of the range.
+
+    def __init__(self, rpc, registry, reader=None, reorg_depth=64, log_chunk_size=2000):
+        self.rpc = rpc
+        self.registry = registry
+        self.reader = reader
+        self.reorg_depth = reorg_depth
+        self.log_chunk_size = log_chunk_size
+        self.reserves = {}  # pair address -> (reserve0, reserve1)
+        self.block_number = None
+        self._block_hashes = {}  # block number -> hash, for recent blocks only
+        self._undo = {}  # block number -> {pair address: reserves before that block}
+        self._addresses_by_lower = {pair.address.lower(): pair.address for pair in registry if pair.kind == CONSTANT_PRODUCT}
+        self._sync_addresses = list(self._addresses_by_lower.values())
+        self._watched = {}  # (lowercase log address, lowercase topics[1] or None) -> pair address
+        self._watch_filters = []  # eth_getLogs filters (without block range) for those logs
+        self._watch_registry(registry)
+        self.block_listeners = []  # called with the number of every new head block seen by poll()
+
+    def _watch_registry(self, registry):
+        # One log filter per set of watched topics, e.g. every Curve pool's address in one and
+        # the Vault's balance events for every Balancer pool id in another
+        groups = {}  # topic0 values -> (log addresses, topics[1] values)
+        for pair in registry:
+            if pair.kind == CONSTANT_PRODUCT:
+                continue
+            address, topic1 = pair.engine.watch()
+            self._watched[(address.lower(), topic1.lower() if topic1 else None)] = pair.address
+            addresses, topic1s = groups.setdefault(pair.engine.watch_topics, (set(), set()))
+            addresses.add(address)
+            if topic1:
+                topic1s.add(topic1)
+        for topics, (addresses, topic1s) in groups.items():
+            log_filter = {"address": sorted(addresses)}
+            if topics or topic1s:
+                log_filter["topics"] = [list(topics) if topics else None] + ([sorted(topic1s)] if topic1s else [])
+            self._watch_filters.append(log_filter)
+
+    def _watched_pair(self, log):
+        address = log["address"].lower()
+        topics = log.get("topics") or []
+        pair_address = self._watched.get((address, None))
+        if pair_address is None and len(topics) > 1:
+            pair_address = self._watched.get((address, topics[1].lower()))
+        return pair_address
+
+    def get(self, pair_address):
+        return self.reserves.get(pair_address)
+
+    def seed(self, snapshot):
+        # Start from a pinned reserve snapshot (see reserves.BatchReserveReader)
+        for address, reserves in snapshot.reserves.items():
+            self.reserves[address] = (reserves[0], reserves[1])
+        self.block_number = snapshot.block_number
+        self._block_hashes.clear()
+        self._undo.clear()
+
+    def state(self):
+        # Reserves as of the last processed block, with that block's hash, for a warm-start snapshot
+        return {
+            "block_number": self.block_number,
+            "block_hash": self._block_hashes.get(self.block_number),
+            "reserves": {address: [reserve0, reserve1] for address, (reserve0, reserve1) in self.reserves.items()}
+        }
+
+    def restore(self, state):
+        # Resume from a saved state(). The next poll() checks the block is still canonical (and
+        # reloads everything if it is not), then catches up to head from Sync logs.
+        self.reserves = {address: (int(reserves[0]), int(reserves[1])) for address, reserves in state["reserves"].items()
+                         if address in self.registry.pairs_by_address}
+        self.block_number = state["block_number"]
+        self._block_hashes = {self.block_number: state["block_hash"]}
+        self._undo.clear()
+
+    def start(self, from_block=None):
+        # Seed from getReserves() at from_block (latest when None), then catch up to head from
+        # logs. Reading an older from_block requires an archive node.
+        snapshot = self.reader.fetch(self.registry.addresses, block_number=from_block)
+        self.seed(snapshot)
+        return self.poll()
+
+    def backfill(self, from_block, to_block):
+        # Apply every Sync log in [from_block, to_block] and return the touched pair addresses
+        touched = set()
+        start = from_block
+        while start <= to_block:
+            end = min(start + self.log_chunk_size - 1, to_block)
+            block_range = {"fromBlock": hex(start), "toBlock": hex(end)}
+            sync_filter = dict(block_range, address=self._sync_addresses, topics=[SYNC_TOPIC])
+            if not self._watch_filters:
+                logs = self.rpc.call("eth_getLogs", [sync_filter])
+            else:
+                filters = ([sync_filter] if self._sync_addresses else []) + [dict(block_range, **log_filter) for log_filter in self._watch_filters]
+                logs = [log for result in self.rpc.batch([("eth_getLogs", [log_filter]) for log_filter in filters]) for log in result]
+            touched |= self.apply_logs(logs, up_to_block=end)
+            start = end + 1
+        return touched
+
+    def apply_logs(self, logs, up_to_block=None):
+        # Apply Sync logs in chain order. Only the last Sync of a pair within a block matters,
+        # but the pre-block reserves are journaled so the block can be undone. Pools changed by
+        # watched (non-Sync) logs are re-read at up_to_block afterwards.
+        touched = set()
+        watched = {}  # pair address -> first block with a watched log
+        for log in sorted(logs, key=lambda log: (_to_int(log["blockNumber"]), _to_int(log["logIndex"]))):
+            if log.get("removed"):
+                self.rollback(_to_int(log["blockNumber"]) - 1)
+                continue
+            block_number = _to_int(log["blockNumber"])
+            address = self._addresses_by_lower.get(log["address"].lower()) if log["topics"][:1] == [SYNC_TOPIC] else None
+            if address is None:
+                address = self._watched_pair(log) if self._watched else None
+                if address is None:
+                    continue
+                if self.block_number is None or block_number > self.block_number or block_number in self._undo:
+                    watched.setdefault(address, block_number)
+                    self._block_hashes[block_number] = log["blockHash"]
+                continue
+            if self.block_number is not None and block_number <= self.block_number and block_number not in self._undo:
+                # Already reflected in the seed snapshot
+                continue
+
+            _, reserve0, reserve1 = decode_sync_log(log)
+            journal = self._undo.setdefault(block_number, {})
+            if address not in journal:
+                journal[address] = self.reserves.get(address)
+            self.reserves[address] = (reserve0, reserve1)
+            self._block_hashes[block_number] = log["blockHash"]
+            if self.block_number is None or block_number > self.block_number:
+                self.block_number = block_number
+            touched.add(address)
+
+        if up_to_block is not None and (self.block_number is None or up_to_block > self.block_number):
+            self.block_number = up_to_block
+        if watched:
+            touched |= self._refresh(watched)
+        self._prune()
+        return touched
+
+    def _refresh(self, first_blocks):
+        # Re-read pools changed by watched logs at the last processed block, journaling their
+        # previous balances under the first block that changed them
+        snapshot = self.reader.fetch(list(first_blocks), block_number=self.block_number)
+        for address, block_number in first_blocks.items():
+            journal = self._undo.setdefault(block_number, {})
+            if address not in journal:
+                journal[address] = self.reserves.get(address)
+            reserves = snapshot.get(address)
+            if reserves is None:
+                self.reserves.pop(address, None)
+            else:
+                self.reserves[address] = (reserves[0], reserves[1])
+        return set(first_blocks)
+
+    def rollback(self, to_block):
+        # Undo every block after to_block, newest first
+        for block_number in sorted((b for b in self._undo if b > to_block), reverse=True):
+            for address, previous in self._undo.pop(block_number).items():
+                if previous is None:
+                    self.reserves.pop(address, None)
+                else:
+                    self.reserves[address] = previous
+        for block_number in [b for b in self._block_hashes if b > to_block]:
+            del self._block_hashes[block_number]
+        if self.block_number is not None and self.block_number > to_block:
+            logging.warning(f"Chain reorg: rolled reserve cache back from block {self.block_number} to {to_block}")
+            self.block_number = to_block
+
+    def poll(self):
+        # Catch up to the current head. Returns the set of pair addresses whose reserves changed.
+        # The last processed block is fetched alongside the head so a reorg is noticed in the same
+        # round-trip. Its hash is remembered the first time, which anchors a freshly seeded cache.
+        calls = [("eth_getBlockByNumber", ["latest", False])]
+        if self.block_number is not None:
+            calls.append(("eth_getBlockByNumber", [hex(self.block_number), False]))
+        results = self.rpc.batch(calls)
+        head = results[0]
+        head_number = _to_int(head["number"])
+
+        touched = set()
+        if len(results) > 1 and results[1] is not None:
+            known_hash = self._block_hashes.setdefault(self.block_number, results[1]["hash"])
+            if results[1]["hash"] != known_hash:
+                touched |= self._handle_reorg()
+
+        if self.block_number is None or head_number > self.block_number:
+            from_block = head_number if self.block_number is None else self.block_number + 1
+            touched |= self.backfill(from_block, head_number)
+            self._block_hashes[head_number] = head["hash"]
+            for listener in self.block_listeners:
+                listener(head_number)
+        return touched
+
+    def _handle_reorg(self):
+        # Walk back through the journaled blocks until one is still canonical and roll back to it.
+        # Every pair that was rolled back is reported as touched.
+        touched = set()
+        for block_number in sorted(self._block_hashes, reverse=True):
+            block = self.rpc.call("eth_getBlockByNumber", [hex(block_number), False])
+            if block is not None and block["hash"] == self._block_hashes[block_number]:
+                self.rollback(block_number)
+                return touched
+            touched |= set(self._undo.get(block_number, {}))
+
+        # The reorg is deeper than the journal, so the cached reserves cannot be trusted
+        logging.warning("Chain reorg deeper than the reserve cache journal, reloading reserves")
+        self.start()
+        return set(self.registry.addresses)
+
+    def _prune(self):
+        if self.block_number is None:
+            return
+        oldest = self.block_number - self.reorg_depth
+        for block_number in [b for b in self._undo if b < oldest]:
+            del self._undo[block_number]
+        for block_number in [b for b in self._block_hashes if b < oldest]:
+            del self._block_hashes[block_number]
@@ -0,0 +1,150 @@
+from eth_abi import decode, encode
+from eth_utils import to_checksum_address
+from pricing import CONSTANT_PRODUCT
+
+# Selector for getReserves() on Uniswap V2 style pairs
+GET_RESERVES_SELECTOR = bytes.fromhex("0902f1ac")
+
+# Multicall3 is deployed at the same address on mainnet and most EVM chains
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+
+# Selector for tryBlockAndAggregate(bool,(address,bytes)[])
+TRY_BLOCK_AND_AGGREGATE_SELECTOR = bytes.fromhex("399542e9")
+
+
+class ReserveSnapshot:
+    # Reserves for a set of pairs, all read at the same block
+
+    def __init__(self, block_number, reserves):
+        self.block_number = block_number
+        self.reserves = reserves  # pair address -> (reserve0, reserve1, block_timestamp_last)
+
+    def __getitem__(self, pair_address):
+        return self.reserves[pair_address]
+
+    def get(self, pair_address, default=None):
+        return self.reserves.get(pair_address, default)
+
+    def __len__(self):
+        return len(self.reserves)
+
+
+def _to_bytes(raw):
+    if isinstance(raw, str):
+        return bytes.fromhex(raw[2:] if raw.startswith("0x") else raw)
+    return raw
+
+
+def decode_reserves(raw):
+    # Decode the return data of getReserves() into (reserve0, reserve1, block_timestamp_last)
+    raw = _to_bytes(raw)
+    if len(raw) < 96:
+        return None
+    return decode(["uint112", "uint112", "uint32"], raw[:96])
+
+
+class BatchReserveReader:
+    # Reads getReserves() for many pairs in a single RPC round-trip.
+    # "multicall" mode wraps every call in one Multicall3 tryBlockAndAggregate eth_call, which
+    # returns the block number the reads were executed at. "batch" mode sends one JSON-RPC
+    # batch of eth_call requests, all pinned to an explicit block number.
+    # With a registry, pools of other types are read with their pricing engine's calls instead
+    # (e.g. balances(i) on a Curve pool), in the same round-trip.
+
+    def __init__(self, rpc, mode="multicall", multicall_address=MULTICALL3_ADDRESS, registry=None):
+        if mode not in ("multicall", "batch"):
+            raise ValueError(f"Unknown reserve reader mode: {mode}")
+        self.rpc = rpc
+        self.mode = mode
+        self.multicall_address = to_checksum_address(multicall_address)
+        self.registry = registry
+
+    def _engine(self, address):
+        # The pricing engine of a pool not read with getReserves(), or None
+        pair = self.registry.get(address) if self.registry is not None else None
+        return None if pair is None or pair.kind == CONSTANT_PRODUCT else pair.engine
+
+    def pair_calls(self, address):
+        # [(contract, calldata)] that read one pair's reserves
+        engine = self._engine(address)
+        return [(address, GET_RESERVES_SELECTOR)] if engine is None else engine.reserve_calls()
+
+    def decode_pair(self, address, return_data):
+        # (reserve0, reserve1, ...) from the return data of pair_calls(address); None on failure
+        engine = self._engine(address)
+        if engine is None:
+            return decode_reserves(return_data[0]) if return_data[0] is not None else None
+        return engine.decode_reserves([_to_bytes(raw) if raw is not None else None for raw in return_data])
+
+    def fetch(self, pair_addresses, block_number=None):
+        pair_addresses = list(pair_addresses)
+        if not pair_addresses:
+            return ReserveSnapshot(block_number, {})
+        if self.mode == "multicall":
+            return self._fetch_multicall(pair_addresses, block_number)
+        return self._fetch_batch(pair_addresses, block_number)
+
+    def build_multicall_request(self, pair_addresses, block_number=None):
+        # Build the eth_call params for one tryBlockAndAggregate over all pairs
+        calls = [(to_checksum_address(target), calldata) for address in pair_addresses for target, calldata in self.pair_calls(address)]
+        data = TRY_BLOCK_AND_AGGREGATE_SELECTOR + encode(["bool", "(address,bytes)[]"], [False, calls])
+        block_tag = hex(block_number) if block_number is not None else "latest"
+        return [{"to": self.multicall_address, "data": "0x" + data.hex()}, block_tag]
+
+    def parse_multicall_result(self, pair_addresses, raw):
+        # Split a tryBlockAndAggregate result back into a ReserveSnapshot
+        raw = bytes.fromhex(raw[2:] if raw.startswith("0x") else raw)
+        block_number, _block_hash, results = decode(["uint256", "bytes32", "(bool,bytes)[]"], raw)
+        reserves = {}
+        position = 0
+        for address in pair_addresses:
+            count = len(self.pair_calls(address))
+            decoded = self.decode_pair(address, [return_data if success else None for success, return_data in results[position:position + count]])
+            position += count
+            if decoded is not None:
+                reserves[address] = decoded
+        return ReserveSnapshot(block_number, reserves)
+
+    def build_batch_calls(self, pair_addresses, block_number):
+        # One eth_call per pair. A JSON-RPC batch can be served by different backend nodes, so every
+        # call gets an explicit block number rather than "latest" to keep the reads consistent.
+        block_tag = hex(block_number)
+        calls = []
+        for address in pair_addresses:
+            for target, calldata in self.pair_calls(address):
+                calls.append(("eth_call", [{"to": target, "data": "0x" + calldata.hex()}, block_tag]))
+        return calls
+
+    def parse_batch_results(self, pair_addresses, block_number, results):
+        reserves = {}
+        position = 0
+        for address in pair_addresses:
+            count = len(self.pair_calls(address))
+            decoded = self.decode_pair(address, results[position:position + count])
+            position += count
+            if decoded is not None:
+                reserves[address] = decoded
+        return ReserveSnapshot(block_number, reserves)
+
+    def _fetch_multicall(self, pair_addresses, block_number):
+        raw = self.rpc.call("eth_call", self.build_multicall_request(pair_addresses, block_number))
+        return self.parse_multicall_result(pair_addresses, raw)
+
+    def _fetch_batch(self, pair_addresses, block_number):
+        if block_number is None:
+            block_number = int(self.rpc.call("eth_blockNumber"), 16)
+        results = self.rpc.batch(self.build_batch_calls(pair_addresses, block_number))
+        return self.parse_batch_results(pair_addresses, block_number, results)
+
+    async def fetch_async(self, pair_addresses, block_number=None):
+        # Same as fetch(), for a reader built on rpc.AsyncJsonRpcClient
+        pair_addresses = list(pair_addresses)
+        if not pair_addresses:
+            return ReserveSnapshot(block_number, {})
+        if self.mode == "multicall":
+            raw = await self.rpc.call("eth_call", self.build_multicall_request(pair_addresses, block_number))
+            return self.parse_multicall_result(pair_addresses, raw)
+        if block_number is None:
+            block_number = int(await self.rpc.call("eth_blockNumber"), 16)
+        results = await self.rpc.batch(self.build_batch_calls(pair_addresses, block_number))
+        return self.parse_batch_results(pair_addresses, block_number, results)
@@ -0,0 +1,372 @@
+import asyncio
+import collections
+import concurrent.futures
+import contextlib
+import hashlib
+import itertools
+import threading
+import time
+from urllib.parse import urlparse
+import aiohttp
+import requests
+from metrics import RPC_BREAKER_OPENS, RPC_CALLS, RPC_ERRORS, RPC_HEDGES, RPC_REQUESTS, RPC_TIMEOUTS
+
+
+class RpcError(Exception):
+    # The node answered with a JSON-RPC error; error holds the error object when there is one
+
+    def __init__(self, message, error=None):
+        super().__init__(message)
+        self.error = error
+
+
+def _parse_result(method, data):
+    if "error" in data:
+        raise RpcError(f"{method} failed: {data['error']}", data["error"])
+    return data["result"]
+
+
+def _parse_batch(payload, data):
+    if isinstance(data, dict):
+        # Some nodes answer a rejected batch with a single error object
+        raise RpcError(f"Batch request failed: {data.get('error', data)}")
+
+    # Servers may reply to batch entries in any order, so match them up by id
+    by_id = {item.get("id"): item for item in data}
+    results = []
+    for request in payload:
+        item = by_id.get(request["id"])
+        if item is None:
+            raise RpcError(f"Missing response for {request['method']} (id {request['id']})")
+        results.append(_parse_result(request["method"], item))
+    return results
+
+
+@contextlib.contextmanager
+def _instrumented(payload):
+    # Count the HTTP request and every call in it; failures are counted by method ("batch" for
+    # batches), with timeouts counted separately
+    RPC_REQUESTS.inc()
+    if isinstance(payload, list):
+        label = "batch"
+        for request in payload:
+            RPC_CALLS.inc(request["method"])
+    else:
+        label = payload["method"]
+        RPC_CALLS.inc(label)
+    try:
+        yield
+    except (requests.Timeout, asyncio.TimeoutError):
+        RPC_TIMEOUTS.inc(label)
+        raise
+    except Exception:
+        RPC_ERRORS.inc(label)
+        raise
+
+
+class JsonRpcClient:
+    # Minimal JSON-RPC client over a pooled keep-alive session.
+    # Supports single calls and JSON-RPC batches (several calls in one HTTP round-trip).
+
+    def __init__(self, url, session=None, timeout=5, auth=None, name=None):
+        self.url = url
+        self.name = name  # label in metrics; endpoint_name(url) when None
+        self.session = session or requests.Session()
+        self.timeout = timeout
+        self.auth = auth
+        self._ids = itertools.count(1)
+
+    def _payload(self, method, params):
+        return {"jsonrpc": "2.0", "method": method, "params": params or [], "id": next(self._ids)}
+
+    def call(self, method, params=None):
+        payload = self._payload(method, params)
+        with _instrumented(payload):
+            response = self.session.post(self.url, json=payload, timeout=self.timeout, auth=self.auth)
+            response.raise_for_status()
+            return _parse_result(method, response.json())
+
+    def batch(self, calls):
+        # calls is a list of (method, params) tuples; results come back in the same order
+        if not calls:
+            return []
+        payload = [self._payload(method, params) for method, params in calls]
+        with _instrumented(payload):
+            response = self.session.post(self.url, json=payload, timeout=self.timeout, auth=self.auth)
+            response.raise_for_status()
+            return _parse_batch(payload, response.json())
+
+
+class AsyncJsonRpcClient(JsonRpcClient):
+    # asyncio version of JsonRpcClient on a shared aiohttp session. The session is opened on first
+    # use, inside the running event loop.
+
+    def __init__(self, url, session=None, timeout=5, auth=None, name=None):
+        self.url = url
+        self.name = name
+        self.session = session
+        self.timeout = timeout
+        self.auth = aiohttp.BasicAuth(*auth) if auth else None
+        self._ids = itertools.count(1)
+
+    def _session(self):
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self.session
+
+    async def _post(self, payload):
+        async with self._session().post(self.url, json=payload, auth=self.auth) as response:
+            response.raise_for_status()
+            return await response.json(content_type=None)
+
+    async def call(self, method, params=None):
+        payload = self._payload(method, params)
+        with _instrumented(payload):
+            return _parse_result(method, await self._post(payload))
+
+    async def batch(self, calls):
+        if not calls:
+            return []
+        payload = [self._payload(method, params) for method, params in calls]
+        with _instrumented(payload):
+            return _parse_batch(payload, await self._post(payload))
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+
+# Filters live on the node that created them, so these always go to the same endpoint
+ENDPOINT_BOUND_METHODS = frozenset([
+    "eth_newFilter", "eth_newBlockFilter", "eth_newPendingTransactionFilter",
+    "eth_getFilterChanges", "eth_getFilterLogs", "eth_uninstallFilter",
+])
+
+
+def endpoint_name(url):
+    # host:port, plus a digest of the path and query when there is one, so endpoints on the
+    # same host stay apart in metrics without exposing an API key held in the path
+    parsed = urlparse(url)
+    name = parsed.netloc.rpartition("@")[2] or url
+    rest = parsed.path.strip("/") + (f"?{parsed.query}" if parsed.query else "")
+    if rest:
+        name += "/" + hashlib.sha256(rest.encode()).hexdigest()[:8]
+    return name
+
+
+class Endpoint:
+    # Rolling latency and error stats for one endpoint, plus its circuit breaker. The breaker
+    # opens after failure_threshold consecutive failures; after cooldown seconds the endpoint is
+    # tried again (half-open), a success closes the breaker and another failure re-opens it.
+
+    def __init__(self, client, window=100, failure_threshold=5, cooldown=30):
+        self.client = client
+        self.name = getattr(client, "name", None) or endpoint_name(client.url)
+        self.latencies = collections.deque(maxlen=window)
+        self.outcomes = collections.deque(maxlen=window)  # True for failures
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.median = 0.0  # unmeasured endpoints sort first, so each gets tried
+        self.p95 = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def error_rate(self):
+        return sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.0
+
+    def available(self, now):
+        return now >= self.open_until
+
+    def record_success(self, latency):
+        with self._lock:
+            self.latencies.append(latency)
+            self.outcomes.append(False)
+            self.consecutive_failures = 0
+            self.open_until = 0.0
+            ordered = sorted(self.latencies)
+            self.median = ordered[len(ordered) // 2]
+            self.p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def record_failure(self):
+        with self._lock:
+            self.outcomes.append(True)
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= self.failure_threshold:
+                if self.open_until == 0.0 or time.monotonic() >= self.open_until:
+                    RPC_BREAKER_OPENS.inc(self.name)
+                self.open_until = time.monotonic() + self.cooldown
+
+    def score(self):
+        # Expected latency, penalised by the recent error rate
+        return self.median * (1 + 4 * self.error_rate)
+
+
+def _is_endpoint_failure(error):
+    # A JSON-RPC error is an answer from a healthy node (e.g. a revert), not an endpoint failure
+    return not isinstance(error, RpcError)
+
+
+class _EndpointSelection:
+    # Endpoint ranking shared by RpcPool and AsyncRpcPool
+
+    def _init_endpoints(self, clients, hedge_delay, min_hedge_delay, failure_threshold, cooldown):
+        if not clients:
+            raise ValueError("RpcPool needs at least one endpoint")
+        self.endpoints = [Endpoint(client, failure_threshold=failure_threshold, cooldown=cooldown) for client in clients]
+        self.hedge_delay = hedge_delay  # None: hedge at the primary endpoint's p95 latency
+        self.min_hedge_delay = min_hedge_delay
+
+    @property
+    def url(self):
+        return self.endpoints[0].client.url
+
+    def ranked(self, method=None):
+        # Available endpoints, fastest first; with every breaker open, the one that reopens first
+        now = time.monotonic()
+        if method in ENDPOINT_BOUND_METHODS:
+            bound = [endpoint for endpoint in self.endpoints if endpoint.available(now)]
+            return bound[:1] or [min(self.endpoints, key=lambda endpoint: endpoint.open_until)]
+        available = sorted((endpoint for endpoint in self.endpoints if endpoint.available(now)), key=Endpoint.score)
+        return available or [min(self.endpoints, key=lambda endpoint: endpoint.open_until)]
+
+    def delay_for(self, endpoint):
+        if self.hedge_delay is not None:
+            return self.hedge_delay
+        return max(self.min_hedge_delay, endpoint.p95)
+
+
+class RpcPool(_EndpointSelection):
+    # JsonRpcClient interface over several endpoints, each with its own keep-alive session.
+    # Every request goes to the fastest available endpoint; if no answer has come back after the
+    # hedge delay (or the first attempt failed), a copy goes to the next endpoint and whichever
+    # answers first wins. Endpoints that keep failing are cut out by their circuit breaker.
+
+    def __init__(self, clients, hedge_delay=None, min_hedge_delay=0.02, failure_threshold=5, cooldown=30):
+        self._init_endpoints(clients, hedge_delay, min_hedge_delay, failure_threshold, cooldown)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=16 * len(self.endpoints), thread_name_prefix="rpc-pool")
+
+    @classmethod
+    def from_urls(cls, urls, timeout=5, auth=None, **kwargs):
+        return cls([JsonRpcClient(url, timeout=timeout, auth=auth) for url in urls], **kwargs)
+
+    def _attempt(self, endpoint, send):
+        started = time.perf_counter()
+        try:
+            result = send(endpoint.client)
+        except Exception as e:
+            if _is_endpoint_failure(e):
+                endpoint.record_failure()
+            else:
+                endpoint.record_success(time.perf_counter() - started)
+            raise
+        endpoint.record_success(time.perf_counter() - started)
+        return result
+
+    def _request(self, method, send):
+        candidates = self.ranked(method)
+        if len(candidates) == 1 or method in ENDPOINT_BOUND_METHODS:
+            return self._attempt(candidates[0], send)
+
+        pending = {self.executor.submit(self._attempt, candidates[0], send)}
+        remaining = candidates[1:]
+        error = None
+        timeout = self.delay_for(candidates[0])
+        while pending:
+            done, pending = concurrent.futures.wait(pending, timeout=timeout, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                try:
+                    return future.result()  # the slower copy finishes in the background
+                except RpcError:
+                    raise  # the node answered; another endpoint would say the same
+                except Exception as e:
+                    error = e
+            if remaining:
+                # Hedge: no answer within the delay, or an attempt failed
+                endpoint = remaining.pop(0)
+                RPC_HEDGES.inc(endpoint.name)
+                pending.add(self.executor.submit(self._attempt, endpoint, send))
+                timeout = self.delay_for(endpoint)
+            else:
+                timeout = None
+        raise error
+
+    def call(self, method, params=None):
+        return self._request(method, lambda client: client.call(method, params))
+
+    def batch(self, calls):
+        if not calls:
+            return []
+        method = calls[0][0] if all(call[0] in ENDPOINT_BOUND_METHODS for call in calls) else None
+        return self._request(method, lambda client: client.batch(calls))
+
+
+class AsyncRpcPool(_EndpointSelection):
+    # asyncio version of RpcPool over AsyncJsonRpcClient endpoints
+
+    def __init__(self, clients, hedge_delay=None, min_hedge_delay=0.02, failure_threshold=5, cooldown=30):
+        self._init_endpoints(clients, hedge_delay, min_hedge_delay, failure_threshold, cooldown)
+
+    @classmethod
+    def from_urls(cls, urls, timeout=5, auth=None, **kwargs):
+        return cls([AsyncJsonRpcClient(url, timeout=timeout, auth=auth) for url in urls], **kwargs)
+
+    async def _attempt(self, endpoint, send):
+        started = time.perf_counter()
+        try:
+            result = await send(endpoint.client)
+        except asyncio.CancelledError:
+            raise  # lost the race; says nothing about the endpoint
+        except Exception as e:
+            if _is_endpoint_failure(e):
+                endpoint.record_failure()
+            else:
+                endpoint.record_success(time.perf_counter() - started)
+            raise
+        endpoint.record_success(time.perf_counter() - started)
+        return result
+
+    async def _request(self, method, send):
+        candidates = self.ranked(method)
+        if len(candidates) == 1 or method in ENDPOINT_BOUND_METHODS:
+            return await self._attempt(candidates[0], send)
+
+        pending = {asyncio.ensure_future(self._attempt(candidates[0], send))}
+        remaining = candidates[1:]
+        error = None
+        timeout = self.delay_for(candidates[0])
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    try:
+                        return task.result()
+                    except RpcError:
+                        raise
+                    except Exception as e:
+                        error = e
+                if remaining:
+                    endpoint = remaining.pop(0)
+                    RPC_HEDGES.inc(endpoint.name)
+                    pending.add(asyncio.ensure_future(self._attempt(endpoint, send)))
+                    timeout = self.delay_for(endpoint)
+                else:
+                    timeout = None
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def call(self, method, params=None):
+        return await self._request(method, lambda client: client.call(method, params))
+
+    async def batch(self, calls):
+        if not calls:
+            return []
+        method = calls[0][0] if all(call[0] in ENDPOINT_BOUND_METHODS for call in calls) else None
+        return await self._request(method, lambda client: client.batch(calls))
+
+    async def close(self):
+        for endpoint in self.endpoints:
+            await endpoint.client.close()
@@ -0,0 +1,23 @@
+import json
+from web3.providers.base import JSONBaseProvider
+from rpc import RpcError
+
+# Kept apart from rpc.py so the clients and pools can be used without importing web3
+
+
+class RpcClientProvider(JSONBaseProvider):
+    # web3 provider that sends requests through a JsonRpcClient or RpcPool, so web3 calls share
+    # the pool's endpoints, hedging and circuit breakers
+
+    def __init__(self, client):
+        super().__init__()
+        self.client = client
+
+    def make_request(self, method, params):
+        request_id = next(self.request_counter)
+        # Round-trip through web3's encoder for HexBytes, AttributeDicts and the like
+        params = json.loads(self.encode_rpc_request(method, params))["params"]
+        try:
+            return {"jsonrpc": "2.0", "id": request_id, "result": self.client.call(method, params)}
+        except RpcError as e:
+            return {"jsonrpc": "2.0", "id": request_id, "error": e.error or {"code": -32000, "message": str(e)}}
@@ -0,0 +1,277 @@
+import json
+import logging
+import os
+import time
+from functools import cached_property
+from amm import AmmSimulator
+from cycles import CycleEngine
+from gas_oracle import GasOracle
+from history import HistoryRecorder
+from mempool import PendingTransactionStream, SwapProjector
+from pair_registry import PairRegistry
+from reserve_cache import ReserveCache
+from reserves import BatchReserveReader
+from rpc import AsyncJsonRpcClient, AsyncRpcPool, JsonRpcClient, RpcPool
+from work_queue import BLOCK, DROP_NEWEST, DROP_OLDEST, WorkQueue
+
+SNAPSHOT_VERSION = 1
+
+
+class Runtime:
+    # Everything the bot connects to or keeps in memory, built on first use from the environment.
+    # Creating a Runtime reads no settings, opens no connection and imports neither web3 nor the
+    # signing stack, so main.py can be imported by tools and tests without credentials.
+    #
+    # A warm-start snapshot (WARM_START_PATH, default warm_start.json) holds the pair registry,
+    # the reserves and hash of the last processed block and the gas oracle's last sample. It is
+    # written on shutdown and loaded by start_reserves(), so a restart only catches up on the Sync
+    # logs it missed instead of reloading every pool.
+
+    def __init__(self, env=None):
+        self.env = os.environ if env is None else env
+        self.scanner = None
+        self._warm_started = None
+
+    def setting(self, name, default=None):
+        value = self.env.get(name)
+        return default if value is None or value == "" else value
+
+    # Connections
+
+    @cached_property
+    def rpc_urls(self):
+        # Infura (or RPC_URL) plus any extra endpoints listed in RPC_URLS, comma separated
+        primary = self.setting("RPC_URL") or f"https://mainnet.infura.io/v3/{self.setting('INFURA_PROJECT_ID')}"
+        return [primary] + [url.strip() for url in self.setting("RPC_URLS", "").split(",") if url.strip()]
+
+    def rpc_clients(self, client_class=JsonRpcClient, **kwargs):
+        # One keep-alive client per endpoint; each pool gets its own sessions. Only the primary
+        # endpoint gets the Infura secret key.
+        auth = (self.setting("INFURA_PROJECT_ID"), self.setting("INFURA_SECRET_KEY")) if self.setting("INFURA_SECRET_KEY") else None
+        return [client_class(self.rpc_urls[0], auth=auth, **kwargs)] + [client_class(url, **kwargs) for url in self.rpc_urls[1:]]
+
+    def async_rpc_pool(self, timeout=5):
+        # The same endpoints on asyncio sessions, for the async monitor and bundle submission
+        return AsyncRpcPool(self.rpc_clients(AsyncJsonRpcClient, timeout=timeout))
+
+    @cached_property
+    def rpc(self):
+        # Requests go to the fastest healthy endpoint, hedged to the next one when it is slow
+        return RpcPool(self.rpc_clients())
+
+    @cached_property
+    def web3(self):
+        # Web3 on the same endpoint pool, for tools that want contract objects; the bot itself
+        # does not need it
+        from web3 import Web3
+        from rpc_provider import RpcClientProvider
+
+        return Web3(RpcClientProvider(self.rpc))
+
+    # Pools and state
+
+    @cached_property
+    def pairs_config(self):
+        return self.setting("PAIRS_CONFIG", "pairs.json")
+
+    @cached_property
+    def registry(self):
+        # Tracked pools are loaded once from the pair config (see pairs.json)
+        return PairRegistry.load(self.pairs_config)
+
+    @cached_property
+    def uniswap_pair(self):
+        # Uniswap and SushiSwap example pairs (e.g., WETH/USDC)
+        return self.registry.find("uniswap", "WETH", "USDC")
+
+    @cached_property
+    def sushiswap_pair(self):
+        return self.registry.find("sushiswap", "WETH", "USDC")
+
+    @cached_property
+    def reserve_reader(self):
+        # Reserves for every tracked pair are read in a single RPC round-trip
+        return BatchReserveReader(self.rpc, registry=self.registry)
+
+    @cached_property
+    def reserve_cache(self):
+        # Reserves kept current from Sync logs, so only pools that changed get re-evaluated
+        return ReserveCache(self.rpc, self.registry, self.reserve_reader)
+
+    @cached_property
+    def gas_oracle(self):
+        # Gas prices refreshed from eth_feeHistory once per block on a background thread (own session)
+        return GasOracle(RpcPool(self.rpc_clients()), reserve_cache=self.reserve_cache, eth_pair=self.uniswap_pair)
+
+    @cached_property
+    def history(self):
+        # Historical reserves, gas and profit, written in batches by a background thread
+        return HistoryRecorder(self.setting("HISTORY_PATH", "historical_data.bin"))
+
+    @cached_property
+    def cycle_engine(self):
+        # Candidate swap cycles through WETH across every registered pool
+        return CycleEngine(self.registry, base_tokens=("WETH",), max_hops=int(self.setting("MAX_CYCLE_HOPS", "3")))
+
+    @cached_property
+    def weth_usdc_routes(self):
+        # The two cycles between the Uniswap and SushiSwap WETH/USDC pools, looked up once
+        pools = {self.uniswap_pair.address, self.sushiswap_pair.address}
+        indexes = self.cycle_engine.cycles_by_pair.get(self.uniswap_pair.address, ())
+        return [self.cycle_engine.cycles[index] for index in indexes if self.cycle_engine.cycles[index].pair_addresses == pools]
+
+    @cached_property
+    def amm(self):
+        # Pool states for exact, wei-accurate route simulation without an eth_call per candidate
+        return AmmSimulator(self.registry)
+
+    @cached_property
+    def pending_stream(self):
+        # Pending transactions, each decoded once
+        return PendingTransactionStream(self.rpc)
+
+    @cached_property
+    def swap_projector(self):
+        # Router swaps are projected onto the reserve cache
+        return SwapProjector(self.registry)
+
+    # Execution
+
+    @cached_property
+    def head_tracker(self):
+        # Latest head block, fed by the reserve cache and gas oracle, for picking bundle target blocks
+        from execution import HeadTracker
+
+        head_tracker = HeadTracker()
+        self.reserve_cache.block_listeners.append(head_tracker.on_block)
+        self.gas_oracle.block_listeners.append(head_tracker.on_block)
+        if self.reserve_cache.block_number is not None:
+            head_tracker.on_block(self.reserve_cache.block_number)
+        return head_tracker
+
+    @cached_property
+    def submission(self):
+        # Signed bundles go straight to the relay once PRIVATE_KEY and EXECUTOR_ADDRESS are set;
+        # None otherwise
+        if not (self.setting("PRIVATE_KEY") and self.setting("EXECUTOR_ADDRESS")):
+            return None
+        from execution import DEFAULT_RELAY_URL, BundleSubmitter, NonceManager, SubmissionPipeline, TransactionTemplate
+
+        template = TransactionTemplate(self.setting("PRIVATE_KEY"), self.setting("EXECUTOR_ADDRESS"), chain_id=int(self.setting("CHAIN_ID", "1")))
+        return SubmissionPipeline(
+            template,
+            BundleSubmitter(self.setting("FLASHBOTS_RELAY_URL", DEFAULT_RELAY_URL), self.setting("FLASHBOTS_SIGNER_KEY")),
+            self.head_tracker, self.gas_oracle, NonceManager(self.rpc, template.address),
+            rpc=self.async_rpc_pool()
+        )
+
+    # Side effects, run off the detection loop
+
+    @cached_property
+    def notification_queue(self):
+        # Alerts already queued are kept when a slow channel falls behind
+        return WorkQueue("notification", maxsize=256, policy=DROP_NEWEST)
+
+    @cached_property
+    def execution_queue(self):
+        # Only the freshest trades are worth sending: a backlog loses its oldest entries
+        return WorkQueue("execution", maxsize=16, policy=DROP_OLDEST)
+
+    @cached_property
+    def storage_queue(self):
+        # History writes hold the loop back for at most 10ms before being shed
+        return WorkQueue("storage", maxsize=4096, policy=BLOCK, put_timeout=0.01)
+
+    def work_queues(self):
+        return [self.notification_queue, self.execution_queue, self.storage_queue]
+
+    def start_work_queues(self):
+        for queue in self.work_queues():
+            queue.start()
+
+    def close_work_queues(self):
+        # Run what is still queued, so the last trades go out and the last records are written
+        for queue in self.work_queues():
+            queue.close()
+
+    # Sharded scanning
+
+    def start_scanner(self):
+        # Shard the cycle universe across SCAN_PROCESSES worker processes reading reserves from
+        # shared memory. Workers are started from a clean forkserver process, so it is safe to
+        # call with background threads running.
+        processes = int(self.setting("SCAN_PROCESSES", "1"))
+        if self.scanner is None and processes > 1:
+            from scanner import ShardedScanner
+
+            self.scanner = ShardedScanner(self.registry, self.cycle_engine, self.pairs_config, processes=processes).start()
+            logging.info(f"Scanning {len(self.cycle_engine.cycles)} cycles across {processes} processes")
+        return self.scanner
+
+    def stop_scanner(self):
+        if self.scanner is not None:
+            self.scanner.close()
+            self.scanner = None
+
+    # Warm start
+
+    @property
+    def snapshot_path(self):
+        # Empty WARM_START_PATH disables the snapshot
+        return self.env.get("WARM_START_PATH", "warm_start.json")
+
+    def save_snapshot(self, path=None):
+        # Write the registry, reserve cache and gas state (whichever were used) atomically
+        path = path or self.snapshot_path
+        if not path or "registry" not in self.__dict__:
+            return False
+        snapshot = {"version": SNAPSHOT_VERSION, "saved_at": time.time(), "registry": self.registry.to_config()}
+        if "reserve_cache" in self.__dict__ and self.reserve_cache.block_number is not None:
+            snapshot["reserves"] = self.reserve_cache.state()
+        if "gas_oracle" in self.__dict__ and self.gas_oracle.base_fee_wei is not None:
+            snapshot["gas"] = self.gas_oracle.state()
+        with open(path + ".tmp", "w") as file:
+            json.dump(snapshot, file)
+        os.replace(path + ".tmp", path)
+        logging.info(f"Warm-start snapshot written to {path}")
+        return True
+
+    def load_snapshot(self, path=None):
+        # Restore reserves and gas state from the snapshot. Returns True when the reserve cache
+        # was restored; a missing, unreadable, too old (WARM_START_MAX_AGE seconds, default 3600)
+        # or mismatched snapshot (the pair config changed) is ignored.
+        path = path or self.snapshot_path
+        if not path or not os.path.exists(path):
+            return False
+        try:
+            with open(path) as file:
+                snapshot = json.load(file)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable warm-start snapshot {path}: {e}")
+            return False
+        age = time.time() - snapshot.get("saved_at", 0)
+        if snapshot.get("version") != SNAPSHOT_VERSION or age > float(self.setting("WARM_START_MAX_AGE", "3600")):
+            logging.info(f"Ignoring warm-start snapshot {path} ({age:.0f}s old)")
+            return False
+        if snapshot.get("registry") != self.registry.to_config():
+            logging.info(f"Ignoring warm-start snapshot {path}: the pair config changed")
+            return False
+
+        if "gas" in snapshot:
+            self.gas_oracle.restore(snapshot["gas"])
+        state = snapshot.get("reserves")
+        if not state or not state.get("block_hash"):
+            return False
+        self.reserve_cache.restore(state)
+        logging.info(f"Warm start from block {state['block_number']} ({age:.0f}s old)")
+        return True
+
+    def start_reserves(self, from_block=None):
+        # Bring the reserve cache to head: from the warm-start snapshot when there is a usable one
+        # (the first time only), otherwise by reading every pool at from_block (latest when None).
+        # Returns the touched pair addresses.
+        if self._warm_started is None:
+            self._warm_started = from_block is None and self.load_snapshot()
+            if self._warm_started:
+                return self.reserve_cache.poll()
+        return self.reserve_cache.start(from_block=from_block)
@@ -0,0 +1,251 @@
+import multiprocessing
+import os
+from multiprocessing import shared_memory
+import numpy as np
+from amm import AmmSimulator, Snapshot
+from cycles import CycleEngine
+from pair_registry import PairRegistry
+from pricing import ENGINES, register_engine
+from sizing import is_closed_form, optimal_inputs, search_input
+
+HEADER_WORDS = 4  # sequence, block number, pool count, spare
+WORD_MASK = 2**64 - 1
+
+
+class SharedReserves:
+    # Reserves of every registered pool (by registry position) in one shared-memory block that
+    # the ingest process writes and scan workers read in place. Reserves are uint112, so each side
+    # is stored as two uint64 words (low, high) and reads back exactly. The sequence number is odd
+    # while a write is in progress; readers copy the arrays and retry if it moved.
+
+    def __init__(self, pool_count, name=None):
+        self.owner = name is None
+        size = (HEADER_WORDS + 4 * max(pool_count, 1)) * 8
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size if self.owner else 0)
+        self.header = np.ndarray((HEADER_WORDS,), dtype=np.int64, buffer=self.shm.buf)
+        self.words = np.ndarray((pool_count, 4), dtype=np.uint64, buffer=self.shm.buf, offset=HEADER_WORDS * 8)
+        if self.owner:
+            self.header[:] = (0, -1, pool_count, 0)
+            self.words[:] = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def block_number(self):
+        block_number = int(self.header[1])
+        return None if block_number < 0 else block_number
+
+    def write(self, index, reserves, touched=None, block_number=None):
+        # Store {pair address: (reserve0, reserve1, ...)} for the touched pools (all when None);
+        # index maps pair address -> pool id
+        addresses = reserves.keys() if touched is None else touched
+        self.header[0] += 1
+        for address in addresses:
+            pool_id = index.get(address)
+            pair_reserves = reserves.get(address)
+            if pool_id is None or pair_reserves is None:
+                continue
+            reserve0, reserve1 = int(pair_reserves[0]), int(pair_reserves[1])
+            self.words[pool_id] = (reserve0 & WORD_MASK, reserve0 >> 64, reserve1 & WORD_MASK, reserve1 >> 64)
+        if block_number is not None:
+            self.header[1] = block_number
+        self.header[0] += 1
+
+    def read(self):
+        # (block number, private copy of the reserve words) from one consistent write
+        while True:
+            sequence = int(self.header[0])
+            if sequence % 2:
+                continue
+            words = self.words.copy()
+            block_number = self.block_number
+            if int(self.header[0]) == sequence:
+                return block_number, words
+
+    def close(self):
+        # Drop this process's mapping; the owner also frees the block
+        self.header = self.words = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class RouteLayout:
+    # Every cycle as a row of (routes, hops) arrays of pool ids and directions, so a scan gathers
+    # reserves with NumPy indexing instead of walking every route in Python. Shards are strided
+    # over the rows (shard k of n scans rows k, k + n, ...), so each gets a similar mix of lengths.
+    # Rows through pools without a closed-form sizing (Curve, Balancer) are flagged in searched.
+
+    def __init__(self, cycles, index, fees):
+        max_hops = max((len(cycle) for cycle in cycles), default=0)
+        shape = (len(cycles), max_hops)
+        self.pool_ids = np.zeros(shape, dtype=np.int64)
+        self.zero_for_one = np.zeros(shape, dtype=bool)
+        self.fees = np.zeros(shape)
+        self.hop_mask = np.zeros(shape, dtype=bool)
+        self.searched = np.array([not is_closed_form(cycle) for cycle in cycles], dtype=bool)
+        self.rows_by_pool = {}  # pool id -> [row]
+        for row, cycle in enumerate(cycles):
+            for hop, (pair, token_in, _) in enumerate(cycle.hops):
+                pool_id = index[pair.address]
+                self.pool_ids[row, hop] = pool_id
+                self.zero_for_one[row, hop] = token_in == pair.token0.address
+                self.fees[row, hop] = fees[pool_id]
+                self.hop_mask[row, hop] = True
+                self.rows_by_pool.setdefault(pool_id, []).append(row)
+
+    def rows(self, shard, shard_count, touched_ids=None):
+        # Row (= cycle index) of every cycle in the shard through the touched pools (all when None)
+        if touched_ids is None:
+            return np.arange(shard, len(self.pool_ids), shard_count)
+        rows = set()
+        for pool_id in touched_ids:
+            rows.update(row for row in self.rows_by_pool.get(pool_id, ()) if row % shard_count == shard)
+        return np.fromiter(sorted(rows), dtype=np.int64, count=len(rows))
+
+
+class ShardWorker:
+    # Scan state held by each worker process: the cycle universe (enumerated from the same config
+    # as the parent's, so cycle indexes agree), its route layout and a view of the shared reserves.
+    # Any worker can scan any shard.
+
+    def __init__(self, pairs_config, base_tokens, max_hops, shared_name):
+        registry = PairRegistry.load(pairs_config)
+        self.engine = CycleEngine(registry, base_tokens=base_tokens, max_hops=max_hops)
+        index = {pair.address: i for i, pair in enumerate(registry)}
+        self.layout = RouteLayout(self.engine.cycles, index, [pair.fee for pair in registry])
+        self.amm = AmmSimulator(registry)
+        self.pairs = registry.pairs
+        self.shared = SharedReserves(len(registry), name=shared_name)
+
+    def scan(self, shard, shard_count, touched_ids=None):
+        # (block number, [(cycle index, amount in, profit)]) for the profitable cycles of the
+        # shard through the touched pools (all when None): sized in one vectorized pass, then
+        # confirmed in wei with the AMM simulator, as find_cycle_opportunities does in-process
+        block_number, words = self.shared.read()
+        layout = self.layout
+        rows = layout.rows(shard, shard_count, touched_ids)
+        if not len(rows):
+            return block_number, []
+        searched = rows[layout.searched[rows]]
+        rows = rows[~layout.searched[rows]]
+        candidates, amounts = [], []
+        if len(rows):
+            reserve0 = words[:, 0].astype(np.float64) + words[:, 1].astype(np.float64) * 2.0**64
+            reserve1 = words[:, 2].astype(np.float64) + words[:, 3].astype(np.float64) * 2.0**64
+            pool_ids, zero_for_one, hop_mask = layout.pool_ids[rows], layout.zero_for_one[rows], layout.hop_mask[rows]
+            reserves_in = np.where(zero_for_one, reserve0[pool_ids], reserve1[pool_ids]) * hop_mask
+            reserves_out = np.where(zero_for_one, reserve1[pool_ids], reserve0[pool_ids]) * hop_mask
+            sized, profits = optimal_inputs(reserves_in, reserves_out, layout.fees[rows], hop_mask)
+            positions = np.flatnonzero(profits > 0)
+            candidates, amounts = rows[positions].tolist(), sized[positions].tolist()
+        if not candidates and not len(searched):
+            return block_number, []
+
+        # Exact reserves only for the pools the candidates (and the searched rows) trade through
+        exact0, exact1 = [0] * len(words), [0] * len(words)
+        involved = np.concatenate([layout.pool_ids[candidates], layout.pool_ids[searched]])
+        involved_mask = np.concatenate([layout.hop_mask[candidates], layout.hop_mask[searched]])
+        for pool_id in np.unique(involved[involved_mask]).tolist():
+            low0, high0, low1, high1 = words[pool_id].tolist()
+            exact0[pool_id], exact1[pool_id] = low0 | high0 << 64, low1 | high1 << 64
+        if len(searched):
+            reserves = {}
+            for pool_id in np.unique(layout.pool_ids[searched][layout.hop_mask[searched]]).tolist():
+                reserves[self.pairs[pool_id].address] = (exact0[pool_id], exact1[pool_id])
+            for row in searched.tolist():
+                amount_in, profit = self._search(self.engine.cycles[row], reserves)
+                if profit > 0:
+                    candidates.append(row)
+                    amounts.append(amount_in)
+        if not candidates:
+            return block_number, []
+
+        snapshot = Snapshot(exact0, exact1, self.amm.states.fee_numerators, block_number, engines=self.amm.states.engines)
+        simulated = self.amm.evaluate([self.engine.cycles[row] for row in candidates], amounts, snapshot)
+        return block_number, [(row, amount_in, profit) for row, (amount_in, _, profit) in zip(candidates, simulated) if profit > 0]
+
+    def _search(self, cycle, reserves):
+        # search_input, for cycles whose marginal rates multiply to more than one
+        rate = 1.0
+        for pair, token_in, _ in cycle.hops:
+            rate *= pair.engine.marginal_rate(reserves[pair.address], token_in == pair.token0.address)
+        return search_input(cycle, reserves) if rate > 1 else (0.0, 0.0)
+
+
+_worker = None
+
+
+def _init_worker(pairs_config, engines, base_tokens, max_hops, shared_name):
+    # Register the parent's pricing engines (add_dex_support ones too) before loading the config
+    global _worker
+    for kind, engine_class in engines.items():
+        register_engine(kind, engine_class)
+    _worker = ShardWorker(pairs_config, base_tokens, max_hops, shared_name)
+
+
+def _cycle_count(_):
+    return len(_worker.engine.cycles)
+
+
+def _scan_shard(args):
+    return _worker.scan(*args)
+
+
+class ShardedScanner:
+    # Splits the cycle universe across worker processes. The ingest side publishes each block's
+    # reserves into shared memory (only the pools that changed are written); scan() sends every
+    # worker just its shard number and the touched pool ids, and merges the shards' results into
+    # one list of (cycle, amount_in, profit), best first. Nothing per block is pickled but those
+    # ids and the (few) profitable results.
+
+    def __init__(self, registry, cycle_engine, pairs_config, processes=None, shards=None):
+        # Workers rebuild registry and cycles from pairs_config with cycle_engine's settings and
+        # the pricing engines registered here (engine classes must be importable to be sent)
+        self.cycles = cycle_engine.cycles
+        self.index = {pair.address: i for i, pair in enumerate(registry)}
+        self.pairs_config = pairs_config
+        self.processes = processes or os.cpu_count() or 1
+        self.shards = shards or self.processes
+        self.base_tokens = tuple(cycle_engine.base_tokens)
+        self.max_hops = cycle_engine.max_hops
+        self.engines = dict(ENGINES)
+        self.shared = SharedReserves(len(registry))
+        self.pool = None
+
+    def start(self):
+        # Workers come from a forkserver (spawned where there is none), not forked from this
+        # process: by now it may be running the metrics server, gas oracle or other threads
+        if self.pool is None:
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            context = multiprocessing.get_context(method)
+            self.pool = context.Pool(self.processes, initializer=_init_worker,
+                                     initargs=(self.pairs_config, self.engines, self.base_tokens, self.max_hops, self.shared.name))
+            counts = set(self.pool.map(_cycle_count, range(self.processes)))
+            if counts != {len(self.cycles)}:
+                self.close()
+                raise RuntimeError(f"scan workers enumerated {counts} cycles, expected {len(self.cycles)}")
+        return self
+
+    def publish(self, reserves, touched=None, block_number=None):
+        self.shared.write(self.index, reserves, touched, block_number)
+
+    def scan(self, touched=None):
+        touched_ids = None
+        if touched is not None:
+            touched_ids = sorted(self.index[address] for address in touched if address in self.index)
+        results = self.pool.map(_scan_shard, [(shard, self.shards, touched_ids) for shard in range(self.shards)])
+        merged = [(self.cycles[cycle_index], amount_in, profit) for _, shard in results for cycle_index, amount_in, profit in shard]
+        merged.sort(key=lambda item: item[2], reverse=True)
+        return merged
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+        if self.shared is not None:
+            self.shared.close()
+            self.shared = None
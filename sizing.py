@@ -0,0 +1,222 @@
+import numpy as np
+
+# Exact-integer fees are expressed over this denominator (Uniswap V2: 9970 / 10000 == 997 / 1000)
+FEE_DENOMINATOR = 10000
+UINT256_MAX = 2**256 - 1
+
+
+def fee_numerator(fee):
+    # 0.003 -> 9970
+    return int(round((1 - fee) * FEE_DENOMINATOR))
+
+
+def compose_routes(reserves_in, reserves_out, fees, hop_mask=None):
+    # Collapse every constant-product route into one equivalent pool (Ea, Eb) with the first hop's
+    # fee. Arrays are shaped (routes, hops); hop_mask marks the hops that exist so routes of
+    # different lengths can share one array.
+    reserves_in = np.asarray(reserves_in, dtype=np.float64)
+    reserves_out = np.asarray(reserves_out, dtype=np.float64)
+    gammas = 1.0 - np.asarray(fees, dtype=np.float64)
+    if hop_mask is None:
+        hop_mask = np.ones(reserves_in.shape, dtype=bool)
+
+    ea = reserves_in[:, 0].copy()
+    eb = reserves_out[:, 0].copy()
+    for hop in range(1, reserves_in.shape[1]):
+        a, b, gamma = reserves_in[:, hop], reserves_out[:, hop], gammas[:, hop]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            denominator = a + gamma * eb
+            next_ea = ea * a / denominator
+            next_eb = gamma * eb * b / denominator
+        active = hop_mask[:, hop]
+        ea = np.where(active, next_ea, ea)
+        eb = np.where(active, next_eb, eb)
+    return ea, eb, gammas[:, 0]
+
+
+def optimal_inputs(reserves_in, reserves_out, fees, hop_mask=None):
+    # Profit-maximizing input and the resulting profit (both in the start token) for every route.
+    # For the composite pool, out(x) = g*Eb*x / (Ea + g*x) and the profit out(x) - x peaks at
+    # x* = (sqrt(g*Ea*Eb) - Ea) / g. Routes that cannot be profitable get 0 input and 0 profit.
+    ea, eb, gamma = compose_routes(reserves_in, reserves_out, fees, hop_mask)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        amounts = (np.sqrt(gamma * ea * eb) - ea) / gamma
+        amounts = np.where(np.isfinite(amounts) & (amounts > 0), amounts, 0.0)
+        outputs = gamma * eb * amounts / (ea + gamma * amounts)
+    profits = np.where(amounts > 0, outputs - amounts, 0.0)
+    return amounts, profits
+
+
+def has_reserves(route, reserves):
+    # Every pool of the route has reserves; a route with a missing pool cannot be priced
+    return all(reserves.get(pair.address) is not None for pair, _, _ in route.hops)
+
+
+def route_arrays(routes, reserves):
+    # Lay out routes (cycles.Cycle or anything with .hops of (pair, token_in, token_out)) as
+    # (routes, hops) arrays of input reserves, output reserves, fees and a hop mask. A route with
+    # a pool missing from reserves is left all zeros, which optimal_inputs sizes at 0.
+    max_hops = max((len(route.hops) for route in routes), default=0)
+    shape = (len(routes), max_hops)
+    reserves_in = np.zeros(shape)
+    reserves_out = np.zeros(shape)
+    fees = np.zeros(shape)
+    hop_mask = np.zeros(shape, dtype=bool)
+    for i, route in enumerate(routes):
+        if not has_reserves(route, reserves):
+            continue
+        for j, (pair, token_in, _) in enumerate(route.hops):
+            pair_reserves = reserves[pair.address]
+            if token_in == pair.token0.address:
+                reserves_in[i, j], reserves_out[i, j] = pair_reserves[0], pair_reserves[1]
+            else:
+                reserves_in[i, j], reserves_out[i, j] = pair_reserves[1], pair_reserves[0]
+            fees[i, j] = pair.fee
+            hop_mask[i, j] = True
+    return reserves_in, reserves_out, fees, hop_mask
+
+
+def get_amount_out(amount_in, reserve_in, reserve_out, fee_num=9970):
+    # UniswapV2Library.getAmountOut with integer (uint256) semantics
+    if amount_in <= 0 or reserve_in <= 0 or reserve_out <= 0:
+        return 0
+    amount_in_with_fee = amount_in * fee_num
+    numerator = amount_in_with_fee * reserve_out
+    denominator = reserve_in * FEE_DENOMINATOR + amount_in_with_fee
+    if numerator > UINT256_MAX or denominator > UINT256_MAX:
+        raise OverflowError("uint256 overflow in getAmountOut")
+    return numerator // denominator
+
+
+def get_amount_in(amount_out, reserve_in, reserve_out, fee_num=9970):
+    # UniswapV2Library.getAmountIn with integer semantics; None where the library would revert
+    if amount_out <= 0 or reserve_in <= 0 or reserve_out <= amount_out:
+        return None
+    numerator = reserve_in * amount_out * FEE_DENOMINATOR
+    denominator = (reserve_out - amount_out) * fee_num
+    return numerator // denominator + 1
+
+
+def exact_route_output(amount_in, hops):
+    # hops is a list of (reserve_in, reserve_out, fee_numerator) integers
+    amount = amount_in
+    for reserve_in, reserve_out, fee_num in hops:
+        amount = get_amount_out(amount, reserve_in, reserve_out, fee_num)
+    return amount
+
+
+def is_closed_form(route):
+    # Every hop is a constant-product pool, so optimal_inputs can size the route
+    return all(pair.engine.closed_form for pair, _, _ in route.hops)
+
+
+def route_quotes(route, amounts_in, reserves):
+    # Float output of a route of any pool types for an array of inputs: one batched quote per hop
+    amounts = np.asarray(amounts_in, dtype=np.float64)
+    for pair, token_in, _ in route.hops:
+        pair_reserves = reserves.get(pair.address)
+        if pair_reserves is None:
+            return np.zeros_like(amounts)
+        amounts = pair.engine.quote(amounts, token_in == pair.token0.address, pair_reserves)
+    return amounts
+
+
+def engine_route_output(route, amount_in, reserves):
+    # Exact output of a route of any pool types through the pools' pricing engines
+    amount = int(amount_in)
+    for pair, token_in, _ in route.hops:
+        amount = pair.engine.get_amount_out(amount, token_in == pair.token0.address, reserves[pair.address])
+        if amount <= 0:
+            return 0
+    return amount
+
+
+def search_input(route, reserves, points=33, rounds=4):
+    # Profit-maximizing input and profit for a route without a closed form. Profit is concave
+    # in the input, so a log-spaced grid up to the first pool's input balance brackets the peak,
+    # and each round zooms in on the best point and its neighbours.
+    pair, token_in, _ = route.hops[0]
+    first = reserves.get(pair.address)
+    upper = 0.0 if first is None else float(first[0] if token_in == pair.token0.address else first[1])
+    if upper <= 0:
+        return 0.0, 0.0
+    amounts = np.geomspace(upper * 1e-9, upper, points)
+    for round_number in range(rounds + 1):
+        profits = route_quotes(route, amounts, reserves) - amounts
+        best = int(np.argmax(profits))
+        if round_number < rounds:
+            amounts = np.linspace(amounts[max(best - 1, 0)], amounts[min(best + 1, points - 1)], points)
+    if profits[best] <= 0:
+        return 0.0, 0.0
+    return float(amounts[best]), float(profits[best])
+
+
+def exact_hops(route, reserves):
+    hops = []
+    for pair, token_in, _ in route.hops:
+        reserve0, reserve1 = reserves[pair.address][:2]
+        if token_in == pair.token0.address:
+            hops.append((int(reserve0), int(reserve1), fee_numerator(pair.fee)))
+        else:
+            hops.append((int(reserve1), int(reserve0), fee_numerator(pair.fee)))
+    return hops
+
+
+def exact_optimal_input(output, estimate, window=0.01):
+    # Refine a float estimate into the integer input with the highest exact profit, using a
+    # ternary search over +/- window around it (profit is concave in the input). output maps
+    # an integer input to the route's exact output.
+    estimate = int(estimate)
+    if estimate <= 0:
+        return 0, 0
+    low = max(1, int(estimate * (1 - window)))
+    high = int(estimate * (1 + window)) + 1
+
+    def profit(amount):
+        return output(amount) - amount
+
+    while high - low > 2:
+        left = low + (high - low) // 3
+        right = high - (high - low) // 3
+        if profit(left) < profit(right):
+            low = left + 1
+        else:
+            high = right - 1
+    best = max(range(low, high + 1), key=profit)
+    return best, profit(best)
+
+
+def size_routes(routes, reserves, exact=False):
+    # Size every route and return (route, amount_in, profit) for the profitable ones, best
+    # first. Constant-product routes are sized in one vectorized pass; routes through other pool
+    # types by search_input. With exact=True the winners are re-checked with integer math.
+    # Routes through a pool missing from reserves are dropped.
+    closed_form, searched = [], []
+    for route in routes:
+        if has_reserves(route, reserves):
+            (closed_form if is_closed_form(route) else searched).append(route)
+    candidates = []  # (route, float amount in, float profit)
+    if closed_form:
+        amounts, profits = optimal_inputs(*route_arrays(closed_form, reserves))
+        candidates = [(closed_form[index], amounts[index], profits[index]) for index in np.flatnonzero(profits > 0)]
+    for route in searched:
+        amount_in, profit = search_input(route, reserves)
+        if profit > 0:
+            candidates.append((route, amount_in, profit))
+
+    sized = []
+    for route, amount_in, profit in candidates:
+        if exact:
+            if is_closed_form(route):
+                hops = exact_hops(route, reserves)
+                output = lambda amount: exact_route_output(amount, hops)
+            else:
+                output = lambda amount: engine_route_output(route, amount, reserves)
+            amount_in, profit = exact_optimal_input(output, amount_in)
+            if profit <= 0:
+                continue
+            sized.append((route, amount_in, profit))
+        else:
+            sized.append((route, float(amount_in), float(profit)))
+    sized.sort(key=lambda item: item[2], reverse=True)
+    return sized
@@ -0,0 +1,247 @@
+import hashlib
+import os
+import random
+import sys
+import pytest
+from eth_abi import decode, encode
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [REPO_DIR, os.path.join(REPO_DIR, "benchmarks")]
+
+from mock_node import MockChain, MockNode  # noqa: E402
+from pair_registry import PairRegistry, Token  # noqa: E402
+from run_benchmarks import synthetic_pools  # noqa: E402
+
+GET_RESERVES = "0x0902f1ac"
+TRY_BLOCK_AND_AGGREGATE = "0x399542e9"
+WETH = "0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2"
+SYNC_TOPIC = "0x1c411e9a96e071241c2f21f7726b17ae89e3cab4c78be50e062b03a9fffbbad1"
+
+# Tokens and pools of every type, with prices a little apart so there are profitable cycles
+MIXED_CONFIG = {
+    "tokens": {
+        "WETH": {"address": "0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2", "decimals": 18},
+        "USDC": {"address": "0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48", "decimals": 6},
+        "DAI": {"address": "0x6B175474E89094C44Da98b954EedeAC495271d0F", "decimals": 18},
+        "BAL": {"address": "0xba100000625a3754423978a60c9317c58a424e3D", "decimals": 18},
+    },
+    "pairs": [
+        {"dex": "uniswap", "address": "0xB4e16d0168e52d35CaCD2c6185b44281Ec28C9Dc", "token0": "USDC", "token1": "WETH"},
+        {"dex": "sushiswap", "address": "0x397FF1542f962076d0BFE58eA045FfA2d347ACa0", "token0": "USDC", "token1": "WETH"},
+        {"dex": "uniswap", "address": "0xA478c2975Ab1Ea89e8196811F51A7B7Ade33eB11", "token0": "DAI", "token1": "WETH"},
+        {"dex": "curve", "address": "0xbEbc44782C7dB0a1A60Cb6fe97d0b483032FF1C7", "token0": "DAI", "token1": "USDC",
+         "type": "stableswap", "amp": 2000, "fee": 0.0001},
+        {"dex": "balancer", "address": "0x5c6Ee304399DBdB9C8Ef030aB642B10820DB8F56", "token0": "BAL", "token1": "WETH",
+         "type": "weighted", "weights": [0.8, 0.2], "fee": 0.01,
+         "pool_id": "0x5c6ee304399dbdb9c8ef030ab642b10820db8f56000200000000000000000014"},
+        {"dex": "sushiswap", "address": "0x795065dcc9f64b5614c407a6efdc400da6221fb0", "token0": "BAL", "token1": "WETH"},
+    ],
+}
+MIXED_RESERVES = [
+    (50_000_000 * 10**6, 20_000 * 10**18),
+    (10_120_000 * 10**6, 4_000 * 10**18),
+    (30_900_000 * 10**18, 12_000 * 10**18),
+    (100_000_000 * 10**18, 99_000_000 * 10**6),
+    (4_000_000 * 10**18, 5_000 * 10**18),
+    (1_000_000 * 10**18, 1_290 * 10**18),
+]
+
+
+def uniswap_amount_out(amount_in, reserve_in, reserve_out):
+    # UniswapV2Library.getAmountOut with the 0.3% fee
+    amount_in_with_fee = amount_in * 997
+    return amount_in_with_fee * reserve_out // (reserve_in * 1000 + amount_in_with_fee)
+
+
+def route_output(route, amount, reserves):
+    for pair, token_in, _ in route.hops:
+        reserve0, reserve1 = reserves[pair.address]
+        reserve_in, reserve_out = (reserve0, reserve1) if token_in == pair.token0.address else (reserve1, reserve0)
+        amount = uniswap_amount_out(amount, reserve_in, reserve_out)
+    return amount
+
+
+class FakeRpc:
+    # In-process stand-in for JsonRpcClient over a chain of Uniswap V2 style pools. advance()
+    # mines a block that moves a few pools and emits their Sync logs; reorg() replaces the most
+    # recent blocks with a longer fork. `requests` records the methods of every round-trip.
+
+    def __init__(self, reserves, block_number=1000, seed=0):
+        self.random = random.Random(seed)
+        self.reserves = {address.lower(): list(values) for address, values in reserves.items()}
+        self.block_number = block_number
+        self.logs = {}  # block number -> [log]
+        self.undo = {}  # block number -> {address: reserves before that block}
+        self.forks = 0
+        self.hashes = {}  # block number -> hash, for blocks mined on a fork
+        self.requests = []
+
+    def hash(self, number):
+        return self.hashes.get(number) or "0x" + hashlib.sha256(str(number).encode()).hexdigest()
+
+    def advance(self, count=5):
+        # Mine a block that moves the reserves of `count` random pools
+        self.block_number += 1
+        if self.forks:
+            self.hashes[self.block_number] = "0x" + hashlib.sha256(f"{self.block_number}-{self.forks}".encode()).hexdigest()
+        logs = self.logs[self.block_number] = []
+        undo = self.undo[self.block_number] = {}
+        for index, address in enumerate(self.random.sample(sorted(self.reserves), count)):
+            reserves = self.reserves[address]
+            undo[address] = list(reserves)
+            drift = self.random.uniform(0.998, 1.002)
+            reserves[:] = [int(reserves[0] * drift), int(reserves[1] / drift)]
+            logs.append({
+                "address": address,
+                "blockNumber": hex(self.block_number),
+                "blockHash": self.hash(self.block_number),
+                "logIndex": hex(index),
+                "topics": [SYNC_TOPIC],
+                "data": "0x" + encode(["uint256", "uint256"], reserves).hex(),
+                "removed": False
+            })
+
+    def reorg(self, depth):
+        # Drop the last depth blocks and mine depth + 1 different ones in their place
+        self.forks += 1
+        for _ in range(depth):
+            for address, reserves in self.undo.pop(self.block_number).items():
+                self.reserves[address] = reserves
+            del self.logs[self.block_number]
+            self.block_number -= 1
+        for _ in range(depth + 1):
+            self.advance()
+
+    def call(self, method, params=None):
+        self.requests.append([method])
+        return self.handle(method, params or [])
+
+    def batch(self, calls):
+        self.requests.append([method for method, _ in calls])
+        return [self.handle(method, params or []) for method, params in calls]
+
+    def handle(self, method, params):
+        if method == "eth_blockNumber":
+            return hex(self.block_number)
+        if method == "eth_gasPrice":
+            return hex(20 * 10**9)
+        if method == "eth_call":
+            return self.eth_call(params[0])
+        if method == "eth_getLogs":
+            return self.get_logs(params[0])
+        if method == "eth_getBlockByNumber":
+            number = self.block_number if params[0] == "latest" else int(params[0], 16)
+            if number > self.block_number:
+                return None
+            return {"number": hex(number), "hash": self.hash(number), "parentHash": self.hash(number - 1), "transactions": []}
+        raise NotImplementedError(method)
+
+    def reserves_return_data(self, address):
+        reserve0, reserve1 = self.reserves[address.lower()]
+        return encode(["uint112", "uint112", "uint32"], [reserve0, reserve1, 0])
+
+    def eth_call(self, call):
+        data = call["data"]
+        if data.startswith(TRY_BLOCK_AND_AGGREGATE):
+            _, calls = decode(["bool", "(address,bytes)[]"], bytes.fromhex(data[10:]))
+            results = [(True, self.reserves_return_data(target)) if target.lower() in self.reserves else (False, b"")
+                       for target, _ in calls]
+            return "0x" + encode(["uint256", "bytes32", "(bool,bytes)[]"], [self.block_number, bytes(32), results]).hex()
+        if data.startswith(GET_RESERVES) and call["to"].lower() in self.reserves:
+            return "0x" + self.reserves_return_data(call["to"]).hex()
+        return "0x"
+
+    def get_logs(self, query):
+        addresses = {address.lower() for address in query["address"]}
+        logs = []
+        for number in range(int(query["fromBlock"], 16), int(query["toBlock"], 16) + 1):
+            logs += [log for log in self.logs.get(number, []) if log["address"] in addresses]
+        return logs
+
+
+@pytest.fixture
+def pools():
+    # {address: (reserve0, reserve1)} for 50 Uniswap V2 style pools
+    rng = random.Random(0)
+    return {"0x" + rng.randbytes(20).hex(): (rng.randint(10**20, 10**24), rng.randint(10**20, 10**24)) for _ in range(50)}
+
+
+@pytest.fixture
+def rpc(pools):
+    return FakeRpc(pools)
+
+
+@pytest.fixture
+def registry(pools):
+    # The pools as TOKEN/WETH pairs of one DEX
+    registry = PairRegistry()
+    registry.add_token(Token("WETH", WETH, 18))
+    for index, address in enumerate(pools):
+        token = registry.add_token(Token(f"T{index}", "0x" + f"{index + 1:040x}", 18))
+        registry.add_pair("uniswap", address, token, "WETH")
+    return registry
+
+
+@pytest.fixture
+def triangle():
+    # WETH, USDC and DAI with two USDC/WETH pools and one pool for each other pair
+    registry = PairRegistry()
+    registry.add_token(Token("WETH", WETH, 18))
+    registry.add_token(Token("USDC", "0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48", 6))
+    registry.add_token(Token("DAI", "0x6B175474E89094C44Da98b954EedeAC495271d0F", 18))
+    registry.add_pair("uniswap", "0xB4e16d0168e52d35CaCD2c6185b44281Ec28C9Dc", "USDC", "WETH")
+    registry.add_pair("sushiswap", "0x397FF1542f962076d0BFE58eA045FfA2d347ACa0", "USDC", "WETH")
+    registry.add_pair("uniswap", "0xA478c2975Ab1Ea89e8196811F51A7B7Ade33eB11", "DAI", "WETH")
+    registry.add_pair("uniswap", "0xAE461cA67B15dc8dc81CE7615e0320dA1A9aB8D5", "DAI", "USDC")
+    return registry
+
+
+@pytest.fixture
+def triangle_reserves(triangle):
+    # Every pool at 2500 USDC (or DAI) per WETH
+    uniswap, sushiswap, dai_weth, dai_usdc = triangle.addresses
+    return {
+        uniswap: (50_000_000 * 10**6, 20_000 * 10**18),
+        sushiswap: (10_000_000 * 10**6, 4_000 * 10**18),
+        dai_weth: (50_000_000 * 10**18, 20_000 * 10**18),
+        dai_usdc: (10_000_000 * 10**18, 10_000_000 * 10**6),
+    }
+
+
+@pytest.fixture
+def gapped_reserves(triangle, triangle_reserves):
+    # Sushiswap pays 2% more USDC per WETH and DAI trades 1% under USDC
+    uniswap, sushiswap, dai_weth, dai_usdc = triangle.addresses
+    return dict(triangle_reserves, **{
+        sushiswap: (10_200_000 * 10**6, 4_000 * 10**18),
+        dai_usdc: (10_100_000 * 10**18, 10_000_000 * 10**6),
+    })
+
+
+@pytest.fixture
+def mixed_registry():
+    return PairRegistry.from_config(MIXED_CONFIG)
+
+
+@pytest.fixture
+def mixed_reserves(mixed_registry):
+    return {pair.address: reserves for pair, reserves in zip(mixed_registry, MIXED_RESERVES)}
+
+
+@pytest.fixture
+def synthetic():
+    # (pairs config, {address: reserves}) for 50 pools, as in the benchmarks
+    return synthetic_pools(50)
+
+
+@pytest.fixture
+def chain(synthetic):
+    return MockChain(synthetic[1], touch_fraction=0.1)
+
+
+@pytest.fixture
+def node(chain):
+    # Blocks are only mined when a test calls chain.advance()
+    node = MockNode(chain, auto_advance=False).start()
+    yield node
+    node.stop()
@@ -0,0 +1,49 @@
+import random
+from amm import AmmSimulator
+from cycles import CycleEngine
+from sizing import engine_route_output, is_closed_form
+from conftest import route_output
+
+
+def test_amm_matches_getamountout_to_the_wei(triangle, gapped_reserves):
+    amm = AmmSimulator(triangle)
+    amm.update(gapped_reserves, block_number=1)
+    cycles = CycleEngine(triangle).cycles
+    generator = random.Random(0)
+    amounts = [generator.randrange(1, 10**22) for _ in cycles]
+    for cycle, amount_in, (simulated_in, amount_out, profit) in zip(cycles, amounts, amm.evaluate(cycles, amounts)):
+        assert simulated_in == amount_in
+        assert amount_out == route_output(cycle, amount_in, gapped_reserves)
+        assert profit == amount_out - amount_in
+    # Each route runs on its own fork: the block's reserves are untouched
+    assert [amm.snapshot().reserves(pool_id) for pool_id in range(len(triangle))] == list(gapped_reserves.values())
+
+
+def test_applied_trades_move_the_snapshot(triangle, gapped_reserves):
+    amm = AmmSimulator(triangle)
+    amm.update(gapped_reserves)
+    cycle = CycleEngine(triangle).cycles[0]
+    snapshot = amm.snapshot()
+    first = amm.apply(cycle, 10**18, snapshot)
+    assert first == amm.simulate(cycle, 10**18)
+    # The same trade again sees the reserves the first one left behind
+    assert amm.simulate(cycle, 10**18, snapshot) < first
+    assert amm.snapshot().changes == {}
+
+
+def test_reverting_swaps_return_nothing(triangle, gapped_reserves):
+    amm = AmmSimulator(triangle)
+    amm.update(gapped_reserves)
+    cycle = CycleEngine(triangle).cycles[0]
+    assert amm.simulate(cycle, 0) == 0
+    assert amm.simulate(cycle, 2**112) == 0  # reserve_in would overflow uint112
+
+
+def test_amm_matches_pricing_engines_on_mixed_routes(mixed_registry, mixed_reserves):
+    amm = AmmSimulator(mixed_registry)
+    amm.update(mixed_reserves)
+    cycles = [cycle for cycle in CycleEngine(mixed_registry).cycles if not is_closed_form(cycle)]
+    assert cycles
+    for cycle in cycles:
+        for amount_in in (10**15, 10**18, 10**21):
+            assert amm.simulate(cycle, amount_in) == engine_route_output(cycle, amount_in, mixed_reserves)
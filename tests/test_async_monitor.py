@@ -0,0 +1,93 @@
+import asyncio
+import os
+import threading
+import time
+import pytest
+import main
+from reserves import BatchReserveReader
+from runtime import Runtime
+from conftest import REPO_DIR, FakeRpc
+
+UNISWAP_RESERVES = (50_000_000 * 10**6, 20_000 * 10**18)
+SUSHISWAP_RESERVES = (10_120_000 * 10**6, 4_000 * 10**18)
+
+
+class AsyncFakeRpc:
+    # FakeRpc behind coroutine call/batch, with a delay in seconds per method
+    def __init__(self, rpc, delays=None):
+        self.rpc = rpc
+        self.delays = delays or {}
+        self.cancelled = []
+
+    async def call(self, method, params=None):
+        try:
+            await asyncio.sleep(self.delays.get(method, 0))
+        except asyncio.CancelledError:
+            self.cancelled.append(method)
+            raise
+        return self.rpc.call(method, params)
+
+    async def batch(self, calls):
+        await asyncio.sleep(max(self.delays.get(method, 0) for method, _ in calls))
+        return self.rpc.batch(calls)
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def runtime(monkeypatch):
+    runtime = Runtime({"PAIRS_CONFIG": os.path.join(REPO_DIR, "pairs.json")})
+    monkeypatch.setattr(main, "runtime", runtime)
+    return runtime
+
+
+@pytest.fixture
+def evaluated(monkeypatch):
+    calls = []
+
+    def evaluate_opportunity(*args, **kwargs):
+        calls.append(args)
+        evaluate_opportunity.thread = threading.current_thread()
+        return 1.0
+
+    monkeypatch.setattr(main, "evaluate_opportunity", evaluate_opportunity)
+    return calls
+
+
+def make_monitor(rpc, timeout=1):
+    monitor = main.AsyncArbitrageMonitor(timeout=timeout)
+    monitor.rpc = rpc
+    monitor.reader = BatchReserveReader(rpc)
+    return monitor
+
+
+def both_pools():
+    return FakeRpc({main.runtime.uniswap_pair.address: UNISWAP_RESERVES, main.runtime.sushiswap_pair.address: SUSHISWAP_RESERVES})
+
+
+def test_fetches_run_concurrently(evaluated):
+    monitor = make_monitor(AsyncFakeRpc(both_pools(), {"eth_call": 0.2, "eth_gasPrice": 0.2}))
+    started = time.perf_counter()
+    assert asyncio.run(monitor.run_iteration()) == 1.0
+    assert time.perf_counter() - started < 0.35
+    assert len(evaluated) == 1
+    assert evaluated[0][:4] == (2500.0, 2530.0, 20.0, 0.0009)
+    # Evaluation can wait on a full storage queue, so it runs off the event loop
+    assert main.evaluate_opportunity.thread is not threading.main_thread()
+
+
+def test_missing_prices_cancel_the_other_fetches(evaluated):
+    rpc = AsyncFakeRpc(FakeRpc({}), {"eth_gasPrice": 1})
+    monitor = make_monitor(rpc)
+    started = time.perf_counter()
+    assert asyncio.run(monitor.run_iteration()) is None
+    assert time.perf_counter() - started < 0.5
+    assert rpc.cancelled == ["eth_gasPrice"]
+    assert evaluated == []
+
+
+def test_a_slow_fetch_times_out(evaluated):
+    monitor = make_monitor(AsyncFakeRpc(both_pools(), {"eth_gasPrice": 1}), timeout=0.1)
+    assert asyncio.run(monitor.run_iteration()) is None
+    assert evaluated == []
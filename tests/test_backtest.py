@@ -0,0 +1,135 @@
+import json
+import random
+import pytest
+from backtest import ReplayEngine, run_backtest, snapshots_from_history, snapshots_from_logs
+from history import HistoryRecorder
+from reserve_cache import SYNC_TOPIC
+
+
+@pytest.fixture
+def pairs_config(tmp_path, triangle):
+    config = {
+        "tokens": {token.symbol: {"address": token.address, "decimals": token.decimals} for token in triangle.tokens.values()},
+        "pairs": [{"dex": pair.dex, "address": pair.address, "token0": pair.token0.symbol, "token1": pair.token1.symbol} for pair in triangle]
+    }
+    path = tmp_path / "pairs.json"
+    path.write_text(json.dumps(config))
+    return str(path)
+
+
+@pytest.fixture
+def snapshots(triangle_reserves):
+    # Every pool in the first block, then one or two pools moving by up to 3% per block
+    generator = random.Random(1)
+    reserves = dict(triangle_reserves)
+    snapshots = [(100, dict(reserves), 20.0)]
+    for block_number in range(101, 200):
+        changes = {}
+        for address in generator.sample(sorted(reserves), generator.randint(1, 2)):
+            drift = generator.uniform(0.97, 1.03)
+            reserves[address] = changes[address] = (int(reserves[address][0] * drift), int(reserves[address][1] / drift))
+        snapshots.append((block_number, changes, 20.0))
+    return snapshots
+
+
+@pytest.fixture
+def synthetic_config(tmp_path, synthetic):
+    path = tmp_path / "synthetic.json"
+    path.write_text(json.dumps(synthetic[0]))
+    return str(path)
+
+
+@pytest.fixture
+def synthetic_snapshots(synthetic):
+    # Every pool in the first block, then a few pools moving by up to 3% per block
+    generator = random.Random(1)
+    reserves = {address: tuple(pool_reserves) for address, pool_reserves in synthetic[1].items()}
+    snapshots = [(100, dict(reserves), 20.0)]
+    for block_number in range(101, 300):
+        changes = {}
+        for address in generator.sample(sorted(reserves), 5):
+            drift = generator.uniform(0.97, 1.03)
+            reserves[address] = changes[address] = (int(reserves[address][0] * drift), int(reserves[address][1] / drift))
+        snapshots.append((block_number, changes, 20.0))
+    return snapshots
+
+
+def test_replay_takes_the_best_trade_per_block(pairs_config, snapshots):
+    result = run_backtest(snapshots, pairs_config)
+    assert result.snapshots == len(snapshots)
+    assert 0 < result.trades <= result.opportunities
+    assert result.trades <= len(snapshots)
+    assert result.pnl > 0
+    assert result.best == sorted(result.best, key=lambda item: item[2], reverse=True)
+    # Gas eats the small gaps
+    expensive = run_backtest([(block, changes, 5000.0) for block, changes, _ in snapshots], pairs_config)
+    assert expensive.trades < result.trades
+
+
+def test_parallel_replay_matches_serial(synthetic_config, synthetic_snapshots):
+    serial = run_backtest(synthetic_snapshots, synthetic_config, processes=1)
+    parallel = run_backtest(synthetic_snapshots, synthetic_config, processes=4)
+    assert serial.trades > 0
+    assert (parallel.snapshots, parallel.opportunities, parallel.trades) == (serial.snapshots, serial.opportunities, serial.trades)
+    assert parallel.pnl == pytest.approx(serial.pnl, rel=1e-12)
+    assert parallel.best == serial.best
+
+
+def test_snapshots_from_history_group_by_block(tmp_path):
+    path = str(tmp_path / "history.bin")
+    recorder = HistoryRecorder(path)
+    recorder.record(7, "0xaa", 1, 2, 20.0, None)
+    recorder.record(5, "0xbb", 3, 4, None, 1.5)
+    recorder.record(7, "0xaa", 5, 6, 21.0, None)
+    recorder.record(7, "0xbb", 7, 8, None, None)
+    recorder.close()
+    assert snapshots_from_history(path) == [
+        (5, {"0xbb": (3, 4)}, None),
+        (7, {"0xaa": (5, 6), "0xbb": (7, 8)}, 21.0),
+    ]
+
+
+def test_snapshots_from_logs(tmp_path, triangle):
+    uniswap, sushiswap = triangle.addresses[:2]
+
+    def sync(address, block_number, reserve0, reserve1):
+        data = "0x" + reserve0.to_bytes(32, "big").hex() + reserve1.to_bytes(32, "big").hex()
+        return {"address": address.lower(), "blockNumber": hex(block_number), "topics": [SYNC_TOPIC], "data": data}
+
+    path = tmp_path / "sync_logs.jsonl"
+    logs = [sync(uniswap, 11, 1, 2), sync(sushiswap, 10, 3, 4), sync("0x" + "cd" * 20, 10, 5, 6), sync(uniswap, 11, 7, 8)]
+    path.write_text("\n".join(json.dumps(log) for log in logs) + "\n")
+    assert snapshots_from_logs(str(path), triangle, gas_price_gwei=20.0) == [
+        (10, {sushiswap: (3, 4)}, 20.0),
+        (11, {uniswap: (7, 8)}, 20.0),
+    ]
+
+
+def test_history_replays_exact_reserves(tmp_path):
+    path = str(tmp_path / "history.bin")
+    recorder = HistoryRecorder(path)
+    large = (10**21 + 12345, 2**112 - 1)
+    recorder.record(7, "0xaa", *large, 20.0, None)
+    recorder.record(5, "0xbb", 3, 4, None, 1.5)
+    recorder.record(7, "0xbb", 10**18 + 1, 5, 21.0, None)
+    recorder.close()
+    assert snapshots_from_history(path) == [
+        (5, {"0xbb": (3, 4)}, None),
+        (7, {"0xaa": large, "0xbb": (10**18 + 1, 5)}, 21.0),
+    ]
+
+
+def test_gas_is_priced_in_the_start_token(triangle, gapped_reserves):
+    # The same price gap traded from USDC and from WETH nets about the same WETH, and gas that
+    # eats the WETH profit stops both
+    snapshots = [(100, gapped_reserves, 0.0)]
+    from_weth = ReplayEngine(triangle, base_tokens=("WETH",)).replay(snapshots)
+    from_usdc = ReplayEngine(triangle, base_tokens=("USDC",)).replay(snapshots)
+    assert from_weth.trades == from_usdc.trades == 1
+    assert from_usdc.pnl == pytest.approx(from_weth.pnl, rel=0.05)
+    gas_price_gwei = 2 * from_weth.pnl / (1e-9 * 210000)
+    for base_token in ("WETH", "USDC"):
+        assert ReplayEngine(triangle, base_tokens=(base_token,)).replay([(100, gapped_reserves, gas_price_gwei)]).trades == 0
+    engine = ReplayEngine(triangle)
+    assert engine.weth_price(triangle.token("USDC"), gapped_reserves) == 2500.0
+    assert engine.weth_price(triangle.token("DAI"), {}) is None
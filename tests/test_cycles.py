@@ -0,0 +1,44 @@
+import math
+import pytest
+from cycles import CycleEngine
+
+
+def test_cycles_are_enumerated_once_and_indexed_by_pair(triangle):
+    engine = CycleEngine(triangle)
+    # Both directions of the two-pool WETH/USDC loop and of the four WETH/USDC/DAI triangles
+    assert sorted(len(cycle) for cycle in engine.cycles) == [2, 2, 3, 3, 3, 3]
+    assert len({cycle.key for cycle in engine.cycles}) == len(engine.cycles)
+    for cycle in engine.cycles:
+        assert cycle.start_token == triangle.token("WETH").address
+    for address in triangle.addresses:
+        expected = [index for index, cycle in enumerate(engine.cycles) if address in cycle.pair_addresses]
+        assert sorted(engine.cycles_by_pair[address]) == expected
+    assert len(CycleEngine(triangle, max_hops=2).cycles) == 2
+
+
+def test_balanced_pools_have_no_opportunities(triangle, triangle_reserves):
+    engine = CycleEngine(triangle)
+    assert engine.update(triangle_reserves) == []
+    assert engine.find_negative_cycles(triangle_reserves) == []
+
+
+def test_price_gap_is_found(triangle, triangle_reserves):
+    uniswap, sushiswap = triangle.addresses[:2]
+    engine = CycleEngine(triangle)
+    reserves = dict(triangle_reserves)
+    engine.update(reserves)
+    # Sushiswap pays 2% more USDC per WETH
+    reserves[sushiswap] = (51_000_000 * 10**6, 20_000 * 10**18)
+    opportunities = engine.update(reserves, touched=[sushiswap])
+    assert opportunities
+    cycle, rate = opportunities[0]
+    assert [pair.address for pair, _, _ in cycle.hops] == [sushiswap, uniswap]
+    assert rate == pytest.approx(1.02 * 0.997**2)
+    # Only cycles through the touched pool are re-checked, and the full update agrees
+    assert all(sushiswap in cycle.pair_addresses for cycle, _ in opportunities)
+    assert engine.update(reserves) == opportunities
+
+    negative = engine.find_negative_cycles(reserves)
+    assert any(found.key == cycle.key for found in negative)
+    assert all(engine.cycle_weight(found) < 0 for found in negative)
+    assert math.exp(-engine.cycle_weight(cycle)) == pytest.approx(rate)
@@ -0,0 +1,59 @@
+import pytest
+import rlp
+from eth_account import Account
+from cycles import CycleEngine
+from execution import BundleSubmitter, HeadTracker, NonceManager, SubmissionPipeline, TransactionTemplate
+from gas_oracle import GasOracle
+from rpc import AsyncRpcPool, JsonRpcClient
+
+PRIVATE_KEY = "0x" + "11" * 32
+EXECUTOR = "0x" + "22" * 20
+
+
+def test_template_signs_like_eth_account(triangle):
+    template = TransactionTemplate(PRIVATE_KEY, EXECUTOR, chain_id=1)
+    route = CycleEngine(triangle).cycles[0]
+    data = template.calldata(route, 10**18, 10**18 + 1)
+    raw = template.sign(7, 2 * 10**9, 50 * 10**9, data)
+    expected = Account.sign_transaction({
+        "type": 2, "chainId": 1, "nonce": 7, "maxPriorityFeePerGas": 2 * 10**9, "maxFeePerGas": 50 * 10**9,
+        "gas": template.gas_limit, "to": EXECUTOR, "value": 0, "data": data, "accessList": []
+    }, PRIVATE_KEY)
+    assert raw == bytes(expected.rawTransaction)
+    # Only the amount words change between trades on the same route
+    assert template.calldata(route, 5, 6)[68:] == data[68:]
+
+
+def test_bundles_reach_the_relay_for_every_target_block(node, chain, triangle):
+    client = JsonRpcClient(node.url)
+    gas_oracle = GasOracle(client)
+    gas_oracle.refresh()
+    head = HeadTracker()
+    head.on_block(chain.block_number)
+    template = TransactionTemplate(PRIVATE_KEY, EXECUTOR)
+    submitter = BundleSubmitter(node.url)
+    pipeline = SubmissionPipeline(template, submitter, head, gas_oracle, NonceManager(client, template.address),
+                                  rpc=AsyncRpcPool.from_urls([node.url])).start()
+    try:
+        route = CycleEngine(triangle).cycles[0]
+        results = pipeline.execute(route, 10**18, 10**18 + 1, after="0x" + "33" * 32).result(timeout=10)
+    finally:
+        pipeline.stop()
+
+    assert all("bundleHash" in result for result in results)
+    assert sorted(int(params["blockNumber"], 16) for _, params in node.bundles) == [chain.block_number + offset for offset in (1, 2, 3)]
+    for header, params in node.bundles:
+        # The backrun goes right behind the pending transaction, signed by our account
+        victim, ours = params["txs"]
+        assert victim == "0x02" + "33" * 32
+        fields = rlp.decode(bytes.fromhex(ours[4:]))
+        assert fields[5] == bytes.fromhex(EXECUTOR[2:])
+        assert header.split(":")[0] == submitter.signer.address
+
+
+def test_no_bundle_without_a_head_block(node):
+    client = JsonRpcClient(node.url)
+    template = TransactionTemplate(PRIVATE_KEY, EXECUTOR)
+    pipeline = SubmissionPipeline(template, BundleSubmitter(node.url), HeadTracker(), GasOracle(client), NonceManager(client, template.address))
+    with pytest.raises(RuntimeError, match="head block"):
+        pipeline.submit_bundle([b"\x02"])
@@ -0,0 +1,99 @@
+import logging
+import os
+import pytest
+import main
+from gas_oracle import GasOracle
+from pair_registry import PairRegistry, Token
+from runtime import Runtime
+from conftest import REPO_DIR
+
+# eth_feeHistory(4, "latest", [10, 50, 90]) in the node's hex encoding: baseFeePerGas has one
+# entry more than the sampled blocks, the base fee of the next block
+FEE_HISTORY = {
+    "oldestBlock": hex(18_000_000),
+    "baseFeePerGas": [hex(gwei * 10**9) for gwei in (20, 21, 22, 23, 24)],
+    "gasUsedRatio": [0.6, 0.7, 0.9, 0.4],
+    "reward": [
+        [hex(1 * 10**9), hex(2 * 10**9), hex(5 * 10**9)],
+        [hex(1 * 10**9), hex(2 * 10**9), hex(7 * 10**9)],
+        [hex(1 * 10**9), hex(4 * 10**9), hex(9 * 10**9)],
+        [hex(1 * 10**9), hex(4 * 10**9), hex(11 * 10**9)],
+    ]
+}
+
+
+class FeeHistoryRpc:
+    def __init__(self, history):
+        self.history = history
+        self.calls = []
+
+    def call(self, method, params=None):
+        self.calls.append((method, params))
+        return self.history
+
+
+def test_fee_history_is_parsed():
+    rpc = FeeHistoryRpc(FEE_HISTORY)
+    oracle = GasOracle(rpc, block_count=4)
+    oracle.refresh()
+    assert rpc.calls == [("eth_feeHistory", [hex(4), "latest", [10, 50, 90]])]
+    assert oracle.base_fee_wei == 24 * 10**9
+    assert oracle.priority_fees_wei == {10: 1 * 10**9, 50: 3 * 10**9, 90: 8 * 10**9}
+    assert oracle.block_number == 18_000_003
+    assert oracle.cached_gas_price_gwei() == 27.0
+    assert oracle.cached_gas_price_gwei(90) == 32.0
+
+
+def test_missing_rewards_count_as_no_priority_fee():
+    oracle = GasOracle(FeeHistoryRpc(dict(FEE_HISTORY, reward=None)), block_count=4)
+    oracle.refresh()
+    assert oracle.priority_fees_wei == {10: 0, 50: 0, 90: 0}
+
+
+def test_reads_are_served_from_memory_until_stale():
+    rpc = FeeHistoryRpc(FEE_HISTORY)
+    oracle = GasOracle(rpc, block_count=4)
+    assert oracle.cached_gas_price_gwei() is None
+    assert oracle.gas_price_gwei() == 27.0
+    assert oracle.gas_price_gwei() == 27.0
+    assert len(rpc.calls) == 1
+    # A new block refreshes, an already sampled one does not
+    oracle.on_new_block(18_000_003)
+    oracle.on_new_block(18_000_004)
+    assert len(rpc.calls) == 2
+    oracle.updated_at -= oracle.ttl + 1
+    assert oracle.cached_gas_price_gwei() is None
+    assert oracle.gas_price_gwei() == 27.0
+    assert len(rpc.calls) == 3
+
+
+def test_gas_is_priced_from_the_weth_usdc_reserves():
+    registry = PairRegistry()
+    registry.add_token(Token("USDC", "0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48", 6))
+    registry.add_token(Token("WETH", "0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2", 18))
+    pair = registry.add_pair("uniswap", "0xB4e16d0168e52d35CaCD2c6185b44281Ec28C9Dc", "USDC", "WETH")
+    reserve_cache = {pair.address: (50_000_000 * 10**6, 20_000 * 10**18)}
+    oracle = GasOracle(FeeHistoryRpc(FEE_HISTORY), reserve_cache=reserve_cache, eth_pair=pair, block_count=4)
+    assert oracle.eth_price_usdc() == 2500.0
+    assert oracle.gas_cost_usdc(100_000) == pytest.approx(27e-9 * 100_000 * 2500)
+    # A snapshot the caller already fetched wins over the cache
+    assert oracle.eth_price_usdc({pair.address: (40_000_000 * 10**6, 20_000 * 10**18)}) == 2000.0
+    reserve_cache.clear()
+    assert oracle.eth_price_usdc({pair.address: (40_000_000 * 10**6, 20_000 * 10**18)}) == 2000.0
+    assert oracle.eth_price_usdc() is None
+    assert oracle.gas_cost_usdc(100_000) is None
+
+
+def test_gas_dependent_checks_skip_blocks_without_an_eth_price(monkeypatch, caplog):
+    runtime = Runtime({"PAIRS_CONFIG": os.path.join(REPO_DIR, "pairs.json")})
+    runtime.gas_oracle = GasOracle(FeeHistoryRpc(FEE_HISTORY), reserve_cache={}, eth_pair=runtime.uniswap_pair)
+    monkeypatch.setattr(main, "runtime", runtime)
+    submitted = []
+    monkeypatch.setattr(main, "store_historical_data", submitted.append)
+    reserves = {runtime.uniswap_pair.address: (50_000_000 * 10**6, 20_000 * 10**18)}
+    assert main.calculate_gas_cost(20.0, gas_limit=100_000, reserves=reserves) == pytest.approx(20e-9 * 100_000 * 2500)
+    assert main.calculate_gas_cost(20.0, gas_limit=100_000) is None
+    with caplog.at_level(logging.WARNING):
+        assert main.evaluate_opportunity(2500.0, 2600.0, 20.0, 0.0009, block_number=7) is None
+    assert "Skipping block 7" in caplog.text
+    assert submitted == []
@@ -0,0 +1,74 @@
+import os
+import numpy as np
+import pytest
+from history import HEADER_SIZE, RECORD_DTYPE, HistoryRecorder, exact_reserves, float_reserves, load_history, load_pool_addresses
+
+
+def test_records_round_trip_through_the_file(tmp_path):
+    path = str(tmp_path / "history.bin")
+    recorder = HistoryRecorder(path).start()
+    recorder.record(7, "0xaa", 10**21 + 1, 2**112 - 1, 20.0, None)
+    recorder.record(7, "0xbb", 3, 4, None, 1.5)
+    recorder.close()
+
+    records = load_history(path)
+    assert len(records) == 2
+    assert list(records["block_number"]) == [7, 7]
+    assert list(records["pool_id"]) == [0, 1]
+    # Reserves come back to the wei, well past float64 precision
+    assert exact_reserves(records, 0) == [10**21 + 1, 3]
+    assert exact_reserves(records, 1) == [2**112 - 1, 4]
+    assert list(float_reserves(records, 0)) == [1e21, 3.0]
+    assert np.isnan(records["gas_price_gwei"][1]) and np.isnan(records["profit"][0])
+    assert load_pool_addresses(path) == ["0xaa", "0xbb"]
+
+
+def test_appends_keep_pool_ids(tmp_path):
+    path = str(tmp_path / "history.bin")
+    recorder = HistoryRecorder(path)
+    recorder.record(1, "0xaa", 1, 2, 20.0, None)
+    recorder.close()
+    recorder = HistoryRecorder(path)
+    recorder.record(2, "0xbb", 3, 4, 20.0, None)
+    recorder.record(2, "0xaa", 5, 6, 20.0, None)
+    recorder.close()
+    records = load_history(path)
+    assert list(records["block_number"]) == [1, 2, 2]
+    assert list(records["pool_id"]) == [0, 1, 0]
+
+
+def test_torn_tail_is_ignored_and_truncated(tmp_path):
+    path = str(tmp_path / "history.bin")
+    recorder = HistoryRecorder(path)
+    recorder.record(1, "0xaa", 1, 2, 20.0, None)
+    recorder.close()
+    with open(path, "ab") as file:
+        file.write(b"\1" * (RECORD_DTYPE.itemsize // 2))
+    assert len(load_history(path)) == 1
+
+    recorder = HistoryRecorder(path)
+    assert os.path.getsize(path) == HEADER_SIZE + RECORD_DTYPE.itemsize
+    recorder.record(2, "0xaa", 3, 4, 20.0, None)
+    recorder.close()
+    assert list(load_history(path)["block_number"]) == [1, 2]
+
+
+def test_appending_to_another_format_is_refused(tmp_path):
+    path = str(tmp_path / "history.bin")
+    old = b"ARBHIST1".ljust(HEADER_SIZE, b"\0") + b"\1" * 40
+    with open(path, "wb") as file:
+        file.write(old)
+    with pytest.raises(ValueError, match="not a history file in the ARBHIST2 format"):
+        HistoryRecorder(path)
+    with open(path, "rb") as file:
+        assert file.read() == old
+
+
+def test_torn_header_is_written_again(tmp_path):
+    path = str(tmp_path / "history.bin")
+    with open(path, "wb") as file:
+        file.write(b"ARBHI")
+    recorder = HistoryRecorder(path)
+    recorder.record(1, "0xaa", 1, 2, 20.0, None)
+    recorder.close()
+    assert list(load_history(path)["block_number"]) == [1]
@@ -0,0 +1,138 @@
+import pytest
+from eth_abi import encode
+from mempool import PendingTransactionStream, SeenHashes, SwapProjector, decode_swap
+from rpc import JsonRpcClient, RpcError
+from sizing import get_amount_in, get_amount_out
+
+UNISWAP_ROUTER = "0x7a250d5630B4cF539739dF2C5dAcb4c659F2488D"
+WETH = "0xc02aaa39b223fe8d0a0e5c4f27ead9083c756cc2"
+USDC = "0xa0b86991c6218b36c1d19d4a2e9eb0ce3606eb48"
+DAI = "0x6b175474e89094c44da98b954eedeac495271d0f"
+RECIPIENT = "0x" + "11" * 20
+
+
+def swap_transaction(selector, types, args, value=0, to=UNISWAP_ROUTER):
+    return {"hash": "0x" + "ab" * 32, "to": to, "value": hex(value), "input": selector + encode(types, args).hex()}
+
+
+def exact_eth_for_tokens(amount_in, min_out, path):
+    return swap_transaction("0x7ff36ab5", ["uint256", "address[]", "address", "uint256"], [min_out, path, RECIPIENT, 2**32], value=amount_in)
+
+
+def tokens_for_exact_tokens(amount_out, max_in, path):
+    types = ["uint256", "uint256", "address[]", "address", "uint256"]
+    return swap_transaction("0x8803dbee", types, [amount_out, max_in, path, RECIPIENT, 2**32])
+
+
+def test_router_swaps_are_decoded():
+    swap = decode_swap(exact_eth_for_tokens(10**18, 2000 * 10**6, [WETH, USDC]))
+    assert (swap.dex, swap.function, swap.exact_input) == ("uniswap", "swapExactETHForTokens", True)
+    assert (swap.path, swap.amount, swap.limit) == ([WETH, USDC], 10**18, 2000 * 10**6)
+
+    swap = decode_swap(tokens_for_exact_tokens(3000 * 10**6, 2 * 10**18, [WETH, USDC]))
+    assert (swap.function, swap.exact_input, swap.amount, swap.limit) == ("swapTokensForExactTokens", False, 3000 * 10**6, 2 * 10**18)
+
+
+def test_other_transactions_are_rejected():
+    swap = exact_eth_for_tokens(10**18, 0, [WETH, USDC])
+    assert decode_swap(dict(swap, to="0x" + "22" * 20)) is None
+    assert decode_swap(dict(swap, to=None)) is None
+    assert decode_swap(dict(swap, input="0xa9059cbb" + swap["input"][10:])) is None  # transfer()
+    assert decode_swap(dict(swap, input=swap["input"][:40])) is None  # truncated
+
+
+def test_exact_input_swaps_are_projected(triangle, triangle_reserves):
+    uniswap = triangle.addresses[0]
+    reserve_usdc, reserve_weth = triangle_reserves[uniswap]
+    amount_out = get_amount_out(10**18, reserve_weth, reserve_usdc)
+    projected = SwapProjector(triangle).project(decode_swap(exact_eth_for_tokens(10**18, amount_out, [WETH, USDC])), triangle_reserves)
+    assert projected == {uniswap: (reserve_usdc - amount_out, reserve_weth + 10**18)}
+    # One wei more than the pool pays out and the router reverts
+    assert SwapProjector(triangle).project(decode_swap(exact_eth_for_tokens(10**18, amount_out + 1, [WETH, USDC])), triangle_reserves) == {}
+
+
+def test_exact_output_swaps_are_projected_through_every_hop(triangle, triangle_reserves):
+    uniswap, _, dai_weth, dai_usdc = triangle.addresses
+    projector = SwapProjector(triangle)
+    swap = decode_swap(tokens_for_exact_tokens(3000 * 10**6, 4000 * 10**18, [DAI, WETH, USDC]))
+    projected = projector.project(swap, triangle_reserves)
+    weth_in = get_amount_in(3000 * 10**6, triangle_reserves[uniswap][1], triangle_reserves[uniswap][0])
+    dai_in = get_amount_in(weth_in, triangle_reserves[dai_weth][0], triangle_reserves[dai_weth][1])
+    assert projected == {
+        dai_weth: (triangle_reserves[dai_weth][0] + dai_in, triangle_reserves[dai_weth][1] - weth_in),
+        uniswap: (triangle_reserves[uniswap][0] - 3000 * 10**6, triangle_reserves[uniswap][1] + weth_in),
+    }
+    assert dai_usdc not in projected
+    # Paths through an untracked pool cannot be worked back from the output
+    untracked = "0x" + "33" * 20
+    assert projector.project(decode_swap(tokens_for_exact_tokens(10**6, 2**128, [untracked, WETH, USDC])), triangle_reserves) == {}
+
+
+def test_pending_block_fallback_returns_each_transaction_once(node, chain):
+    stream = PendingTransactionStream(JsonRpcClient(node.url))
+    transactions = stream.poll()
+    assert not stream.use_filter
+    assert len(transactions) == chain.pending_txs
+    assert sum(decode_swap(transaction) is not None for transaction in transactions) == chain.pending_txs // 5
+    assert stream.poll() == []
+
+
+class FilterRpc:
+    # A node with a pending-transaction filter
+    def __init__(self, bodies):
+        self.bodies = bodies
+        self.changes = []
+
+    def call(self, method, params=None):
+        if method == "eth_newPendingTransactionFilter":
+            return "0x1"
+        if method == "eth_getFilterChanges":
+            if params != ["0x1"]:
+                raise RpcError("filter not found")
+            changes, self.changes = self.changes, []
+            return changes
+        raise RpcError(method)
+
+    def batch(self, calls):
+        return [self.bodies.get(params[0]) for _, params in calls]
+
+
+def test_filter_changes_are_fetched_in_one_batch():
+    rpc = FilterRpc({"0x01": {"hash": "0x01"}, "0x02": {"hash": "0x02"}})
+    stream = PendingTransactionStream(rpc)
+    rpc.changes = ["0x01", "0x02"]
+    assert stream.poll() == [{"hash": "0x01"}, {"hash": "0x02"}]
+    rpc.changes = ["0x02"]
+    assert stream.poll() == []
+    assert stream.use_filter
+
+
+def test_hashes_without_a_body_are_fetched_again():
+    rpc = FilterRpc({"0x01": {"hash": "0x01"}})
+    stream = PendingTransactionStream(rpc, max_age=2)
+    rpc.changes = ["0x01", "0x02"]
+    assert stream.poll(100) == [{"hash": "0x01"}]
+    # The node had not seen 0x02's body yet; it is asked for again, and returned once
+    rpc.bodies["0x02"] = {"hash": "0x02"}
+    assert stream.poll(100) == [{"hash": "0x02"}]
+    assert stream.poll(101) == []
+    # A body that never arrives is given up once the hash is max_age blocks old
+    rpc.changes = ["0x03"]
+    assert stream.poll(101) == []
+    assert stream.poll(103) == []
+    assert "0x03" in stream.unfetched
+    assert stream.poll(104) == []
+    assert not stream.unfetched
+
+
+def test_seen_hashes_expire_by_block_age():
+    seen = SeenHashes(max_age=2)
+    assert seen.add("0x01", 10) and seen.add("0x02", 11)
+    assert not seen.add("0x01", 12)  # still pending: seen again in block 12
+    seen.expire(13)
+    assert "0x02" in seen and "0x01" in seen
+    seen.expire(14)
+    assert "0x02" not in seen and "0x01" in seen
+    seen.expire(15)
+    assert len(seen) == 0
+    assert seen.add("0x01", 15)
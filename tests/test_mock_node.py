@@ -0,0 +1,49 @@
+import json
+import pytest
+from mock_node import MockNode
+from pair_registry import PairRegistry
+from reserve_cache import ReserveCache
+from reserves import BatchReserveReader
+from rpc import JsonRpcClient
+
+
+@pytest.fixture
+def synthetic_registry(tmp_path, synthetic):
+    path = tmp_path / "pairs.json"
+    path.write_text(json.dumps(synthetic[0]))
+    return PairRegistry.load(str(path))
+
+
+def test_synthetic_pools(synthetic, synthetic_registry):
+    config, reserves = synthetic
+    assert len(config["pairs"]) == len(reserves) == 50
+    assert {address.lower() for address in synthetic_registry.addresses} == {address.lower() for address in reserves}
+
+
+def test_round_trips_are_counted(node, chain, synthetic_registry):
+    client = JsonRpcClient(node.url)
+    snapshot = BatchReserveReader(client).fetch(synthetic_registry.addresses)
+    assert snapshot.block_number == chain.block_number
+    for address in synthetic_registry.addresses:
+        assert tuple(snapshot[address][:2]) == tuple(chain.reserves[address.lower()])
+    BatchReserveReader(client, mode="batch").fetch(synthetic_registry.addresses)
+    # One multicall, then eth_blockNumber and one batch of eth_calls
+    assert node.stats == {"http_requests": 3, "rpc_calls": 52, "methods": {"eth_call": 51, "eth_blockNumber": 1}}
+    assert client.call("mock_stats") == node.stats
+    client.call("mock_resetStats")
+    assert node.stats["http_requests"] == 0
+
+
+def test_polling_the_head_mines_a_block(chain, synthetic_registry):
+    node = MockNode(chain).start()
+    try:
+        client = JsonRpcClient(node.url)
+        cache = ReserveCache(client, synthetic_registry, BatchReserveReader(client))
+        cache.start()
+        for _ in range(3):
+            block_number = chain.block_number
+            assert cache.poll()
+            assert cache.block_number == chain.block_number == block_number + 1
+        assert cache.reserves == {address: tuple(chain.reserves[address.lower()]) for address in synthetic_registry.addresses}
+    finally:
+        node.stop()
@@ -0,0 +1,76 @@
+import json
+import subprocess
+import sys
+import pytest
+from pair_registry import PairRegistry
+from conftest import REPO_DIR
+
+USDC = "0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48"
+WETH = "0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2"
+UNISWAP_PAIR = "0xB4e16d0168e52d35CaCD2c6185b44281Ec28C9Dc"
+CONFIG = {
+    "tokens": {
+        "USDC": {"address": USDC.lower(), "decimals": 6},
+        "WETH": {"address": WETH.lower(), "decimals": 18}
+    },
+    "pairs": [
+        {"dex": "uniswap", "address": UNISWAP_PAIR.lower(), "token0": "USDC", "token1": "WETH"},
+        {"dex": "sushiswap", "address": "0x397ff1542f962076d0bfe58ea045ffa2d347aca0", "token0": "USDC", "token1": "WETH", "fee": 0.0025}
+    ]
+}
+TOML_CONFIG = f"""
+[tokens.USDC]
+address = "{USDC}"
+decimals = 6
+
+[tokens.WETH]
+address = "{WETH}"
+decimals = 18
+
+[[pairs]]
+dex = "uniswap"
+address = "{UNISWAP_PAIR}"
+token0 = "USDC"
+token1 = "WETH"
+"""
+
+
+@pytest.fixture
+def registry(tmp_path):
+    path = tmp_path / "pairs.json"
+    path.write_text(json.dumps(CONFIG))
+    return PairRegistry.load(str(path))
+
+
+def test_addresses_are_checksummed_once_at_load(registry):
+    assert registry.addresses == [UNISWAP_PAIR, "0x397FF1542f962076d0BFE58eA045FfA2d347ACa0"]
+    assert registry.token("USDC").address == USDC
+    assert registry.get(UNISWAP_PAIR.lower()) is registry.pairs[0]
+
+
+def test_lookups(registry):
+    uniswap, sushiswap = registry.pairs
+    assert registry.token(WETH.lower()) is registry.token("WETH")
+    assert registry.pairs_for_tokens("WETH", "USDC") == [uniswap, sushiswap]
+    assert registry.pairs_for_token(WETH) == [uniswap, sushiswap]
+    assert registry.find("sushiswap", "WETH", "USDC") is sushiswap
+    assert registry.find("curve", "WETH", "USDC") is None
+    assert sushiswap.fee == 0.0025 and uniswap.fee == 0.003
+    assert uniswap.other(registry.token("USDC")) is registry.token("WETH")
+    with pytest.raises(KeyError):
+        registry.token("DAI")
+
+
+def test_load_toml(tmp_path):
+    path = tmp_path / "pairs.toml"
+    path.write_text(TOML_CONFIG)
+    registry = PairRegistry.load(str(path))
+    assert registry.addresses == [UNISWAP_PAIR]
+    assert registry.pairs[0].name == "uniswap:USDC/WETH"
+
+
+def test_loading_the_registry_needs_no_web3():
+    # Pools are read through reserves.BatchReserveReader; the registry holds no contract handles
+    code = ("import sys, pair_registry; registry = pair_registry.PairRegistry.load('pairs.json'); "
+            "assert 'web3' not in sys.modules; assert not hasattr(registry.pairs[0], 'contract')")
+    subprocess.run([sys.executable, "-c", code], cwd=REPO_DIR, check=True, env={"PATH": ""})
@@ -0,0 +1,132 @@
+from decimal import Decimal, getcontext
+import numpy as np
+import pytest
+from pair_registry import PairRegistry
+from pricing import ConstantProductEngine, StableSwapEngine, WeightedEngine
+
+getcontext().prec = 60
+
+
+def bisect(function, low, high, steps=400):
+    # Root of an increasing function between low and high
+    for _ in range(steps):
+        middle = (low + high) / 2
+        if function(middle) > 0:
+            high = middle
+        else:
+            low = middle
+    return (low + high) / 2
+
+
+def stableswap_dy(x, y, amount_in, amp, fee):
+    # Output of a two-coin StableSwap pool (balances in the same units), solved in Decimal from
+    # the invariant Ann(x + y) + D = Ann D + D^3 / (4xy), where Ann = A() * 2 as in the contracts
+    x, y, amount_in, ann = Decimal(x), Decimal(y), Decimal(amount_in), Decimal(amp) * 2
+    invariant = bisect(lambda d: ann * d + d**3 / (4 * x * y) - ann * (x + y) - d, Decimal(0), 2 * (x + y))
+    new_x = x + amount_in
+    new_y = bisect(lambda v: ann * (new_x + v) + invariant - ann * invariant - invariant**3 / (4 * new_x * v), Decimal(1), y)
+    return (y - new_y) * (1 - Decimal(fee))
+
+
+def weighted_out(balance_in, balance_out, weight_in, weight_out, amount_in, fee):
+    balance_in, balance_out, amount_in = Decimal(balance_in), Decimal(balance_out), Decimal(amount_in)
+    ratio = balance_in / (balance_in + amount_in * (1 - Decimal(fee)))
+    return balance_out * (1 - ratio ** (Decimal(weight_in) / Decimal(weight_out)))
+
+
+def test_pool_types_select_their_engines(mixed_registry):
+    kinds = [type(pair.engine) for pair in mixed_registry]
+    assert kinds == [ConstantProductEngine] * 3 + [StableSwapEngine, WeightedEngine, ConstantProductEngine]
+    assert PairRegistry.from_config(mixed_registry.to_config()).to_config() == mixed_registry.to_config()
+
+
+@pytest.mark.parametrize("kind, missing", [("stableswap", "amp"), ("weighted", "weights")])
+def test_missing_pool_parameters_are_named(mixed_registry, kind, missing):
+    config = mixed_registry.to_config()
+    pair = next(pair for pair in config["pairs"] if pair.get("type") == kind)
+    del pair[missing]
+    with pytest.raises(ValueError, match=missing):
+        PairRegistry.from_config(config)
+
+
+def test_unknown_pool_type_is_rejected(mixed_registry):
+    config = mixed_registry.to_config()
+    config["pairs"][0]["type"] = "concentrated"
+    with pytest.raises(ValueError, match="Unknown pool type"):
+        PairRegistry.from_config(config)
+
+
+@pytest.mark.parametrize("amount_in", [10**18, 10**21, 10**24, 10**25, 3 * 10**25])
+def test_stableswap_matches_the_invariant(mixed_registry, mixed_reserves, amount_in):
+    # DAI (18 decimals) in, USDC (6 decimals) out
+    curve = mixed_registry.pairs[3]
+    reserve0, reserve1 = mixed_reserves[curve.address]
+    expected = stableswap_dy(reserve0, reserve1 * 10**12, amount_in, 2000, curve.fee) / 10**12
+    exact = curve.engine.get_amount_out(amount_in, True, (reserve0, reserve1))
+    assert abs(exact - expected) <= 2
+    # Floats lose the last digits of small trades against large balances
+    quoted = curve.engine.quote(np.array([float(amount_in)]), True, (reserve0, reserve1))[0]
+    assert abs(quoted - float(expected)) < 1e-9 * float(expected) + 1e-15 * reserve1
+
+
+def test_stableswap_swap_keeps_the_invariant(mixed_registry, mixed_reserves):
+    curve = mixed_registry.pairs[3]
+    reserves = mixed_reserves[curve.address]
+    amount_out, after = curve.engine.swap(10**24, True, reserves)
+    assert amount_out == curve.engine.get_amount_out(10**24, True, reserves)
+    # Fees stay in the pool, so the invariant can only grow
+    assert curve.engine.state(after)[1] >= curve.engine.state(reserves)[1]
+    rate = curve.engine.marginal_rate(reserves, True)
+    small = curve.engine.get_amount_out(10**18, True, reserves)
+    assert abs(small - rate * 10**18) / small < 1e-6
+
+
+@pytest.mark.parametrize("amount_in", [10**15, 10**18, 10**21, 1_400 * 10**18])
+@pytest.mark.parametrize("zero_for_one", [True, False])
+def test_weighted_matches_the_balancer_formula(mixed_registry, mixed_reserves, amount_in, zero_for_one):
+    balancer = mixed_registry.pairs[4]
+    reserve0, reserve1 = mixed_reserves[balancer.address]
+    if zero_for_one:
+        expected = weighted_out(reserve0, reserve1, "0.8", "0.2", amount_in, balancer.fee)
+    else:
+        expected = weighted_out(reserve1, reserve0, "0.2", "0.8", amount_in, balancer.fee)
+    exact = balancer.engine.get_amount_out(amount_in, zero_for_one, (reserve0, reserve1))
+    # Within float precision, less the margin Balancer's pow rounds by (none for a weight ratio of 4)
+    margin = 0 if zero_for_one else (Decimal(reserve0) - expected) * Decimal("1e-14")
+    expected -= margin
+    assert abs(expected - exact) <= expected * Decimal("1e-15") + 1
+    quoted = balancer.engine.quote(np.array([float(amount_in)]), zero_for_one, (reserve0, reserve1))[0]
+    assert abs(quoted - float(expected)) / float(expected) < 1e-12
+
+
+def test_weighted_trades_past_the_swap_limits_revert(mixed_registry, mixed_reserves):
+    # 80/20 BAL/WETH with 4M BAL and 5000 WETH: at most 30% of the input balance goes in (after
+    # the 1% fee) and 30% of the output balance comes out
+    balancer = mixed_registry.pairs[4]
+    reserves = mixed_reserves[balancer.address]
+    max_in = int(5_000 * 10**18 * 0.3 / 0.99)
+    engine = balancer.engine
+    assert engine.get_amount_out(max_in - 10**15, False, reserves) > 0
+    assert engine.get_amounts_out([max_in + 10**15, 10**23], False, reserves) == [0, 0]
+    assert engine.swap(max_in + 10**15, False, reserves) == (0, None)
+    assert list(engine.quote(np.array([float(max_in - 10**15), float(max_in + 10**15)]), False, reserves) > 0) == [True, False]
+    # BAL in: the input limit is far off, but no more than 1500 WETH can come out. With weights
+    # 80/20, out = 5000 WETH * (1 - (B / (B + 0.99 a))^4), which reaches 1500 WETH at:
+    out_limit = 4_000_000 * 10**18 * (0.7**-0.25 - 1) / 0.99
+    assert out_limit < 0.3 * 4_000_000 * 10**18 / 0.99
+    assert 1_498 * 10**18 < engine.get_amount_out(int(out_limit * 0.999), True, reserves) <= 1_500 * 10**18
+    assert engine.get_amount_out(int(out_limit * 1.001), True, reserves) == 0
+
+
+def test_weighted_swap_keeps_the_invariant(mixed_registry, mixed_reserves):
+    balancer = mixed_registry.pairs[4]
+    reserves = mixed_reserves[balancer.address]
+    _, after = balancer.engine.swap(10**21, True, reserves)
+    assert balancer.engine.invariant(after) >= balancer.engine.invariant(reserves)
+
+
+def test_engines_quote_zero_where_the_pool_cannot_trade(mixed_registry):
+    for pair in mixed_registry:
+        assert pair.engine.get_amounts_out([0, 10**18], True, (0, 0)) == [0, 0]
+        assert pair.engine.swap(10**18, True, (0, 0)) == (0, None)
+        assert pair.engine.marginal_rate((0, 0), True) == 0.0
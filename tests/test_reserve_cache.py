@@ -0,0 +1,66 @@
+from reserve_cache import ReserveCache
+from reserves import BatchReserveReader
+
+
+def make_cache(rpc, registry, **kwargs):
+    return ReserveCache(rpc, registry, BatchReserveReader(rpc), **kwargs)
+
+
+def chain_reserves(rpc, registry):
+    return {address: tuple(rpc.reserves[address.lower()]) for address in registry.addresses}
+
+
+def test_poll_follows_sync_logs(rpc, registry):
+    cache = make_cache(rpc, registry)
+    cache.start()
+    assert cache.block_number == rpc.block_number
+    moved = set()
+    for _ in range(3):
+        rpc.advance()
+        moved |= {log["address"] for log in rpc.logs[rpc.block_number]}
+    touched = cache.poll()
+    assert {address.lower() for address in touched} == moved
+    assert cache.block_number == rpc.block_number
+    assert cache.reserves == chain_reserves(rpc, registry)
+
+
+def test_reorg_is_rolled_back(rpc, registry):
+    cache = make_cache(rpc, registry)
+    cache.start()
+    for _ in range(4):
+        rpc.advance()
+        cache.poll()
+    dropped = {log["address"] for number in (rpc.block_number - 1, rpc.block_number) for log in rpc.logs[number]}
+
+    rpc.reorg(2)
+    touched = cache.poll()
+    assert cache.block_number == rpc.block_number
+    assert cache.reserves == chain_reserves(rpc, registry)
+    # Pools moved by the dropped blocks are re-evaluated even when the new fork left them alone
+    assert dropped <= {address.lower() for address in touched}
+
+
+def test_reorg_deeper_than_the_journal_reloads(rpc, registry):
+    cache = make_cache(rpc, registry, reorg_depth=2)
+    cache.start()
+    for _ in range(6):
+        rpc.advance()
+        cache.poll()
+
+    rpc.reorg(5)
+    touched = cache.poll()
+    assert touched == set(registry.addresses)
+    assert cache.reserves == chain_reserves(rpc, registry)
+
+
+def test_rollback_restores_journaled_reserves(rpc, registry):
+    cache = make_cache(rpc, registry)
+    cache.start()
+    start_block, before = cache.block_number, dict(cache.reserves)
+    for _ in range(3):
+        rpc.advance()
+    cache.poll()
+    assert cache.reserves != before
+    cache.rollback(start_block)
+    assert cache.block_number == start_block
+    assert cache.reserves == before
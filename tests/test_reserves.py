@@ -0,0 +1,37 @@
+from reserves import BatchReserveReader
+
+
+def test_multicall_reads_every_pool_in_one_round_trip(rpc, pools):
+    snapshot = BatchReserveReader(rpc).fetch(pools)
+    assert snapshot.block_number == rpc.block_number
+    assert len(snapshot) == len(pools)
+    for address, reserves in pools.items():
+        assert tuple(snapshot[address][:2]) == reserves
+    assert rpc.requests == [["eth_call"]]
+
+
+def test_batch_mode_matches_multicall(rpc, pools):
+    multicall = BatchReserveReader(rpc).fetch(pools)
+    batch = BatchReserveReader(rpc, mode="batch").fetch(pools)
+    assert batch.block_number == multicall.block_number
+    assert batch.reserves == multicall.reserves
+    # eth_blockNumber first, then every eth_call pinned to it in one batch
+    assert rpc.requests[1:] == [["eth_blockNumber"], ["eth_call"] * len(pools)]
+
+
+def test_failed_reads_are_left_out(rpc, pools):
+    address = next(iter(pools))
+    missing = "0x" + "ab" * 20
+    for mode in ("multicall", "batch"):
+        snapshot = BatchReserveReader(rpc, mode=mode).fetch([address, missing])
+        assert address in snapshot.reserves
+        assert missing not in snapshot.reserves
+
+
+def test_pricing_engine_calls_share_the_multicall(mixed_registry):
+    # Curve balances(i) and the Vault's getPoolTokens go in the same request as getReserves
+    reader = BatchReserveReader(None, registry=mixed_registry)
+    curve, balancer = mixed_registry.pairs[3], mixed_registry.pairs[4]
+    assert len(reader.pair_calls(curve.address)) == 2
+    assert reader.pair_calls(balancer.address)[0][0] == balancer.engine.vault
+    assert len(reader.pair_calls(mixed_registry.pairs[0].address)) == 1
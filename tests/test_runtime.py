@@ -0,0 +1,107 @@
+import json
+import os
+import subprocess
+import sys
+import time
+import pytest
+from runtime import Runtime
+from conftest import REPO_DIR
+
+
+@pytest.fixture
+def env(tmp_path, registry):
+    path = tmp_path / "pairs.json"
+    path.write_text(json.dumps(registry.to_config()))
+    return {"PAIRS_CONFIG": str(path), "WARM_START_PATH": str(tmp_path / "warm_start.json")}
+
+
+def make_runtime(env, rpc):
+    runtime = Runtime(env)
+    runtime.rpc = rpc
+    return runtime
+
+
+def chain_reserves(rpc, runtime):
+    return {address: tuple(rpc.reserves[address.lower()]) for address in runtime.registry.addresses}
+
+
+def test_importing_main_has_no_side_effects():
+    code = "import sys, main; assert 'web3' not in sys.modules; assert not main.runtime.__dict__.get('rpc')"
+    subprocess.run([sys.executable, "-c", code], cwd=REPO_DIR, check=True, env={"PATH": ""})
+
+
+def test_restart_catches_up_from_the_snapshot(env, rpc):
+    runtime = make_runtime(env, rpc)
+    runtime.start_reserves()
+    for _ in range(2):
+        rpc.advance()
+        runtime.reserve_cache.poll()
+    assert runtime.save_snapshot()
+
+    # Blocks mined while the bot was down
+    missed = set()
+    for _ in range(3):
+        rpc.advance()
+        missed |= {log["address"] for log in rpc.logs[rpc.block_number]}
+    rpc.requests.clear()
+    restarted = make_runtime(env, rpc)
+    touched = restarted.start_reserves()
+    assert {address.lower() for address in touched} == missed
+    assert restarted.reserve_cache.reserves == chain_reserves(rpc, restarted)
+    assert restarted.reserve_cache.block_number == rpc.block_number
+    # Head and saved block in one batch, then the missed Sync logs: no pool is read again
+    assert rpc.requests == [["eth_getBlockByNumber"] * 2, ["eth_getLogs"]]
+
+
+def test_reorged_snapshot_reloads_every_pool(env, rpc):
+    runtime = make_runtime(env, rpc)
+    runtime.start_reserves()
+    rpc.advance()
+    runtime.reserve_cache.poll()
+    runtime.save_snapshot()
+    rpc.reorg(1)
+    restarted = make_runtime(env, rpc)
+    assert restarted.start_reserves() == set(restarted.registry.addresses)
+    assert restarted.reserve_cache.reserves == chain_reserves(rpc, restarted)
+
+
+@pytest.mark.parametrize("change", ["config", "age"])
+def test_stale_or_mismatched_snapshots_are_ignored(env, rpc, change):
+    runtime = make_runtime(env, rpc)
+    runtime.start_reserves()
+    runtime.save_snapshot()
+    if change == "config":
+        with open(env["PAIRS_CONFIG"]) as file:
+            config = json.load(file)
+        config["pairs"].pop()
+        with open(env["PAIRS_CONFIG"], "w") as file:
+            json.dump(config, file)
+    else:
+        with open(env["WARM_START_PATH"]) as file:
+            snapshot = json.load(file)
+        snapshot["saved_at"] = time.time() - 7200
+        with open(env["WARM_START_PATH"], "w") as file:
+            json.dump(snapshot, file)
+    rpc.requests.clear()
+    restarted = make_runtime(env, rpc)
+    assert not restarted.load_snapshot()
+    restarted.start_reserves()
+    assert rpc.requests[0] == ["eth_call"]  # every pool read again
+
+
+def test_weth_usdc_routes_are_the_two_pool_cycles():
+    runtime = Runtime({"PAIRS_CONFIG": os.path.join(REPO_DIR, "pairs.json")})
+    pools = {runtime.uniswap_pair.address, runtime.sushiswap_pair.address}
+    routes = runtime.weth_usdc_routes
+    assert len(routes) == 2
+    assert all(route.pair_addresses == pools for route in routes)
+    assert routes == [cycle for cycle in runtime.cycle_engine.cycles if cycle.pair_addresses == pools]
+
+
+def test_async_pool_authenticates_the_primary_endpoint():
+    runtime = Runtime({"RPC_URL": "https://mainnet.infura.io/v3/project", "RPC_URLS": "https://backup.example/rpc",
+                       "INFURA_PROJECT_ID": "project", "INFURA_SECRET_KEY": "secret"})
+    primary, backup = [endpoint.client for endpoint in runtime.async_rpc_pool(timeout=3).endpoints]
+    assert (primary.auth.login, primary.auth.password) == ("project", "secret")
+    assert backup.auth is None
+    assert primary.timeout == backup.timeout == 3
@@ -0,0 +1,100 @@
+import json
+import random
+import pytest
+import pricing
+from amm import AmmSimulator
+from cycles import CycleEngine
+from pair_registry import PairRegistry
+from pricing import ConstantProductEngine
+from run_benchmarks import synthetic_pools
+from scanner import SharedReserves, ShardedScanner
+from sizing import size_routes
+
+
+@pytest.fixture
+def scan_setup(tmp_path):
+    # 200 synthetic pools with prices a few percent apart, so many cycles are profitable
+    config, reserves = synthetic_pools(200)
+    path = tmp_path / "pairs.json"
+    path.write_text(json.dumps(config))
+    registry = PairRegistry.load(str(path))
+    generator = random.Random(2)
+    reserves = {pair.address: (int(reserve0 * generator.uniform(0.97, 1.03)), reserve1)
+                for pair, (reserve0, reserve1) in zip(registry, reserves.values())}
+    return str(path), registry, reserves
+
+
+class CustomEngine(ConstantProductEngine):
+    # A pool type registered at runtime, as add_dex_support does
+    kind = "custom"
+
+
+def in_process(registry, engine, reserves, touched=None):
+    # find_cycle_opportunities without a scanner
+    opportunities = engine.update(reserves, touched)
+    sized = size_routes([cycle for cycle, _ in opportunities], reserves)
+    amm = AmmSimulator(registry)
+    amm.update(reserves)
+    simulated = amm.evaluate([cycle for cycle, _, _ in sized], [amount_in for _, amount_in, _ in sized])
+    return [(cycle, amount_in, profit) for (cycle, _, _), (amount_in, _, profit) in zip(sized, simulated) if profit > 0]
+
+
+def by_cycle(results):
+    return {cycle.key: (amount_in, profit) for cycle, amount_in, profit in results}
+
+
+def test_shared_reserves_round_trip_exactly():
+    shared = SharedReserves(2)
+    try:
+        reserves = {"0xaa": (2**112 - 1, 3), "0xbb": (10**21 + 1, 2**64)}
+        shared.write({"0xaa": 0, "0xbb": 1}, reserves, block_number=9)
+        block_number, words = shared.read()
+        assert block_number == 9
+        assert [(int(low0) | int(high0) << 64, int(low1) | int(high1) << 64) for low0, high0, low1, high1 in words] == list(reserves.values())
+    finally:
+        shared.close()
+
+
+def test_sharded_scan_matches_in_process(scan_setup):
+    path, registry, reserves = scan_setup
+    engine = CycleEngine(registry)
+    expected = in_process(registry, engine, reserves)
+    assert len(expected) > 10
+
+    scanner = ShardedScanner(registry, engine, path, processes=2, shards=3).start()
+    try:
+        scanner.publish(reserves, block_number=1)
+        sharded = scanner.scan()
+        assert by_cycle(sharded) == by_cycle(expected)
+        assert [profit for _, _, profit in sharded] == sorted((profit for _, _, profit in expected), reverse=True)
+
+        # A block that moves a few pools re-scans only the cycles through them
+        touched = registry.addresses[10:14]
+        for address in touched:
+            reserve0, reserve1 = reserves[address]
+            reserves[address] = (reserve0 * 101 // 100, reserve1)
+        scanner.publish(reserves, touched, block_number=2)
+        assert by_cycle(scanner.scan(touched)) == by_cycle(in_process(registry, engine, reserves, touched))
+    finally:
+        scanner.close()
+
+
+def test_workers_use_engines_registered_at_runtime(tmp_path, scan_setup, monkeypatch):
+    monkeypatch.setitem(pricing.ENGINES, "custom", CustomEngine)
+    path, registry, reserves = scan_setup
+    config = registry.to_config()
+    for pair in config["pairs"][::3]:
+        pair["type"] = "custom"
+    path = tmp_path / "custom.json"
+    path.write_text(json.dumps(config))
+    registry = PairRegistry.load(str(path))
+    engine = CycleEngine(registry)
+    expected = in_process(registry, engine, reserves)
+    assert any(isinstance(pair.engine, CustomEngine) for cycle, _, _ in expected for pair, _, _ in cycle.hops)
+
+    scanner = ShardedScanner(registry, engine, str(path), processes=2).start()
+    try:
+        scanner.publish(reserves, block_number=1)
+        assert by_cycle(scanner.scan()) == by_cycle(expected)
+    finally:
+        scanner.close()
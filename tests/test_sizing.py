@@ -0,0 +1,54 @@
+import numpy as np
+from cycles import CycleEngine
+from sizing import engine_route_output, is_closed_form, route_arrays, size_routes
+from conftest import route_output
+
+
+def test_closed_form_sizing_beats_brute_force(triangle, gapped_reserves):
+    sized = size_routes(CycleEngine(triangle).cycles, gapped_reserves, exact=True)
+    assert len(sized) >= 2
+    for cycle, amount_in, profit in sized:
+        assert route_output(cycle, amount_in, gapped_reserves) - amount_in == profit
+        # Nothing on a fine grid over every input size, nor any neighbouring integer, does better
+        grid = {int(amount) for amount in np.geomspace(1.0, 1e24, 20000)} | {amount_in + step for step in range(-500, 501)}
+        best = max(route_output(cycle, amount, gapped_reserves) - amount for amount in grid if amount > 0)
+        assert profit >= best
+
+
+def test_float_sizing_is_close_to_exact(triangle, gapped_reserves):
+    cycles = CycleEngine(triangle).cycles
+    floats = {cycle: (amount_in, profit) for cycle, amount_in, profit in size_routes(cycles, gapped_reserves)}
+    for cycle, amount_in, profit in size_routes(cycles, gapped_reserves, exact=True):
+        # Profit is flat around the optimum: the inputs agree loosely, the profits closely
+        assert abs(floats[cycle][0] - amount_in) / amount_in < 1e-3
+        assert abs(floats[cycle][1] - profit) / profit < 1e-6
+
+
+def test_unprofitable_routes_are_not_sized(triangle, triangle_reserves):
+    cycles = CycleEngine(triangle).cycles
+    assert size_routes(cycles, triangle_reserves) == []
+    assert size_routes(cycles, triangle_reserves, exact=True) == []
+
+
+def test_searched_routes_are_sized_near_the_best_input(mixed_registry, mixed_reserves):
+    cycles = [cycle for cycle in CycleEngine(mixed_registry).cycles if not is_closed_form(cycle)]
+    sized = size_routes(cycles, mixed_reserves, exact=True)
+    assert sized
+    for cycle, amount_in, profit in sized:
+        assert engine_route_output(cycle, amount_in, mixed_reserves) - amount_in == profit
+        for factor in (0.9, 0.99, 1.01, 1.1):
+            other = int(amount_in * factor)
+            assert engine_route_output(cycle, other, mixed_reserves) - other <= profit
+
+
+def test_routes_through_a_missing_pool_are_dropped(triangle, gapped_reserves):
+    cycles = CycleEngine(triangle).cycles
+    sushiswap = triangle.pairs[1].address
+    reserves = {address: pool_reserves for address, pool_reserves in gapped_reserves.items() if address != sushiswap}
+    for exact in (False, True):
+        sized = size_routes(cycles, reserves, exact=exact)
+        assert sized
+        assert all(sushiswap not in cycle.pair_addresses for cycle, _, _ in sized)
+    reserves_in, _, _, hop_mask = route_arrays(cycles, reserves)
+    missing = [index for index, cycle in enumerate(cycles) if sushiswap in cycle.pair_addresses]
+    assert not hop_mask[missing].any() and not reserves_in[missing].any()
@@ -0,0 +1,107 @@
+import threading
+import time
+import pytest
+from cycles import CycleEngine
+from metrics import WORK_ITEMS
+from work_queue import BLOCK, DROP_NEWEST, DROP_OLDEST, WorkQueue, opportunity_key
+
+
+def blocked_queue(policy, **kwargs):
+    # A started queue of capacity 2 whose worker is stuck on a first item until gate is set
+    queue = WorkQueue(f"test-{policy}", maxsize=2, policy=policy, **kwargs).start()
+    gate, taken, ran = threading.Event(), threading.Event(), []
+
+    def first():
+        taken.set()
+        gate.wait(5)
+        ran.append("first")
+
+    queue.submit(first)
+    assert taken.wait(5)
+    return queue, gate, ran
+
+
+@pytest.mark.parametrize("policy, accepted, expected", [
+    (DROP_NEWEST, [True, True, False], ["first", "a", "b"]),
+    (DROP_OLDEST, [True, True, True], ["first", "b", "c"]),
+    (BLOCK, [True, True, False], ["first", "a", "b"]),
+])
+def test_full_queue_policies(policy, accepted, expected):
+    queue, gate, ran = blocked_queue(policy, put_timeout=0.05)
+    dropped = WORK_ITEMS.value(queue.name, "dropped")
+    started = time.perf_counter()
+    assert [queue.submit(ran.append, item) for item in "abc"] == accepted
+    assert time.perf_counter() - started < 1
+    assert WORK_ITEMS.value(queue.name, "dropped") == dropped + 1
+    gate.set()
+    assert queue.join(5)
+    assert ran == expected
+    queue.close()
+
+
+def test_blocking_submit_waits_for_room():
+    queue, gate, ran = blocked_queue(BLOCK, put_timeout=5)
+    queue.submit(ran.append, "a")
+    queue.submit(ran.append, "b")
+    threading.Timer(0.1, gate.set).start()
+    assert queue.submit(ran.append, "c")
+    assert queue.join(5)
+    assert ran == ["first", "a", "b", "c"]
+    queue.close()
+
+
+def test_unknown_policy_is_refused():
+    with pytest.raises(ValueError):
+        WorkQueue("test-policy", policy="drop_random")
+
+
+def test_recent_keys_are_skipped():
+    ran = []
+    queue = WorkQueue("test-dedupe", dedupe_size=2)
+    # Not started: items run inline
+    assert queue.submit(ran.append, 1, key="x")
+    assert not queue.submit(ran.append, 2, key="x")
+    assert queue.submit(ran.append, 3, key="y")
+    assert queue.submit(ran.append, 4, key="z")
+    assert queue.submit(ran.append, 5, key="x")  # evicted by y and z
+    assert queue.submit(ran.append, 6)
+    assert queue.submit(ran.append, 7)
+    assert ran == [1, 3, 4, 5, 6, 7]
+    assert WORK_ITEMS.value("test-dedupe", "duplicate") == 1
+
+
+def test_failures_do_not_stop_the_worker():
+    ran = []
+    queue = WorkQueue("test-failures").start()
+    queue.submit(lambda: 1 / 0)
+    queue.submit(ran.append, "after")
+    assert queue.join(5)
+    queue.close()
+    assert ran == ["after"]
+    assert WORK_ITEMS.value("test-failures", "failed") == 1
+
+
+def test_opportunity_key_changes_with_the_route_reserves(triangle, triangle_reserves):
+    route = CycleEngine(triangle).cycles[0]
+    key = opportunity_key(route, 10, triangle_reserves)
+    assert opportunity_key(route, 10, dict(triangle_reserves)) == key
+    untouched = next(address for address in triangle.addresses if address not in route.pair_addresses)
+    assert opportunity_key(route, 10, dict(triangle_reserves, **{untouched: (1, 1)})) == key
+    moved = next(iter(route.pair_addresses))
+    assert opportunity_key(route, 10, dict(triangle_reserves, **{moved: (1, 1)})) != key
+    assert opportunity_key(route, 11, triangle_reserves) != key
+
+
+def test_routeless_opportunities_are_still_keyed(triangle_reserves):
+    key = opportunity_key(None, 10, triangle_reserves, kind="weth_usdc")
+    assert key is not None
+    assert opportunity_key(None, 10, dict(reversed(list(triangle_reserves.items()))), kind="weth_usdc") == key
+    assert opportunity_key(None, 11, triangle_reserves, kind="weth_usdc") != key
+    moved = next(iter(triangle_reserves))
+    assert opportunity_key(None, 10, dict(triangle_reserves, **{moved: (1, 1)}), kind="weth_usdc") != key
+    assert opportunity_key(None, 10, dict(triangle_reserves, **{moved: None}), kind="weth_usdc") != key
+    # Repeats of the same route-less opportunity are skipped like any other
+    queue, ran = WorkQueue("test-routeless"), []
+    assert queue.submit(ran.append, 1, key=key)
+    assert not queue.submit(ran.append, 2, key=opportunity_key(None, 10, triangle_reserves, kind="weth_usdc"))
+    assert ran == [1]
@@ -0,0 +1,140 @@
+import collections
+import logging
+import threading
+from metrics import STAGE_SECONDS, WORK_ITEMS
+
+# What submit() does when the queue is full
+DROP_NEWEST = "drop_newest"  # refuse the new item, keep what is already queued
+DROP_OLDEST = "drop_oldest"  # evict the oldest queued item to make room (stale work is worthless)
+BLOCK = "block"  # wait up to put_timeout for room, then refuse the new item
+POLICIES = (DROP_NEWEST, DROP_OLDEST, BLOCK)
+
+
+def opportunity_key(route, block_number, reserves, kind=None):
+    # (route, block, reserves of the route's pools): the same opportunity seen again on the next
+    # pass, with nothing changed, maps to the same key. Without a route the key is (kind, block,
+    # reserves of every pool in reserves), so route-less opportunities are deduplicated too.
+    if route is None:
+        return (kind, block_number, tuple((address, tuple(value[:2]) if value else None) for address, value in sorted(reserves.items())))
+    return (route, block_number, tuple(tuple((reserves.get(pair.address) or (None, None))[:2]) for pair, _, _ in route.hops))
+
+
+class WorkQueue:
+    # Bounded queue of side effects (notifications, trade submission, history writes) run in
+    # order by a background thread, so the detection loop only pays for an append. When the
+    # worker falls behind, the queue's policy decides what gets dropped instead of letting the
+    # loop wait; items submitted with a key already seen among the last dedupe_size keys are
+    # skipped. Each item is timed under the queue's stage in arb_stage_seconds, and items done,
+    # failed, dropped and skipped as duplicates are counted in arb_work_items_total.
+
+    def __init__(self, name, maxsize=1024, policy=DROP_OLDEST, put_timeout=0.05, dedupe_size=4096):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown drop policy {policy!r}, expected one of {POLICIES}")
+        self.name = name
+        self.maxsize = maxsize
+        self.policy = policy
+        self.put_timeout = put_timeout
+        self.dedupe_size = dedupe_size
+        self._items = collections.deque()
+        self._seen = collections.OrderedDict()  # recent keys, oldest first
+        self._active = 0  # items taken by the worker and not finished yet
+        self._condition = threading.Condition()
+        self._stopping = False
+        self._thread = None
+
+    def __len__(self):
+        return len(self._items)
+
+    def start(self):
+        if self._thread is None:
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name=f"{self.name}-queue", daemon=True)
+            self._thread.start()
+        return self
+
+    def submit(self, function, *args, key=None, **kwargs):
+        # Queue function(*args, **kwargs). Returns False when the item was dropped or is a
+        # duplicate of a recent key.
+        with self._condition:
+            if key is not None and key in self._seen:
+                self._seen.move_to_end(key)
+                WORK_ITEMS.inc(self.name, "duplicate")
+                return False
+            if len(self._items) >= self.maxsize:
+                if self.policy == DROP_OLDEST:
+                    self._items.popleft()
+                    WORK_ITEMS.inc(self.name, "dropped")
+                elif self.policy == BLOCK:
+                    self._condition.wait_for(lambda: len(self._items) < self.maxsize, timeout=self.put_timeout)
+                if len(self._items) >= self.maxsize:
+                    WORK_ITEMS.inc(self.name, "dropped")
+                    return False
+            if key is not None:
+                self._seen[key] = None
+                if len(self._seen) > self.dedupe_size:
+                    self._seen.popitem(last=False)
+            self._items.append((function, args, kwargs))
+            self._condition.notify_all()
+        if self._thread is None:
+            # Not started (tools, tests): run inline so nothing is silently lost
+            self._drain()
+        return True
+
+    def join(self, timeout=None):
+        # Wait until everything queued so far has run. Returns False on timeout.
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._items and not self._active, timeout=timeout)
+
+    def close(self, timeout=5):
+        # Run what is queued (up to timeout), then stop the worker
+        if self._thread is None:
+            return
+        self.join(timeout)
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        self._thread.join(timeout=timeout)
+        self._thread = None
+        if self._items:
+            logging.warning(f"{len(self._items)} queued {self.name} items were not run before shutdown")
+
+    def _take(self, wait):
+        with self._condition:
+            if wait:
+                self._condition.wait_for(lambda: self._items or self._stopping)
+            if not self._items:
+                return None
+            self._active += 1
+            item = self._items.popleft()
+            self._condition.notify_all()
+            return item
+
+    def _finish(self):
+        with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+
+    def _execute(self, item):
+        function, args, kwargs = item
+        try:
+            with STAGE_SECONDS.time(self.name):
+                function(*args, **kwargs)
+            WORK_ITEMS.inc(self.name, "done")
+        except Exception as e:
+            WORK_ITEMS.inc(self.name, "failed")
+            logging.error(f"An error occurred in the {self.name} queue: {e}")
+        finally:
+            self._finish()
+
+    def _drain(self):
+        item = self._take(wait=False)
+        while item is not None:
+            self._execute(item)
+            item = self._take(wait=False)
+
+    def _run(self):
+        while True:
+            item = self._take(wait=True)
+            if item is None:
+                return  # stopping and empty
+            self._execute(item)